@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import os, json
 from datetime import datetime
+from urllib.parse import urlencode
+from analytics import QueryAnalytics, CONFIDENCE_BUCKETS
+from query_log import QueryLog
+import intent_mining
 
 # ------------------ Paths ------------------
 BASE_DIR = os.path.dirname(__file__)
@@ -12,15 +16,66 @@ os.makedirs(DATA_DIR, exist_ok=True)
 training_path = os.path.join(DATA_DIR, 'training.json')
 faq_path = os.path.join(DATA_DIR, 'faq.json')
 queries_path = os.path.join(DATA_DIR, 'user_queries.csv')
+analytics_db_path = os.path.join(DATA_DIR, 'analytics.db')
+BACKEND_URL = os.environ.get('BANKBOT_BACKEND_URL', 'http://localhost:5001')
+
+# user_queries.csv is the legacy log; new rows go to date-partitioned segments
+query_log = QueryLog(DATA_DIR, legacy_csv=queries_path)
+# clusters of unanswered queries, proposed as new intents on 'Training Data'
+miner = intent_mining.from_env(query_log, DATA_DIR)
 
 # ------------------ Auto Login (Skip UI) ------------------
 st.session_state['logged_in'] = True  
 st.session_state['user'] = "admin"     # Default admin display name
 
 # ------------------ Load Data ------------------
-training = json.load(open(training_path)) if os.path.exists(training_path) else {"intents":[]}
-faq = json.load(open(faq_path)) if os.path.exists(faq_path) else []
-df_queries = pd.read_csv(queries_path) if os.path.exists(queries_path) else pd.DataFrame(columns=['query','intent','confidence','date'])
+# Cached loaders take the file's (mtime, size) as an argument, so a rerun
+# reuses the cached value until the file actually changes.
+def file_version(path):
+    try:
+        st_ = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st_.st_mtime_ns, st_.st_size)
+
+@st.cache_data
+def load_json(path, version):
+    return json.load(open(path)) if version else None
+
+# The portal reloads these files while it runs, so replace them in one step
+# rather than truncating and rewriting in place
+def save_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+@st.cache_data
+def load_query_summary(version):
+    analytics = QueryAnalytics(query_log, analytics_db_path)
+    analytics.refresh()
+    return analytics.summary()
+
+@st.cache_data
+def load_queries(version, start_day=None, end_day=None, intent=None, limit=20):
+    return query_log.read(start_day=start_day, end_day=end_day, intent=intent, limit=limit)
+
+# Finished days are folded into Parquet at most every 10 minutes
+@st.cache_data(ttl=600)
+def compact_query_log(day):
+    return query_log.compact(QueryAnalytics(query_log, analytics_db_path), readers=[miner])
+
+# Only queries logged since the last refresh are clustered; the ttl picks
+# up portal conversations, which do not change the log's version
+@st.cache_data(ttl=60)
+def load_intent_candidates(version):
+    miner.refresh()
+    return miner.candidates()
+
+compact_query_log(datetime.utcnow().strftime('%Y-%m-%d'))
+
+training = load_json(training_path, file_version(training_path)) or {"intents":[]}
+faq = load_json(faq_path, file_version(faq_path)) or []
 
 # ------------------ Admin Panel ------------------
 st.sidebar.title('Navigation')
@@ -35,19 +90,21 @@ if page == 'Logout':
 # DASHBOARD
 if page == 'Dashboard':
     st.title("🏦 Admin Dashboard")
+    summary = load_query_summary(query_log.version())
     st.write('<div class="card">', unsafe_allow_html=True)
     cols = st.columns([1,1,1,1])
-    cols[0].markdown('<div class="small-muted">Total Queries</div><div class="metric-number">{}</div>'.format(len(df_queries)), unsafe_allow_html=True)
-    cols[1].markdown('<div class="small-muted">Success Rate</div><div class="metric-number">{}</div>'.format('94.2%'), unsafe_allow_html=True)
+    cols[0].markdown('<div class="small-muted">Total Queries</div><div class="metric-number">{}</div>'.format(summary['total']), unsafe_allow_html=True)
+    cols[1].markdown('<div class="small-muted">Success Rate</div><div class="metric-number">{:.1%}</div>'.format(summary['success_rate']), unsafe_allow_html=True)
     cols[2].markdown('<div class="small-muted">Intents</div><div class="metric-number">{}</div>'.format(len(training.get('intents',[]))), unsafe_allow_html=True)
-    cols[3].markdown('<div class="small-muted">Entity Types</div><div class="metric-number">{}</div>'.format(42), unsafe_allow_html=True)
+    cols[3].markdown('<div class="small-muted">Avg Confidence</div><div class="metric-number">{:.2f}</div>'.format(summary['avg_confidence']), unsafe_allow_html=True)
     st.write('</div>', unsafe_allow_html=True)
 
     st.markdown('### Recent Queries')
-    if df_queries.empty:
+    recent = load_queries(query_log.version())
+    if recent.empty:
         st.info('No queries logged yet.')
     else:
-        st.dataframe(df_queries.tail(20))
+        st.dataframe(recent)
 
 elif page == 'Training Data':
     st.header('📝 Training Data Editor')
@@ -60,17 +117,57 @@ elif page == 'Training Data':
                 'intent': new_intent,
                 'examples': [e.strip() for e in new_examples.split(',') if e.strip()]
             })
-            json.dump(training, open(training_path, 'w'), indent=2)
+            save_json(training_path, training)
             st.success('Intent added and saved to data/training.json')
 
     st.subheader('Existing intents')
     for i, it in enumerate(training.get('intents', [])):
         st.write(f"{i+1}. **{it.get('intent')}** — {', '.join(it.get('examples', []))}")
 
+    st.subheader('Suggested intents')
+    st.caption('Unanswered queries grouped by similarity, most asked first.')
+    candidates = load_intent_candidates(query_log.version())
+    if not candidates:
+        st.info('No groups of unanswered queries yet.')
+    for c in candidates:
+        key = c['cluster']
+        with st.expander(f"{c['name']} — {c['queries']} queries, {c['phrasings']} phrasings"):
+            name = st.text_input('Intent name', value=c['name'], key=f'mined_name_{key}').strip()
+            examples = st.multiselect('Example phrases', c['examples'], default=c['examples'], key=f'mined_examples_{key}')
+            accept_col, dismiss_col = st.columns(2)
+            if accept_col.button('Add as intent', key=f'mined_accept_{key}') and name and examples:
+                # an existing intent of that name gets the new examples
+                intent = next((it for it in training.setdefault('intents', []) if it.get('intent') == name), None)
+                if intent is None:
+                    training['intents'].append({'intent': name, 'examples': examples})
+                else:
+                    intent['examples'] = intent.get('examples', []) + [e for e in examples if e not in intent.get('examples', [])]
+                save_json(training_path, training)
+                miner.set_status(key, 'accepted')
+                load_intent_candidates.clear()
+                st.success(f'Intent {name} saved to data/training.json')
+            if dismiss_col.button('Dismiss', key=f'mined_dismiss_{key}'):
+                miner.set_status(key, 'dismissed')
+                load_intent_candidates.clear()
+                st.experimental_rerun()
+
 elif page == 'User Queries':
     st.header('💬 User Queries')
+    start_day = end_day = None
+    if st.checkbox('Filter by date'):
+        c1, c2 = st.columns(2)
+        start_day = c1.date_input('From').isoformat()
+        end_day = c2.date_input('To').isoformat()
+    intent_filter = st.text_input('Intent (optional)').strip() or None
+    limit = int(st.number_input('Rows to show (most recent)', min_value=10, max_value=10000, value=1000, step=100))
+    version = query_log.version()
+    df_queries = load_queries(version, start_day, end_day, intent_filter, limit)
     if not df_queries.empty:
         st.download_button('Download CSV', df_queries.to_csv(index=False), file_name='queries.csv')
+        # the full log is streamed by the backend rather than built here
+        params = urlencode([(k, v) for k, v in (('start', start_day), ('end', end_day), ('intent', intent_filter)) if v])
+        st.markdown(f'[Export all matching queries]({BACKEND_URL}/queries/export{"?" + params if params else ""})')
+        st.caption('The export streams from the backend and needs the portal admin login.')
         st.dataframe(df_queries)
     else:
         st.info('No user queries found.')
@@ -83,7 +180,7 @@ elif page == 'FAQs':
         ok = st.form_submit_button('Add FAQ')
         if ok and q:
             faq.append({'q':q, 'a':a})
-            json.dump(faq, open(faq_path, 'w'), indent=2)
+            save_json(faq_path, faq)
             st.success('FAQ saved.')
 
     if faq:
@@ -92,7 +189,17 @@ elif page == 'FAQs':
 
 elif page == 'Analytics':
     st.header('📈 Analytics Dashboard')
-    st.line_chart(pd.DataFrame({'queries':[5,10,30,50,80,130]}))
+    summary = load_query_summary(query_log.version())
+    if not summary['total']:
+        st.info('No queries logged yet.')
+    else:
+        st.subheader('Daily query volume')
+        st.line_chart(pd.DataFrame(summary['daily_volume'], columns=['date','queries']).set_index('date'))
+        st.subheader('Queries per intent')
+        st.bar_chart(pd.Series(summary['intent_counts'], name='queries'))
+        st.subheader('Confidence distribution')
+        labels = ['{:.1f}-{:.1f}'.format(b / CONFIDENCE_BUCKETS, (b + 1) / CONFIDENCE_BUCKETS) for b in range(CONFIDENCE_BUCKETS)]
+        st.bar_chart(pd.DataFrame({'queries': summary['confidence_hist']}, index=labels))
 
 elif page == 'Settings':
     st.header('⚙️ Settings')
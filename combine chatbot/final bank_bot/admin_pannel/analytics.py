@@ -0,0 +1,159 @@
+import os
+import sqlite3
+
+from query_log import tail_csv
+
+UNANSWERED_INTENTS = ('', 'unknown', 'out_of_scope')
+CONFIDENCE_BUCKETS = 10
+SCHEMA_VERSION = 2
+
+
+class _Totals:
+    def __init__(self):
+        self.intents = {}
+        self.buckets = {}
+        self.days = {}
+        self.rows = 0
+
+    def add(self, intent, confidence, date):
+        try:
+            confidence = float(confidence)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        n, total = self.intents.get(intent, (0, 0.0))
+        self.intents[intent] = (n + 1, total + confidence)
+        bucket = min(CONFIDENCE_BUCKETS - 1, max(0, int(confidence * CONFIDENCE_BUCKETS)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        day = (date or '')[:10]
+        self.days[day] = self.days.get(day, 0) + 1
+        self.rows += 1
+
+    def save(self, conn):
+        conn.executemany(
+            'INSERT INTO intent_counts (intent, n, confidence_sum) VALUES (?, ?, ?) '
+            'ON CONFLICT(intent) DO UPDATE SET n = n + excluded.n, '
+            'confidence_sum = confidence_sum + excluded.confidence_sum',
+            [(k, n, total) for k, (n, total) in self.intents.items()])
+        conn.executemany(
+            'INSERT INTO confidence_hist (bucket, n) VALUES (?, ?) '
+            'ON CONFLICT(bucket) DO UPDATE SET n = n + excluded.n', list(self.buckets.items()))
+        conn.executemany(
+            'INSERT INTO daily_volume (day, n) VALUES (?, ?) '
+            'ON CONFLICT(day) DO UPDATE SET n = n + excluded.n', list(self.days.items()))
+
+
+class QueryAnalytics:
+    """Rolling aggregates over the query log, kept in a SQLite summary.
+
+    refresh() only parses the bytes appended to each CSV segment since the
+    last call (tracked as a per-file byte offset), so the cost of a
+    dashboard rerun does not depend on how large the query log has grown.
+    Compacted Parquet days are only scanned when the summary is rebuilt.
+    """
+
+    def __init__(self, query_log, db_path):
+        self.query_log = query_log
+        self.db_path = db_path
+        conn = self._connect()
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript('''
+                    DROP TABLE IF EXISTS log_cursor;
+                    DROP TABLE IF EXISTS segment_cursor;
+                    DROP TABLE IF EXISTS summary_meta;
+                    DROP TABLE IF EXISTS intent_counts;
+                    DROP TABLE IF EXISTS confidence_hist;
+                    DROP TABLE IF EXISTS daily_volume;
+                ''')
+            conn.executescript(f'''
+                CREATE TABLE IF NOT EXISTS segment_cursor (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER NOT NULL,
+                    offset INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS summary_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS intent_counts (
+                    intent TEXT PRIMARY KEY,
+                    n INTEGER NOT NULL,
+                    confidence_sum REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS confidence_hist (
+                    bucket INTEGER PRIMARY KEY,
+                    n INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS daily_volume (
+                    day TEXT PRIMARY KEY,
+                    n INTEGER NOT NULL
+                );
+                PRAGMA user_version = {SCHEMA_VERSION};
+            ''')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def refresh(self):
+        """Fold newly appended log lines into the summary; returns rows added."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursors = {path: (inode, offset) for path, inode, offset
+                       in conn.execute('SELECT path, inode, offset FROM segment_cursor')}
+            built = conn.execute("SELECT 1 FROM summary_meta WHERE key = 'built'").fetchone()
+            stats = {path: os.stat(path) for path in self.query_log.csv_segments()}
+            replaced = any(path in cursors and (cursors[path][0] != st.st_ino or cursors[path][1] > st.st_size)
+                           for path, st in stats.items())
+
+            totals = _Totals()
+            if replaced or not built:
+                # first run, or a segment was rewritten: rebuild from scratch
+                for table in ('segment_cursor', 'intent_counts', 'confidence_hist', 'daily_volume'):
+                    conn.execute(f'DELETE FROM {table}')
+                cursors = {}
+                for batch in self.query_log.iter_parquet_batches(columns=['intent', 'confidence', 'date']):
+                    for intent, confidence, date in zip(*(batch.column(i).to_pylist() for i in range(3))):
+                        totals.add(intent, confidence, date)
+                conn.execute("INSERT OR REPLACE INTO summary_meta (key, value) VALUES ('built', '1')")
+
+            for path, st in stats.items():
+                offset = tail_csv(path, cursors.get(path, (st.st_ino, 0))[1],
+                                  lambda fields: totals.add(fields[1], fields[2], fields[3]))
+                conn.execute('INSERT OR REPLACE INTO segment_cursor (path, inode, offset) VALUES (?, ?, ?)',
+                             (path, st.st_ino, offset))
+            for path in set(cursors) - set(stats):
+                conn.execute('DELETE FROM segment_cursor WHERE path = ?', (path,))
+            totals.save(conn)
+            conn.execute('COMMIT')
+            return totals.rows
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def summary(self):
+        conn = self._connect()
+        try:
+            intents = {k: (n, s) for k, n, s in conn.execute(
+                'SELECT intent, n, confidence_sum FROM intent_counts ORDER BY n DESC')}
+            hist = dict(conn.execute('SELECT bucket, n FROM confidence_hist'))
+            daily = conn.execute('SELECT day, n FROM daily_volume ORDER BY day').fetchall()
+        finally:
+            conn.close()
+        total = sum(n for n, _ in intents.values())
+        answered = sum(n for k, (n, _) in intents.items() if k not in UNANSWERED_INTENTS)
+        confidence_sum = sum(s for _, s in intents.values())
+        return {
+            'total': total,
+            'success_rate': answered / total if total else 0.0,
+            'avg_confidence': confidence_sum / total if total else 0.0,
+            'intent_counts': {k: n for k, (n, _) in intents.items()},
+            'confidence_hist': [hist.get(b, 0) for b in range(CONFIDENCE_BUCKETS)],
+            'daily_volume': daily,
+        }
@@ -1,33 +1,126 @@
-from flask import Flask, request, jsonify, session
-import json, os
+from flask import Flask, request, jsonify, session, Response, stream_with_context
+import json, logging, os, sys, threading, time
 from datetime import datetime
+from query_log import QueryLog
+import event_consumer
+import intent_mining
+# the metrics module is shared with the portal app next door
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bank_portal_with_bot')))
+import metrics
+logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = "bank_secret_key"
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 QUERIES_CSV = os.path.join(DATA_DIR, 'user_queries.csv')
+query_log = QueryLog(DATA_DIR, legacy_csv=QUERIES_CSV)
+MAX_BATCH_SIZE = int(os.environ.get('BANKBOT_MAX_BATCH_SIZE', '50000'))
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    payload = request.json or {}
-    query = payload.get('query','')
+# /metrics; BANKBOT_PROFILE_SLOW_MS enables the slow request profiler
+profiler = metrics.profiler_from_env(os.path.join(os.path.dirname(__file__), 'profiles'))
+metrics.install_flask(app, 'bankbot_backend', profiler=profiler)
+PREDICTIONS = metrics.REGISTRY.counter(
+    'bankbot_backend_predictions_total', 'Classified queries by intent.', ['intent'])
+BATCH_SIZE = metrics.REGISTRY.histogram(
+    'bankbot_backend_batch_size', 'Queries per /predict/batch call.',
+    buckets=(1, 10, 100, 1000, 10000, 50000))
+LOG_WRITE_SECONDS = metrics.REGISTRY.histogram(
+    'bankbot_backend_log_write_seconds', 'Time spent appending to the query log.')
+metrics.REGISTRY.register_collector(
+    'bankbot_backend_log_write_bytes_total', 'counter', 'Bytes appended to the query log.',
+    lambda: [({}, query_log.bytes_written)])
+
+# chat events from the portal are ingested into the same log in the background
+chat_event_consumer = event_consumer.from_env(query_log)
+if chat_event_consumer is not None:
+    chat_event_consumer.start()
+    metrics.REGISTRY.register_collector(
+        'bankbot_backend_chat_events_ingested_total', 'counter', 'Portal chat events added to the query log.',
+        lambda: [({}, chat_event_consumer.ingested)])
 
+# unanswered queries are clustered into suggested intents for the admin
+# panel every BANKBOT_MINING_INTERVAL seconds (0 turns it off)
+MINING_INTERVAL = float(os.environ.get('BANKBOT_MINING_INTERVAL', '300'))
+miner = intent_mining.from_env(query_log, DATA_DIR)
+
+def mine_unanswered():
+    while True:
+        try:
+            miner.refresh()
+        except Exception:
+            logger.exception('intent mining failed')
+        time.sleep(MINING_INTERVAL)
+
+if MINING_INTERVAL > 0:
+    threading.Thread(target=mine_unanswered, name='intent-mining', daemon=True).start()
+
+def classify_query(query):
+    q = query.lower()
     intent = 'unknown'
-    if 'balance' in query.lower():
+    if 'balance' in q:
         intent = 'check_balance'
-    elif 'transfer' in query.lower() or 'send' in query.lower():
+    elif 'transfer' in q or 'send' in q:
         intent = 'transfer_money'
 
     confidence = 0.85
+    return intent, confidence
 
-    exists = os.path.exists(QUERIES_CSV)
-    with open(QUERIES_CSV, 'a', encoding='utf-8') as f:
-        if not exists:
-            f.write('query,intent,confidence,date\n')
-        f.write(f'"{query}",{intent},{confidence},{datetime.utcnow().isoformat()}\n')
+def log_queries(rows):
+    # one buffered csv write per day segment, not one open per row
+    with LOG_WRITE_SECONDS.time():
+        query_log.append(rows)
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    payload = request.json or {}
+    query = payload.get('query','')
+
+    intent, confidence = classify_query(query)
+    PREDICTIONS.inc(intent=intent)
+    log_queries([[query, intent, confidence, datetime.utcnow().isoformat()]])
 
     return jsonify({'intent': intent, 'confidence': confidence})
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    payload = request.json or {}
+    queries = payload.get('queries')
+    if not isinstance(queries, list):
+        return jsonify({'error': "'queries' must be a list of strings"}), 400
+    if len(queries) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'at most {MAX_BATCH_SIZE} queries per batch'}), 413
+
+    BATCH_SIZE.observe(len(queries))
+    now = datetime.utcnow().isoformat()
+    results = []
+    rows = []
+    counts = {}
+    for query in queries:
+        query = '' if query is None else str(query)
+        intent, confidence = classify_query(query)
+        counts[intent] = counts.get(intent, 0) + 1
+        results.append({'query': query, 'intent': intent, 'confidence': confidence})
+        rows.append([query, intent, confidence, now])
+    log_queries(rows)
+    for intent, n in counts.items():
+        PREDICTIONS.inc(n, intent=intent)
+
+    return jsonify({'results': results})
 
+@app.route('/queries/export', methods=['GET'])
+def export_queries():
+    # admins only: the portal's admin login shares this session (same secret key)
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD&intent=... ; streamed one day at a time
+    chunks = query_log.iter_csv(
+        start_day=request.args.get('start') or None,
+        end_day=request.args.get('end') or None,
+        intent=request.args.get('intent') or None,
+    )
+    return Response(stream_with_context(chunks), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=queries.csv'})
 
+if __name__ == '__main__':
+    app.run(port=int(os.environ.get('BACKEND_PORT', '5001')))
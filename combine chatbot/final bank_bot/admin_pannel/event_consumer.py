@@ -0,0 +1,107 @@
+# event_consumer.py
+# Moves the portal's chat events (data/chat_events.db, written by
+# bank_portal_with_bot/chat_events.py) into the query log in batches.
+#
+#   python event_consumer.py          # run until interrupted
+#   python event_consumer.py --once   # drain what is queued and exit
+#
+# backend.py runs the same loop in a background thread.
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+from query_log import QueryLog
+# the queue module is shared with the portal app next door
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bank_portal_with_bot')))
+import chat_events
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_QUEUE = os.path.join(DATA_DIR, 'chat_events.db')
+
+
+def _row(event):
+    date = datetime.fromtimestamp(event['created'], timezone.utc).replace(tzinfo=None).isoformat()
+    confidence = event['confidence'] if event['confidence'] is not None else 0.0
+    latency_ms = round(event['latency_ms'], 3) if event['latency_ms'] is not None else ''
+    return [event['query'], event['intent'], round(confidence, 4), date, event['source'] or '', latency_ms]
+
+
+class EventConsumer:
+    """Drains the chat event queue into `query_log` every `interval` seconds.
+
+    Each batch is appended to the log before it is deleted from the queue,
+    so a crash in between replays it; several consumers may run at once
+    because a batch is read and deleted under one write lock.
+    """
+
+    def __init__(self, queue_path, query_log, interval=1.0, batch_size=5000):
+        self.queue_path = queue_path
+        self.query_log = query_log
+        self.interval = interval
+        self.batch_size = batch_size
+        self.ingested = 0
+        self.errors = 0
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _append(self, events):
+        self.query_log.append([_row(e) for e in events])
+
+    def drain(self):
+        """Ingest everything queued now; returns the number of events."""
+        if self._conn is None:
+            self._conn = chat_events.connect(self.queue_path)
+        total = 0
+        while True:
+            n = chat_events.drain(self._conn, self._append, self.batch_size)
+            total += n
+            if n < self.batch_size:
+                break
+        self.ingested += total
+        return total
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                self.errors += 1
+                logger.exception('chat event ingestion failed')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='chat-event-consumer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def from_env(query_log):
+    """Consumer of BANKBOT_CHAT_EVENTS_DB (default data/chat_events.db), or None if it is empty."""
+    path = os.environ.get('BANKBOT_CHAT_EVENTS_DB', DEFAULT_QUEUE)
+    if not path:
+        return None
+    return EventConsumer(path, query_log, interval=float(os.environ.get('BANKBOT_CHAT_EVENTS_INTERVAL', '1')))
+
+
+if __name__ == '__main__':
+    log = QueryLog(DATA_DIR, legacy_csv=os.path.join(DATA_DIR, 'user_queries.csv'))
+    consumer = from_env(log)
+    if consumer is None:
+        print('BANKBOT_CHAT_EVENTS_DB is empty; nothing to consume')
+    elif sys.argv[1:] == ['--once']:
+        print(consumer.drain(), 'events ingested')
+    else:
+        try:
+            consumer.run()
+        except KeyboardInterrupt:
+            print(consumer.ingested, 'events ingested')
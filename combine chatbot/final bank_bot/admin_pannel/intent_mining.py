@@ -0,0 +1,364 @@
+import math
+import os
+import re
+import sqlite3
+import sys
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from analytics import UNANSWERED_INTENTS
+from query_log import tail_csv
+
+NUM_PERM = 64
+BANDS = 16                      # 16 bands of 4 rows: pairs near 0.5 Jaccard usually collide
+ROWS = NUM_PERM // BANDS
+SIMILARITY = 0.5                # estimated Jaccard a candidate pair needs to be joined
+SHINGLE = 3
+PRIME = 4294967291              # largest prime below 2**32
+MIN_LENGTH = 3
+SCHEMA_VERSION = 1
+
+_NON_WORD_RE = re.compile(r'[^a-z0-9 ]+')
+_DIGITS_RE = re.compile(r'\d+')
+STOPWORDS = {'a', 'an', 'the', 'is', 'are', 'was', 'i', 'me', 'my', 'you', 'your', 'to', 'of', 'in', 'on',
+             'for', 'and', 'or', 'what', 'how', 'can', 'do', 'does', 'please', 'it', 'this', 'that', 'with',
+             'about', 'tell', 'want', 'need', 'there', 'any', 'some', 'be', 'will', 'would', 'could', 'at'}
+
+_rng = np.random.RandomState(7)
+_PERM_A = _rng.randint(1, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+# odd multipliers folding a band's ROWS values into one 64-bit key
+_BAND_MIX = (_rng.randint(1, 2 ** 31 - 1, size=ROWS).astype(np.uint64) << np.uint64(32)) | np.uint64(1)
+SIGN_CHUNK = 2000
+
+
+def normalize(text):
+    """Lowercase words with numbers folded to 0, so "send 500" and "send 20" are one phrasing."""
+    text = _DIGITS_RE.sub('0', _NON_WORD_RE.sub(' ', (text or '').lower()))
+    return ' '.join(text.split())
+
+
+def shingles(text):
+    padded = f' {text} '
+    return {padded[i:i + SHINGLE] for i in range(max(1, len(padded) - SHINGLE + 1))}
+
+
+def signatures(texts):
+    """MinHash of each text's character shingles, an (n, NUM_PERM) uint32 array.
+
+    Texts are hashed SIGN_CHUNK at a time with one matrix operation each.
+    """
+    result = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(texts), SIGN_CHUNK):
+        hashes, offsets = [], []
+        for text in texts[start:start + SIGN_CHUNK]:
+            offsets.append(len(hashes))
+            hashes.extend(zlib.crc32(s.encode('utf-8')) for s in shingles(text))
+        x = np.array(hashes, dtype=np.uint64)
+        hashed = (_PERM_A[:, None] * x + _PERM_B[:, None]) % PRIME
+        result[start:start + len(offsets)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return result
+
+
+def band_keys(sigs):
+    """(n, BANDS) signed 64-bit bucket keys, one per band of each signature."""
+    bands = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    # wraps around at 2**64, which is what a hash wants
+    return (bands * _BAND_MIX).sum(axis=2, dtype=np.uint64).view(np.int64)
+
+
+def similarity(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+def suggest_name(phrases):
+    """Intent name from the words most of the phrasings share."""
+    words = Counter()
+    for phrase in phrases:
+        # each word once per phrasing, in the order it appears
+        words.update(list(dict.fromkeys(w for w in phrase.split() if w not in STOPWORDS and w != '0' and len(w) > 1)))
+    top = [w for w, _ in words.most_common(3)]
+    return '_'.join(top) or 'new_intent'
+
+
+class IntentMiner:
+    """Groups unanswered queries into candidate intents with MinHash/LSH.
+
+    Each distinct normalized phrasing gets a MinHash signature once; its
+    BANDS bucket keys are stored, and a new phrasing is compared only
+    with phrasings sharing a bucket, never with the whole set. Pairs whose
+    signatures agree on at least SIMILARITY of their values join clusters
+    (union-find, the lowest id is the cluster id). refresh() reads only
+    what was appended to the query log and the portal's conversations
+    since the last call, as QueryAnalytics does.
+    """
+
+    def __init__(self, query_log, db_path, conversations_db=None):
+        self.query_log = query_log
+        self.db_path = db_path
+        self.conversations_db = conversations_db
+        conn = self._connect()
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript('''
+                    DROP TABLE IF EXISTS phrasings;
+                    DROP TABLE IF EXISTS lsh_buckets;
+                    DROP TABLE IF EXISTS cluster_status;
+                    DROP TABLE IF EXISTS segment_cursor;
+                    DROP TABLE IF EXISTS conversation_cursor;
+                    DROP TABLE IF EXISTS mining_meta;
+                ''')
+            conn.executescript(f'''
+                CREATE TABLE IF NOT EXISTS phrasings (
+                    id INTEGER PRIMARY KEY,
+                    text TEXT NOT NULL UNIQUE,
+                    n INTEGER NOT NULL,
+                    conversation_n INTEGER NOT NULL DEFAULT 0,
+                    cluster INTEGER NOT NULL,
+                    sig BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS phrasings_cluster ON phrasings (cluster);
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    band INTEGER NOT NULL,
+                    key INTEGER NOT NULL,
+                    phrasing INTEGER NOT NULL,
+                    PRIMARY KEY (band, key, phrasing)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS cluster_status (
+                    cluster INTEGER PRIMARY KEY,
+                    status TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS segment_cursor (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER NOT NULL,
+                    offset INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS conversation_cursor (
+                    user_id TEXT PRIMARY KEY,
+                    turns INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS mining_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                PRAGMA user_version = {SCHEMA_VERSION};
+            ''')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    # ---------- Reading the logs ----------
+    def _read_log(self, conn, counts):
+        cursors = {path: (inode, offset) for path, inode, offset
+                   in conn.execute('SELECT path, inode, offset FROM segment_cursor')}
+        built = conn.execute("SELECT 1 FROM mining_meta WHERE key = 'built'").fetchone()
+        stats = {path: os.stat(path) for path in self.query_log.csv_segments()}
+        replaced = any(path in cursors and (cursors[path][0] != st.st_ino or cursors[path][1] > st.st_size)
+                       for path, st in stats.items())
+        if replaced or not built:
+            # first run, or a segment was rewritten: recount the log, but
+            # keep the signatures and clusters already worked out
+            conn.execute('UPDATE phrasings SET n = 0')
+            conn.execute('DELETE FROM segment_cursor')
+            cursors = {}
+            for batch in self.query_log.iter_parquet_batches(columns=['query', 'intent']):
+                for query, intent in zip(batch.column(0).to_pylist(), batch.column(1).to_pylist()):
+                    if intent in UNANSWERED_INTENTS:
+                        counts[normalize(query)] += 1
+            conn.execute("INSERT OR REPLACE INTO mining_meta (key, value) VALUES ('built', '1')")
+
+        def count(fields):
+            if fields[1] in UNANSWERED_INTENTS:
+                counts[normalize(fields[0])] += 1
+
+        for path, st in stats.items():
+            offset = tail_csv(path, cursors.get(path, (st.st_ino, 0))[1], count)
+            conn.execute('INSERT OR REPLACE INTO segment_cursor (path, inode, offset) VALUES (?, ?, ?)',
+                         (path, st.st_ino, offset))
+        for path in set(cursors) - set(stats):
+            conn.execute('DELETE FROM segment_cursor WHERE path = ?', (path,))
+
+    def _read_conversations(self, conn, counts):
+        if not self.conversations_db or not os.path.exists(self.conversations_db):
+            return
+        source = sqlite3.connect(f'file:{self.conversations_db}?mode=ro', uri=True, timeout=30)
+        try:
+            last_seq = int((conn.execute("SELECT value FROM mining_meta WHERE key = 'conversation_seq'")
+                            .fetchone() or ['0'])[0])
+            changed = source.execute('SELECT user_id, seq FROM chat_users WHERE seq > ?', (last_seq,)).fetchall()
+            for user_id, seq in changed:
+                row = conn.execute('SELECT turns FROM conversation_cursor WHERE user_id = ?', (user_id,)).fetchone()
+                seen = row[0] if row else 0
+                turns = source.execute(
+                    'SELECT n, user_message, intent FROM chat_turns WHERE user_id = ? AND n >= ? ORDER BY n',
+                    (user_id, seen)).fetchall()
+                for n, message, intent in turns:
+                    if intent in UNANSWERED_INTENTS:
+                        counts[normalize(message)] += 1
+                if turns:
+                    conn.execute('INSERT OR REPLACE INTO conversation_cursor (user_id, turns) VALUES (?, ?)',
+                                 (user_id, turns[-1][0] + 1))
+                last_seq = max(last_seq, seq)
+            conn.execute("INSERT OR REPLACE INTO mining_meta (key, value) VALUES ('conversation_seq', ?)",
+                         (str(last_seq),))
+        except sqlite3.OperationalError:
+            # not a conversation store (yet)
+            pass
+        finally:
+            source.close()
+
+    # ---------- Clustering ----------
+    def _add(self, conn, counts, conversation_counts):
+        """Count the phrasings, sign and bucket the new ones and join clusters."""
+        texts = [t for t in set(counts) | set(conversation_counts) if len(t) >= MIN_LENGTH]
+        if not texts:
+            return 0
+        known = set()
+        for i in range(0, len(texts), 500):
+            chunk = texts[i:i + 500]
+            known.update(row[0] for row in conn.execute(
+                f"SELECT text FROM phrasings WHERE text IN ({','.join('?' * len(chunk))})", chunk))
+        conn.executemany('UPDATE phrasings SET n = n + ?, conversation_n = conversation_n + ? WHERE text = ?',
+                         [(counts[t], conversation_counts[t], t) for t in texts if t in known])
+        new = [t for t in texts if t not in known]
+        if not new:
+            return 0
+
+        first_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM phrasings').fetchone()[0]
+        new_sigs = signatures(new)
+        sigs = {}
+        rows = []
+        for offset, text in enumerate(new):
+            pid = first_id + offset
+            sigs[pid] = new_sigs[offset]
+            rows.append((pid, text, counts[text], conversation_counts[text], pid, new_sigs[offset].tobytes()))
+        conn.executemany('INSERT INTO phrasings (id, text, n, conversation_n, cluster, sig) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        keys = band_keys(new_sigs).ravel()
+        bands = np.tile(np.arange(BANDS), len(new))
+        ids = np.repeat(np.arange(first_id, first_id + len(new)), BANDS)
+        # in key order, so the inserts walk the index instead of jumping around it
+        order = np.lexsort((ids, keys, bands))
+        conn.executemany('INSERT OR IGNORE INTO lsh_buckets (band, key, phrasing) VALUES (?, ?, ?)',
+                         zip(bands[order].tolist(), keys[order].tolist(), ids[order].tolist()))
+
+        # candidates: every earlier phrasing sharing a bucket with a new one
+        pairs = set(conn.execute(
+            'SELECT DISTINCT n.phrasing, o.phrasing FROM lsh_buckets n '
+            'JOIN lsh_buckets o ON o.band = n.band AND o.key = n.key AND o.phrasing < n.phrasing '
+            'WHERE n.phrasing >= ?', (first_id,)))
+        missing = sorted({o for _, o in pairs if o not in sigs})
+        clusters = {pid: pid for pid in sigs}
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            for pid, cluster, sig in conn.execute(
+                    f"SELECT id, cluster, sig FROM phrasings WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                sigs[pid] = np.frombuffer(sig, dtype=np.uint32)
+                clusters[pid] = cluster
+
+        parent = {}
+
+        def find(c):
+            while parent.get(c, c) != c:
+                parent[c] = parent.get(parent[c], parent[c])
+                c = parent[c]
+            return c
+
+        for a, b in pairs:
+            if similarity(sigs[a], sigs[b]) >= SIMILARITY:
+                ra, rb = find(clusters[a]), find(clusters[b])
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+        moves = [(find(c), c) for c in parent if find(c) != c]
+        conn.executemany('UPDATE phrasings SET cluster = ? WHERE cluster = ?', moves)
+        # a merged cluster keeps the decision made on any of its parts
+        conn.executemany('INSERT OR IGNORE INTO cluster_status (cluster, status) '
+                         'SELECT ?, status FROM cluster_status WHERE cluster = ?', moves)
+        conn.executemany('DELETE FROM cluster_status WHERE cluster = ?', [(c,) for _, c in moves])
+        return len(new)
+
+    def refresh(self):
+        """Fold newly logged unanswered queries into the clusters; returns new phrasings."""
+        counts, conversation_counts = Counter(), Counter()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._read_log(conn, counts)
+            self._read_conversations(conn, conversation_counts)
+            added = self._add(conn, counts, conversation_counts)
+            conn.execute('COMMIT')
+            return added
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    # ---------- Results ----------
+    def candidates(self, limit=20, examples=10, min_queries=2):
+        """Open clusters, most asked first, as dicts with a suggested name and example phrasings.
+
+        Clusters are ranked by queries times the log of their distinct
+        phrasings, so one question repeated verbatim does not outrank a
+        topic asked many ways.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT p.cluster, SUM(p.n + p.conversation_n) AS total, COUNT(*) AS variants FROM phrasings p '
+                'LEFT JOIN cluster_status s ON s.cluster = p.cluster WHERE s.cluster IS NULL '
+                'GROUP BY p.cluster HAVING total >= ?', (min_queries,)).fetchall()
+            rows.sort(key=lambda r: r[1] * math.log2(1 + r[2]), reverse=True)
+            result = []
+            for cluster, total, variants in rows[:limit]:
+                phrases = [text for text, in conn.execute(
+                    'SELECT text FROM phrasings WHERE cluster = ? AND n + conversation_n > 0 '
+                    'ORDER BY n + conversation_n DESC, id LIMIT ?',
+                    (cluster, examples))]
+                result.append({'cluster': cluster, 'queries': total, 'phrasings': variants,
+                               'name': suggest_name(phrases), 'examples': phrases})
+            return result
+        finally:
+            conn.close()
+
+    def set_status(self, cluster, status):
+        """Mark a cluster 'accepted' or 'dismissed' so it is no longer proposed."""
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO cluster_status (cluster, status) VALUES (?, ?)', (cluster, status))
+        finally:
+            conn.close()
+
+
+def from_env(query_log, data_dir):
+    """Miner over the query log, plus the portal's conversations (BANKBOT_STATE_DB)
+    when chat events are off (BANKBOT_CHAT_EVENTS_DB empty).
+
+    With chat events on, every portal chat already reaches the query log
+    through event_consumer.py; reading the conversations too would count
+    it twice.
+    """
+    conversations = None
+    if os.environ.get('BANKBOT_CHAT_EVENTS_DB') == '':
+        conversations = os.environ.get('BANKBOT_STATE_DB', os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'bank_portal_with_bot', 'chat_state.db'))
+    return IntentMiner(query_log, os.path.join(data_dir, 'intent_mining.db'), conversations or None)
+
+
+if __name__ == '__main__':
+    # python intent_mining.py refresh
+    if sys.argv[1:] == ['refresh']:
+        from query_log import QueryLog
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+        miner = from_env(QueryLog(data_dir, legacy_csv=os.path.join(data_dir, 'user_queries.csv')), data_dir)
+        print(miner.refresh(), 'new phrasings')
+        for c in miner.candidates(limit=10, examples=3):
+            print(f"{c['queries']:>8} {c['phrasings']:>6}  {c['name']}: {' | '.join(c['examples'])}")
+    else:
+        print('usage: python intent_mining.py refresh')
@@ -0,0 +1,340 @@
+import csv
+import io
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run one writer
+    fcntl = None
+
+QUERY_FIELDS = ['query', 'intent', 'confidence', 'date', 'source', 'latency_ms']
+# user_queries.csv and older segments only have the first four
+LEGACY_FIELDS = QUERY_FIELDS[:4]
+_DAY_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def _day_of(date):
+    m = _DAY_RE.match(date or '')
+    return m.group(0) if m else datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def is_header(fields):
+    return fields[:len(LEGACY_FIELDS)] == LEGACY_FIELDS
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([('query', pa.string()), ('intent', pa.string()), ('confidence', pa.float64()),
+                      ('date', pa.string()), ('source', pa.string()), ('latency_ms', pa.float64())])
+
+
+def _open_locked(path, mode, **kwargs):
+    """`path` opened with an exclusive flock held, or None if it is gone.
+
+    Appends and compact() both hold the lock. compact() removes a segment
+    before letting go of it, so a writer that opened the segment just
+    before finds it unlinked and opens the path again, starting a new one.
+    """
+    while True:
+        try:
+            f = open(path, mode, **kwargs)
+        except FileNotFoundError:
+            return None
+        if fcntl is None:
+            return f
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+def parse_row(fields):
+    """A CSV record of either layout as a dict of QUERY_FIELDS."""
+    fields = fields + [''] * (len(QUERY_FIELDS) - len(fields))
+    query, intent, confidence, date, source, latency_ms = fields[:6]
+    return {'query': query, 'intent': intent, 'confidence': _to_float(confidence), 'date': date,
+            'source': source or None, 'latency_ms': _to_float(latency_ms, None)}
+
+
+def _records_end(data):
+    """Bytes of `data` up to the last newline outside a quoted field."""
+    end = data.rfind(b'\n') + 1
+    # csv.writer quotes every field holding a quote, so an odd count of
+    # quotes before a newline means it is inside a quoted field
+    quotes = data.count(b'"', 0, end)
+    while end and quotes % 2:
+        start = data.rfind(b'\n', 0, end - 1) + 1
+        quotes -= data.count(b'"', start, end)
+        end = start
+    return end
+
+
+def tail_csv(path, offset, handle, block_size=4 * 1024 * 1024):
+    """Pass the records after byte `offset` of a CSV segment to
+    handle(fields); returns the offset after the last one.
+
+    Fields are padded to LEGACY_FIELDS and headers skipped. A record still
+    being written, even one whose quoted query holds a newline, is left
+    for the next call.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        pending = b''
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            pending += block
+            end = _records_end(pending)
+            chunk, pending = pending[:end], pending[end:]
+            offset += len(chunk)
+            for fields in csv.reader(io.StringIO(chunk.decode('utf-8', errors='replace'))):
+                if not fields or is_header(fields):
+                    continue
+                handle(fields + [''] * (len(LEGACY_FIELDS) - len(fields)))
+    return offset
+
+
+class QueryLog:
+    """Date-partitioned query log.
+
+    New rows are appended to one small CSV segment per day under hot/.
+    compact() turns finished days into Parquet files under
+    parquet/day=YYYY-MM-DD/, which readers scan with column projection and
+    partition/row-group filters. The legacy user_queries.csv is read until
+    compaction imports it, and parsed again only when it changes.
+    """
+
+    def __init__(self, data_dir, legacy_csv=None):
+        self.root = os.path.join(data_dir, 'query_log')
+        self.hot_dir = os.path.join(self.root, 'hot')
+        self.parquet_dir = os.path.join(self.root, 'parquet')
+        self.legacy_csv = legacy_csv
+        self.bytes_written = 0
+        self._legacy = (None, {})
+        os.makedirs(self.hot_dir, exist_ok=True)
+        os.makedirs(self.parquet_dir, exist_ok=True)
+
+    # ---------- Writing ----------
+    def append(self, rows):
+        """Append [query, intent, confidence, date, source, latency_ms] rows to
+        their day's segment; the last two may be left off."""
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(_day_of(row[3]), []).append(row)
+        for day, day_rows in by_day.items():
+            buf = io.StringIO()
+            csv.writer(buf).writerows(day_rows)
+            data = buf.getvalue().encode('utf-8')
+            with _open_locked(os.path.join(self.hot_dir, f'{day}.csv'), 'ab') as f:
+                f.write(data)
+            self.bytes_written += len(data)
+        return sum(len(r) for r in by_day.values())
+
+    # ---------- Layout ----------
+    def hot_segments(self):
+        """[(day, path)] for the uncompacted CSV segments, oldest first."""
+        segments = []
+        for name in sorted(os.listdir(self.hot_dir)):
+            if name.endswith('.csv'):
+                segments.append((name[:-4], os.path.join(self.hot_dir, name)))
+        return segments
+
+    def csv_segments(self):
+        """Every CSV file that still holds rows, including the legacy log."""
+        paths = [path for _, path in self.hot_segments()]
+        if self.legacy_csv and os.path.exists(self.legacy_csv):
+            paths.insert(0, self.legacy_csv)
+        return paths
+
+    def parquet_days(self):
+        return sorted(name[4:] for name in os.listdir(self.parquet_dir) if name.startswith('day='))
+
+    def version(self):
+        """Cheap fingerprint that changes whenever any segment changes."""
+        stamp = []
+        for path in self.csv_segments():
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(stamp), tuple(self.parquet_days())
+
+    # ---------- Reading ----------
+    @staticmethod
+    def _parse_csv(f):
+        return [parse_row(fields) for fields in csv.reader(f) if fields and not is_header(fields)]
+
+    @staticmethod
+    def _read_csv(path):
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            return QueryLog._parse_csv(f)
+
+    def _legacy_rows(self):
+        """{day: rows} of the legacy log, cached until its stat changes."""
+        try:
+            st = os.stat(self.legacy_csv) if self.legacy_csv else None
+        except FileNotFoundError:
+            st = None
+        if st is None:
+            return {}
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._legacy[0] != stamp:
+            by_day = {}
+            for row in self._read_csv(self.legacy_csv):
+                by_day.setdefault(_day_of(row['date']), []).append(row)
+            self._legacy = (stamp, by_day)
+        return self._legacy[1]
+
+    def _dataset(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        partitioning = ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive')
+        # files written before source/latency_ms existed read them as nulls
+        return ds.dataset(self.parquet_dir, format='parquet', partitioning=partitioning,
+                          schema=_parquet_schema().append(pa.field('day', pa.string())))
+
+    def iter_parquet_batches(self, columns=None, day=None, start_day=None, end_day=None, intent=None):
+        """Yield pyarrow record batches, reading only the requested columns."""
+        if not self.parquet_days():
+            return
+        import pyarrow.dataset as ds
+        condition = None
+        for expr in (
+            ds.field('day') == day if day else None,
+            ds.field('day') >= start_day if start_day else None,
+            ds.field('day') <= end_day if end_day else None,
+            ds.field('intent') == intent if intent else None,
+        ):
+            if expr is not None:
+                condition = expr if condition is None else condition & expr
+        yield from self._dataset().to_batches(columns=columns, filter=condition)
+
+    def _iter_day_rows(self, day, columns, intent, hot_paths, legacy_rows):
+        for batch in self.iter_parquet_batches(columns=columns, day=day, intent=intent):
+            yield from batch.to_pylist()
+        for row in legacy_rows.get(day, ()):
+            yield row
+        if day in hot_paths:
+            for row in self._read_csv(hot_paths[day]):
+                if not intent or row['intent'] == intent:
+                    yield row
+
+    def _plan(self, start_day, end_day, intent):
+        hot_paths = dict(self.hot_segments())
+        legacy_rows = self._legacy_rows()
+        if intent:
+            legacy_rows = {day: [r for r in rows if r['intent'] == intent] for day, rows in legacy_rows.items()}
+            legacy_rows = {day: rows for day, rows in legacy_rows.items() if rows}
+        days = set(hot_paths) | set(self.parquet_days()) | set(legacy_rows)
+        days = sorted(d for d in days
+                      if (not start_day or d >= start_day) and (not end_day or d <= end_day))
+        return days, hot_paths, legacy_rows
+
+    def read(self, columns=None, start_day=None, end_day=None, intent=None, limit=1000):
+        """Most recent rows (newest day first) as a DataFrame, at most `limit` rows."""
+        import pandas as pd
+        columns = list(columns or QUERY_FIELDS)
+        days, hot_paths, legacy_rows = self._plan(start_day, end_day, intent)
+        picked = []
+        for day in reversed(days):
+            day_rows = list(self._iter_day_rows(day, columns, intent, hot_paths, legacy_rows))
+            picked = day_rows + picked
+            if limit and len(picked) >= limit:
+                picked = picked[-limit:]
+                break
+        return pd.DataFrame([{c: r.get(c) for c in columns} for r in picked], columns=columns)
+
+    def iter_csv(self, start_day=None, end_day=None, intent=None):
+        """Stream matching rows as CSV text, one day at a time."""
+        days, hot_paths, legacy_rows = self._plan(start_day, end_day, intent)
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(QUERY_FIELDS)
+        for day in days:
+            for row in self._iter_day_rows(day, QUERY_FIELDS, intent, hot_paths, legacy_rows):
+                writer.writerow([row[c] if row[c] is not None else '' for c in QUERY_FIELDS])
+                if buf.tell() >= 64 * 1024:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+        yield buf.getvalue()
+
+    # ---------- Compaction ----------
+    def _write_parquet(self, day, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = _parquet_schema()
+        table = pa.table({field.name: pa.array([r[field.name] for r in rows], field.type)
+                          for field in schema}, schema=schema)
+        day_dir = os.path.join(self.parquet_dir, f'day={day}')
+        os.makedirs(day_dir, exist_ok=True)
+        name = f'part-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet'
+        tmp_path = os.path.join(day_dir, '.' + name)
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(day_dir, name))
+
+    def compact(self, analytics=None, grace_seconds=300, readers=()):
+        """Move finished CSV segments into Parquet; returns rows compacted.
+
+        Only days before today whose segment has been idle for
+        `grace_seconds` are compacted. If `analytics` is given it is
+        refreshed first so no row is dropped before it has been counted;
+        so is every object in `readers` (anything else that follows the
+        CSV segments with refresh()).
+        """
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        now = time.time()
+        ready = [(day, path) for day, path in self.hot_segments()
+                 if day < today and now - os.path.getmtime(path) >= grace_seconds]
+        legacy = self.legacy_csv if self.legacy_csv and os.path.exists(self.legacy_csv) else None
+        if not ready and not legacy:
+            return 0
+        for reader in ([analytics] if analytics is not None else []) + list(readers):
+            reader.refresh()
+
+        compacted = 0
+        if legacy:
+            for day, rows in self._legacy_rows().items():
+                self._write_parquet(day, rows)
+                compacted += len(rows)
+            os.replace(legacy, legacy + '.imported')
+            self._legacy = (None, {})
+        for day, path in ready:
+            # under the writers' lock, so no append lands between the read and the remove
+            f = _open_locked(path, 'r', encoding='utf-8', errors='replace', newline='')
+            if f is None:
+                continue
+            with f:
+                rows = self._parse_csv(f)
+                if rows:
+                    self._write_parquet(day, rows)
+                    compacted += len(rows)
+                os.remove(path)
+        return compacted
+
+
+if __name__ == '__main__':
+    # python query_log.py compact
+    if sys.argv[1:] == ['compact']:
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+        log = QueryLog(data_dir, legacy_csv=os.path.join(data_dir, 'user_queries.csv'))
+        from analytics import QueryAnalytics
+        import intent_mining
+        print(log.compact(QueryAnalytics(log, os.path.join(data_dir, 'analytics.db')),
+                          readers=[intent_mining.from_env(log, data_dir)]), 'rows compacted')
+    else:
+        print('usage: python query_log.py compact')
@@ -0,0 +1,32 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+ADMIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORTAL_DIR = os.path.join(os.path.dirname(ADMIN_DIR), 'bank_portal_with_bot')
+sys.path.insert(0, ADMIN_DIR)
+sys.path.append(PORTAL_DIR)
+
+os.environ.update({
+    'BANKBOT_CHAT_EVENTS_DB': '',
+    'BANKBOT_MINING_INTERVAL': '0',
+})
+
+
+@pytest.fixture
+def query_log(tmp_path):
+    from query_log import QueryLog
+    return QueryLog(str(tmp_path), legacy_csv=str(tmp_path / 'user_queries.csv'))
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """backend.py loaded from a copy, so its data/ directory is a scratch one."""
+    shutil.copy(os.path.join(ADMIN_DIR, 'backend.py'), tmp_path / 'backend.py')
+    spec = importlib.util.spec_from_file_location('backend', tmp_path / 'backend.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
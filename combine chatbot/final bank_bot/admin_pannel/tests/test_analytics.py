@@ -0,0 +1,48 @@
+import os
+
+from analytics import QueryAnalytics
+
+
+def test_refresh_reads_only_new_rows(query_log, tmp_path):
+    analytics = QueryAnalytics(query_log, str(tmp_path / 'analytics.db'))
+    query_log.append([['hi', 'greeting', 0.95, '2024-01-01T10:00:00', 'exact', 0.2],
+                      ['??', 'out_of_scope', 0.05, '2024-01-01T11:00:00']])
+    assert analytics.refresh() == 2
+    assert analytics.refresh() == 0
+    query_log.append([['rate', 'loan', 0.55, '2024-01-02T10:00:00']])
+    assert analytics.refresh() == 1
+    summary = analytics.summary()
+    assert summary['total'] == 3
+    assert summary['success_rate'] == 2 / 3
+    assert summary['intent_counts'] == {'greeting': 1, 'out_of_scope': 1, 'loan': 1}
+    assert summary['confidence_hist'][0] == 1 and summary['confidence_hist'][9] == 1
+    assert summary['daily_volume'] == [('2024-01-01', 2), ('2024-01-02', 1)]
+
+
+def test_compacted_rows_are_not_counted_twice(query_log, tmp_path):
+    analytics = QueryAnalytics(query_log, str(tmp_path / 'analytics.db'))
+    query_log.append([['hi', 'greeting', 0.9, '2024-01-01T10:00:00']])
+    for _, path in query_log.hot_segments():
+        os.utime(path, (0, 0))
+    assert query_log.compact(analytics, grace_seconds=0) == 1
+    analytics.refresh()
+    assert analytics.summary()['total'] == 1
+    # a rebuild counts the Parquet days
+    rebuilt = QueryAnalytics(query_log, str(tmp_path / 'rebuilt.db'))
+    rebuilt.refresh()
+    assert rebuilt.summary()['total'] == 1
+
+
+def test_a_query_with_a_newline_is_counted_once(query_log, tmp_path):
+    analytics = QueryAnalytics(query_log, str(tmp_path / 'analytics.db'))
+    query_log.append([['first\nsecond', 'loan', 0.5, '2024-01-01T10:00:00']])
+    (_, path), = query_log.hot_segments()
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:8])  # the writer is halfway through the record
+    analytics.refresh()
+    with open(path, 'ab') as f:
+        f.write(data[8:])
+    analytics.refresh()
+    assert analytics.summary()['intent_counts'] == {'loan': 1}
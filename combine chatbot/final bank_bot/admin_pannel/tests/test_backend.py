@@ -0,0 +1,28 @@
+def test_export_needs_the_admin_login(backend):
+    backend.query_log.append([['my balance', 'check_balance', 0.85, '2024-01-01T10:00:00'],
+                              ['send 5', 'transfer_money', 0.85, '2024-01-02T10:00:00']])
+    client = backend.app.test_client()
+    assert client.get('/queries/export').status_code == 401
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    assert client.get('/queries/export').status_code == 401
+
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+    response = client.get('/queries/export?start=2024-01-02&intent=')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'query,intent,confidence,date,source,latency_ms'
+    assert lines[1:] == ['send 5,transfer_money,0.85,2024-01-02T10:00:00,,']
+
+
+def test_predict_batch_logs_every_query(backend):
+    client = backend.app.test_client()
+    assert client.post('/predict/batch', json={'queries': 'balance'}).status_code == 400
+    response = client.post('/predict/batch', json={'queries': ['balance please', None, 'send money']})
+    assert [r['intent'] for r in response.get_json()['results']] == ['check_balance', 'unknown', 'transfer_money']
+    assert list(backend.query_log.read(limit=0)['intent']) == ['check_balance', 'unknown', 'transfer_money']
+    backend.MAX_BATCH_SIZE = 2
+    assert client.post('/predict/batch', json={'queries': ['a', 'b', 'c']}).status_code == 413
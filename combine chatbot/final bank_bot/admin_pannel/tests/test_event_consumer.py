@@ -0,0 +1,27 @@
+import chat_events
+import event_consumer
+from event_consumer import EventConsumer
+
+
+def test_events_reach_the_query_log_with_source_and_latency(query_log, tmp_path):
+    queue = str(tmp_path / 'chat_events.db')
+    writer = chat_events.EventWriter(queue)
+    writer.emit('my balance', 'check_balance', source='exact', confidence=0.97, latency_ms=1.23456)
+    writer.emit('???', 'out_of_scope')
+    writer.close()
+
+    consumer = EventConsumer(queue, query_log)
+    assert consumer.drain() == 2
+    assert consumer.drain() == 0
+    df = query_log.read(limit=0)
+    assert list(df['query']) == ['my balance', '???']
+    assert list(df['source'].fillna('-')) == ['exact', '-']
+    assert df['latency_ms'][0] == 1.235 and df['latency_ms'].isna()[1]
+    assert df['confidence'][1] == 0.0
+
+
+def test_from_env(query_log, tmp_path, monkeypatch):
+    monkeypatch.setenv('BANKBOT_CHAT_EVENTS_DB', '')
+    assert event_consumer.from_env(query_log) is None
+    monkeypatch.setenv('BANKBOT_CHAT_EVENTS_DB', str(tmp_path / 'q.db'))
+    assert event_consumer.from_env(query_log).queue_path == str(tmp_path / 'q.db')
@@ -0,0 +1,81 @@
+import sqlite3
+
+import numpy as np
+
+import intent_mining
+from intent_mining import IntentMiner, normalize, signatures, similarity, suggest_name
+
+CARD_QUERIES = ['how do I activate my new credit card', 'how to activate my new credit card',
+                'activate my new credit card please', 'how can I activate a new credit card']
+FX_QUERIES = ['what is the euro exchange rate today', 'euro exchange rate today', 'todays euro exchange rate']
+
+
+def log_rows(queries, intent='out_of_scope', date='2024-01-01T10:00:00'):
+    return [[q, intent, 0.1, date] for q in queries]
+
+
+def test_signatures_estimate_jaccard():
+    near, far = signatures(['activate my new credit card', 'activate my new credit cards', 'euro exchange rate'])[:2], \
+        signatures(['activate my new credit card', 'euro exchange rate'])
+    assert similarity(*near) > 0.5
+    assert similarity(*far) < 0.2
+    assert signatures(['a b c'])[0].dtype == np.uint32
+
+
+def test_normalize_and_names():
+    assert normalize('  Activate MY card #1234!! ') == 'activate my card 0'
+    assert suggest_name(['activate credit card', 'activate new credit card']) == 'activate_credit_card'
+    assert suggest_name(['the']) == 'new_intent'
+
+
+def test_unanswered_queries_are_clustered(query_log, tmp_path):
+    miner = IntentMiner(query_log, str(tmp_path / 'mining.db'))
+    query_log.append(log_rows(CARD_QUERIES * 2 + FX_QUERIES) + log_rows(['hello there'], intent='greeting'))
+    assert miner.refresh() == len(CARD_QUERIES) + len(FX_QUERIES)
+    candidates = miner.candidates(examples=2)
+    assert [(c['queries'], c['phrasings']) for c in candidates] == [(8, 4), (3, 3)]
+    assert 'activate' in candidates[0]['name'] and 'credit' in candidates[0]['name']
+    assert len(candidates[0]['examples']) == 2
+    # only new rows are read; a known phrasing just counts again
+    query_log.append(log_rows(FX_QUERIES[:1]))
+    assert miner.refresh() == 0
+    assert miner.candidates()[1]['queries'] == 4
+
+
+def test_dismissed_clusters_stay_dismissed(query_log, tmp_path):
+    miner = IntentMiner(query_log, str(tmp_path / 'mining.db'))
+    query_log.append(log_rows(CARD_QUERIES))
+    miner.refresh()
+    cluster = miner.candidates()[0]['cluster']
+    miner.set_status(cluster, 'dismissed')
+    query_log.append(log_rows(['how do I activate my new credit card today']))
+    miner.refresh()
+    assert miner.candidates() == []
+
+
+def test_conversations_are_read_when_chat_events_are_off(query_log, tmp_path, monkeypatch):
+    state_db = tmp_path / 'chat_state.db'
+    conn = sqlite3.connect(state_db)
+    conn.executescript('''
+        CREATE TABLE chat_users (user_id TEXT PRIMARY KEY, state TEXT, turns INTEGER, seq INTEGER);
+        CREATE TABLE chat_turns (user_id TEXT, n INTEGER, user_message TEXT, bot_reply TEXT, intent TEXT);
+    ''')
+    conn.execute("INSERT INTO chat_users VALUES ('1', '{}', 2, 1)")
+    conn.executemany('INSERT INTO chat_turns VALUES (?, ?, ?, ?, ?)',
+                     [('1', 0, CARD_QUERIES[0], '', 'out_of_scope'), ('1', 1, CARD_QUERIES[1], '', 'out_of_scope')])
+    conn.commit()
+    conn.close()
+    query_log.append(log_rows(CARD_QUERIES[:2]))
+
+    monkeypatch.setenv('BANKBOT_STATE_DB', str(state_db))
+    monkeypatch.setenv('BANKBOT_CHAT_EVENTS_DB', str(tmp_path / 'chat_events.db'))
+    (tmp_path / 'on').mkdir()
+    events_on = intent_mining.from_env(query_log, str(tmp_path / 'on'))
+    assert events_on.conversations_db is None
+
+    monkeypatch.setenv('BANKBOT_CHAT_EVENTS_DB', '')
+    (tmp_path / 'off').mkdir()
+    events_off = intent_mining.from_env(query_log, str(tmp_path / 'off'))
+    assert events_off.conversations_db == str(state_db)
+    events_off.refresh()
+    assert events_off.candidates()[0]['queries'] == 4
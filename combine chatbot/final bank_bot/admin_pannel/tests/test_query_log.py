@@ -0,0 +1,124 @@
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from query_log import QUERY_FIELDS, tail_csv
+
+
+def records(df):
+    # pandas shows missing values as NaN
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def age(query_log):
+    for _, path in query_log.hot_segments():
+        os.utime(path, (0, 0))
+
+
+def test_rows_go_to_their_days_segment(query_log):
+    query_log.append([['hi', 'greeting', 0.9, '2024-01-01T10:00:00'],
+                      ['rate?', 'loan', 0.5, '2024-01-02T10:00:00', 'tfidf', 1.5]])
+    assert [day for day, _ in query_log.hot_segments()] == ['2024-01-01', '2024-01-02']
+    df = query_log.read()
+    assert list(df.columns) == QUERY_FIELDS
+    assert records(df) == [
+        {'query': 'hi', 'intent': 'greeting', 'confidence': 0.9, 'date': '2024-01-01T10:00:00', 'source': None,
+         'latency_ms': None},
+        {'query': 'rate?', 'intent': 'loan', 'confidence': 0.5, 'date': '2024-01-02T10:00:00', 'source': 'tfidf',
+         'latency_ms': 1.5}]
+
+
+def test_read_filters_and_limits(query_log):
+    query_log.append([[f'q{i}', 'loan' if i % 2 else 'greeting', 0.5, f'2024-01-0{1 + i % 3}'] for i in range(9)])
+    assert list(query_log.read(limit=2)['query']) == ['q5', 'q8']
+    assert set(query_log.read(intent='loan')['intent']) == {'loan'}
+    assert list(query_log.read(start_day='2024-01-02', end_day='2024-01-02', limit=0)['query']) == ['q1', 'q4', 'q7']
+
+
+def test_compaction_keeps_every_row_and_column(query_log):
+    query_log.append([['hi', 'greeting', 0.9, '2024-01-01T10:00:00', 'exact', 0.25],
+                      ['new', 'greeting', 0.9, '2999-01-01T10:00:00']])
+    with open(query_log.legacy_csv, 'w') as f:
+        f.write('query,intent,confidence,date\nold,loan,0.4,2023-12-31T09:00:00\n')
+    age(query_log)
+    assert query_log.compact(grace_seconds=0) == 2
+    assert query_log.parquet_days() == ['2023-12-31', '2024-01-01']
+    assert [day for day, _ in query_log.hot_segments()] == ['2999-01-01']
+    assert os.path.exists(query_log.legacy_csv + '.imported')
+    rows = records(query_log.read(limit=0))
+    assert [(r['query'], r['source'], r['latency_ms']) for r in rows] == [
+        ('old', None, None), ('hi', 'exact', 0.25), ('new', None, None)]
+
+
+def test_an_append_during_compaction_starts_a_new_segment(query_log, monkeypatch):
+    query_log.append([['old', 'loan', 0.5, '2024-01-01T10:00:00']])
+    age(query_log)
+    late = threading.Thread(target=query_log.append, args=([['late', 'loan', 0.5, '2024-01-01T11:00:00']],))
+    write_parquet = query_log._write_parquet
+
+    def write_while_an_append_waits(day, rows):
+        late.start()
+        late.join(0.2)
+        assert late.is_alive()  # blocked on the segment's lock
+        write_parquet(day, rows)
+
+    monkeypatch.setattr(query_log, '_write_parquet', write_while_an_append_waits)
+    assert query_log.compact(grace_seconds=0) == 1
+    late.join()
+    assert [day for day, _ in query_log.hot_segments()] == ['2024-01-01']
+    assert list(query_log.read(limit=0)['query']) == ['old', 'late']
+
+
+def test_parquet_written_before_source_and_latency_reads_them_as_null(query_log):
+    day_dir = os.path.join(query_log.parquet_dir, 'day=2023-01-01')
+    os.makedirs(day_dir)
+    pq.write_table(pa.table({'query': ['x'], 'intent': ['loan'], 'confidence': [0.5], 'date': ['2023-01-01']}),
+                   os.path.join(day_dir, 'old.parquet'))
+    assert records(query_log.read(intent='loan')) == [
+        {'query': 'x', 'intent': 'loan', 'confidence': 0.5, 'date': '2023-01-01', 'source': None,
+         'latency_ms': None}]
+
+
+def test_legacy_csv_is_parsed_again_only_when_it_changes(query_log, monkeypatch):
+    with open(query_log.legacy_csv, 'w') as f:
+        f.write('query,intent,confidence,date\nold,loan,0.4,2023-12-31T09:00:00\n')
+    reads = []
+    read_csv = type(query_log)._read_csv
+    monkeypatch.setattr(type(query_log), '_read_csv', staticmethod(lambda path: reads.append(path) or read_csv(path)))
+    assert len(query_log.read()) == 1
+    assert len(query_log.read(intent='loan')) == 1
+    assert reads == [query_log.legacy_csv]
+    with open(query_log.legacy_csv, 'a') as f:
+        f.write('older,greeting,0.9,2023-12-30T09:00:00\n')
+    assert len(query_log.read()) == 2
+    assert len(reads) == 2
+
+
+def test_export_streams_csv(query_log):
+    query_log.append([['a,b', 'greeting', 0.9, '2024-01-01T10:00:00', 'exact', 0.1],
+                      ['c', 'loan', 0.5, '2024-01-02T10:00:00']])
+    text = ''.join(query_log.iter_csv(intent='greeting'))
+    assert text.splitlines() == [','.join(QUERY_FIELDS), '"a,b",greeting,0.9,2024-01-01T10:00:00,exact,0.1']
+
+
+def test_tail_keeps_quoted_newlines_in_one_record(tmp_path):
+    path = tmp_path / 'segment.csv'
+    path.write_bytes(b'"two\nlines ""quoted""",loan,0.5,2024-01-01\r\nplain,greeting,0.9,2024-01-01\r\n')
+    rows = [['two\nlines "quoted"', 'loan', '0.5', '2024-01-01'], ['plain', 'greeting', '0.9', '2024-01-01']]
+    for block_size in (1, 7, 64 * 1024):
+        records = []
+        assert tail_csv(str(path), 0, records.append, block_size) == path.stat().st_size
+        assert records == rows, block_size
+
+
+def test_tail_waits_for_a_record_cut_inside_its_quotes(tmp_path):
+    path = tmp_path / 'segment.csv'
+    data = b'"two\nlines",loan,0.5,2024-01-01\r\n'
+    path.write_bytes(data[:6])
+    records = []
+    assert tail_csv(str(path), 0, records.append) == 0
+    path.write_bytes(data)
+    assert tail_csv(str(path), 0, records.append) == len(data)
+    assert records == [['two\nlines', 'loan', '0.5', '2024-01-01']]
@@ -0,0 +1,124 @@
+# admin_probe.py
+# Keeps track of whether the admin panel is reachable so /admin/launch can
+# answer without blocking on sockets or walking the project tree.
+import os
+import re
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def find_local_admin_file(base_dir):
+    """Path of an admin script under base_dir, preferring admin_app.py."""
+    candidates = []
+    for root, dirs, files in os.walk(base_dir):
+        for name in files:
+            lname = name.lower()
+            if 'admin' in lname and lname.endswith('.py'):
+                candidates.append(os.path.join(root, name))
+    for p in candidates:
+        if os.path.basename(p).lower() == 'admin_app.py':
+            return p
+    return candidates[0] if candidates else None
+
+
+def infer_admin_port_and_path(admin_file_path):
+    port = None
+    route_path = '/admin'
+    try:
+        with open(admin_file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            src = f.read()
+        m = re.search(r'\b(app|admin_app)\.run\([^)]*port\s*=\s*(\d+)', src)
+        if m:
+            port = int(m.group(2))
+        else:
+            m2 = re.search(r'\bPORT\s*=\s*(\d+)', src)
+            if m2:
+                port = int(m2.group(1))
+        if re.search(r"@\w+\.route\(['\"]\/admin\/login['\"]", src):
+            route_path = '/admin/login'
+        elif re.search(r"@\w+\.route\(['\"]\/admin['\"]", src):
+            route_path = '/admin'
+    except Exception:
+        pass
+    if not port:
+        port = 8501  # streamlit default if your admin is a streamlit app
+    return port, route_path
+
+
+def can_connect(host, port, timeout=2):
+    try:
+        s = socket.create_connection((host, port), timeout=timeout)
+        s.close()
+        return True
+    except Exception:
+        return False
+
+
+class AdminPanelProbe:
+    """Background prober for the admin panel.
+
+    The local admin script is discovered once; a daemon thread then checks
+    the configured URL (and the discovered port) every `ttl` seconds.
+    status() only returns the latest snapshot, so callers never wait on a
+    connection attempt. It is None until the first probe finishes.
+    """
+
+    def __init__(self, panel_url, base_dir, ttl=10.0, timeout=2.0, min_interval=1.0):
+        self.panel_url = panel_url
+        self.base_dir = base_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self._state = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='admin-probe', daemon=True)
+                self._thread.start()
+
+    def status(self):
+        return self._state
+
+    def refresh(self):
+        """Ask for an early probe unless the last one is very recent."""
+        state = self._state
+        if state is None or time.monotonic() - state['checked_at'] >= self.min_interval:
+            self._wake.set()
+
+    def _discover(self):
+        admin_file = find_local_admin_file(self.base_dir)
+        discovery = {'admin_file': admin_file, 'suggested_url': None, 'suggested_cmd': None, 'suggested_port': None}
+        if admin_file:
+            port, route_path = infer_admin_port_and_path(admin_file)
+            folder, name = os.path.dirname(admin_file), os.path.basename(admin_file)
+            discovery.update({
+                'suggested_port': port,
+                'suggested_url': f'http://localhost:{port}{route_path}',
+                # the script is a .py file, so suggest running it with streamlit
+                'suggested_cmd': f'cd "{folder}"\nstreamlit run "{name}"',
+            })
+        return discovery
+
+    def _probe(self, discovery):
+        parsed = urlparse(self.panel_url)
+        host = parsed.hostname or 'localhost'
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        reachable_url = None
+        if can_connect(host, port, self.timeout):
+            reachable_url = self.panel_url
+        elif discovery['suggested_port'] and can_connect('localhost', discovery['suggested_port'], self.timeout):
+            reachable_url = discovery['suggested_url']
+        return dict(discovery, reachable_url=reachable_url, checked_at=time.monotonic())
+
+    def _run(self):
+        discovery = self._discover()
+        while True:
+            self._wake.clear()
+            self._state = self._probe(discovery)
+            self._wake.wait(self.ttl)
@@ -0,0 +1,201 @@
+# admission.py
+# Admission control for /api/chat: a token bucket per user and a cap on
+# chats in progress. Requests over either limit are turned away before
+# they touch the database, with a Retry-After hint.
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_RATE = 2.0         # chats per second a user may sustain
+DEFAULT_BURST = 10         # chats a user may send at once after a pause
+DEFAULT_MAX_CONCURRENT = 64
+# Retry-After for requests shed because the server is at capacity
+OVERLOAD_RETRY_AFTER = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    stamp REAL NOT NULL
+) WITHOUT ROWID;
+'''
+
+
+class Rejected(Exception):
+    """A request turned away: HTTP `status`, retry after `retry_after` seconds."""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def headers(self):
+        return {'Retry-After': str(self.retry_after)}
+
+    def payload(self):
+        error = 'Too many requests' if self.status == 429 else 'Server busy'
+        return {'error': error, 'retry_after': self.retry_after}
+
+
+def _refill(tokens, stamp, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - stamp) * rate)
+
+
+class MemoryBuckets:
+    """Token buckets held in this process, at most `maxsize` users (LRU)."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, maxsize=100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, stamp)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take one token; returns 0 if granted, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (self.burst, now))
+            tokens = _refill(tokens, stamp, now, self.rate, self.burst)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            # a user evicted here comes back with a full bucket, which
+            # only ever errs on the side of admitting
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite table, shared by every worker process.
+
+    Each take is one short write transaction; buckets that have refilled
+    completely carry no information and are deleted now and then.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, rate=DEFAULT_RATE, burst=DEFAULT_BURST, timeout=5.0):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._takes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def take(self, key):
+        key = str(key)
+        with self._lock:
+            # wall clock, so every process agrees on the refill
+            now = time.time()
+            with self._transaction() as conn:
+                row = conn.execute('SELECT tokens, stamp FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+                tokens = _refill(row[0], row[1], now, self.rate, self.burst) if row else self.burst
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / self.rate
+                conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, stamp) VALUES (?, ?, ?)',
+                             (key, tokens, now))
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    conn.execute('DELETE FROM rate_buckets WHERE stamp < ?', (now - self.burst / self.rate,))
+            return wait
+
+
+class AdmissionController:
+    """Per-user token buckets plus a limit on chats in progress.
+
+    admit() raises Rejected with 503 when `max_concurrent` chats are
+    already running in this process and 429 when the user's bucket is
+    empty; otherwise it returns a release function to call when the chat
+    is done. `buckets` is a MemoryBuckets or SQLiteBuckets, or None to
+    skip per-user limits.
+    """
+
+    def __init__(self, buckets=None, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        self.buckets = buckets
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.shed = {'rate_limited': 0, 'overloaded': 0}
+        self._lock = threading.Lock()
+
+    def admit(self, user_id):
+        with self._lock:
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                self.shed['overloaded'] += 1
+                raise Rejected(503, OVERLOAD_RETRY_AFTER, 'overloaded')
+            self.in_flight += 1
+        try:
+            wait = self.buckets.take(user_id) if self.buckets is not None else 0.0
+        except BaseException:
+            self._release()
+            raise
+        if wait > 0:
+            self._release()
+            with self._lock:
+                self.shed['rate_limited'] += 1
+            raise Rejected(429, max(1, math.ceil(wait)), 'rate_limited')
+        return self._release
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def admitted(self, user_id):
+        release = self.admit(user_id)
+        try:
+            yield
+        finally:
+            release()
+
+
+def from_env(environ=None):
+    """Controller configured from BANKBOT_RATE_LIMIT_* and BANKBOT_CHAT_MAX_CONCURRENT.
+
+    The concurrency limit is for the whole server; each of the
+    BANKBOT_WORKERS processes enforces its share. Buckets live in this
+    process unless BANKBOT_RATE_LIMIT_DB names a SQLite file, which
+    makes the per-user limits hold across workers.
+    """
+    environ = os.environ if environ is None else environ
+    rate = float(environ.get('BANKBOT_RATE_LIMIT_PER_S', str(DEFAULT_RATE)))
+    burst = float(environ.get('BANKBOT_RATE_LIMIT_BURST', str(DEFAULT_BURST)))
+    max_concurrent = int(environ.get('BANKBOT_CHAT_MAX_CONCURRENT', str(DEFAULT_MAX_CONCURRENT)))
+    workers = max(1, int(environ.get('BANKBOT_WORKERS', '1')))
+    if max_concurrent > 0:
+        max_concurrent = max(1, math.ceil(max_concurrent / workers))
+    buckets = None
+    if rate > 0:
+        path = environ.get('BANKBOT_RATE_LIMIT_DB')
+        buckets = SQLiteBuckets(path, rate, burst) if path else MemoryBuckets(rate, burst)
+    return AdmissionController(buckets, max_concurrent)
@@ -2,13 +2,28 @@ import os
 import json
 import csv
 import re
-import string
+import atexit
+import time
 from flask import Flask, render_template, request, redirect, url_for, session
 from flask_sqlalchemy import SQLAlchemy
-from urllib.parse import urlparse
-import socket
 import fnmatch
+import io
 import pathlib
+from intent_index import ResultCache, normalize_text
+from intent_engine import DEFAULT_ARTIFACT_DIR
+from intent_reloader import IntentIndex, IntentReloader, training_rows
+from faq_index import DEFAULT_MIN_CONFIDENCE, FAQ_INTENT
+from spell_index import DEFAULT_MAX_DISTANCE
+import dialogue
+import admission
+import user_import
+from conversation_store import ConversationStore, migrate_conversation_log, migrate_user_data
+from dataset_writer import DatasetWriter
+from chat_events import EventWriter
+from watched_file import WatchedFile
+from static_assets import DIST, MANIFEST, Assets, load_manifest, send_built
+from admin_probe import AdminPanelProbe
+import metrics
 
 # Initialize Flask app
 templates_path = os.path.join(os.path.dirname(__file__), 'templates')
@@ -18,25 +33,50 @@ app.secret_key = 'bank_secret_key'
 # Allow configuring admin panel URL via environment variable (default port 5001)
 ADMIN_PANEL_URL = os.environ.get('ADMIN_PANEL_URL', 'http://localhost:8501/')
 
+# Minimum TF-IDF cosine score for the intent engine to accept a match
+INTENT_THRESHOLD = float(os.environ.get('BANKBOT_INTENT_THRESHOLD', '0.2'))
+
+# BM25 similarity (0..1) an FAQ question needs to answer a message
+FAQ_MIN_CONFIDENCE = float(os.environ.get('BANKBOT_FAQ_MIN_CONFIDENCE', str(DEFAULT_MIN_CONFIDENCE)))
+
+# Typo correction: edits allowed per word (one for words under 5 letters)
+# and the time one message may spend on it; words left when the budget runs
+# out are matched as typed
+SPELL_MAX_DISTANCE = int(os.environ.get('BANKBOT_SPELL_MAX_DISTANCE', str(DEFAULT_MAX_DISTANCE)))
+SPELL_BUDGET_MS = float(os.environ.get('BANKBOT_SPELL_BUDGET_MS', '5'))
+
+# Size of the LRU cache of intent lookups for repeated messages
+INTENT_CACHE_SIZE = int(os.environ.get('BANKBOT_INTENT_CACHE_SIZE', '1024'))
+
 # Configure Database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///bank.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('BANKBOT_DATABASE_URI', 'sqlite:///bank.db')
 db = SQLAlchemy(app)
 
-# Training data file path
-TRAINING_DATA_FILE = os.path.join(os.path.dirname(__file__), 'training_data.json')
+# Training intents and FAQs are edited in the admin panel (admin_pannel/data)
+ADMIN_DATA_DIR = os.environ.get('BANKBOT_ADMIN_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'admin_pannel', 'data'))
+TRAINING_DATA_FILE = os.environ.get('BANKBOT_TRAINING_FILE', os.path.join(ADMIN_DATA_DIR, 'training.json'))
+FAQ_FILE = os.environ.get('BANKBOT_FAQ_FILE', os.path.join(ADMIN_DATA_DIR, 'faq.json'))
+# Seconds between checks of those files for admin edits
+INTENT_RELOAD_INTERVAL = float(os.environ.get('BANKBOT_INTENT_RELOAD_INTERVAL', '2'))
 
 # Load training data
-def load_training_data():
-    if os.path.exists(TRAINING_DATA_FILE):
-        with open(TRAINING_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+def load_training_data(path=TRAINING_DATA_FILE):
+    with open(path, 'r') as f:
+        return json.load(f)
 
-training_data = load_training_data()
+# Re-read whenever the file changes, so every worker serves the same copy
+training_data = WatchedFile(TRAINING_DATA_FILE, load_training_data, default={})
+faq_data = WatchedFile(FAQ_FILE, load_training_data, default=[])
+
+def get_training_data():
+    return training_data.get()
 
 # Load CSV dataset
-DATASET_PATH = os.path.join(os.path.dirname(__file__), 'bankbot', 'milestone 2', 'bank_chatbot_dataset.csv')
-USER_DATA_FILE = os.path.join(os.path.dirname(__file__), 'user_data.json')
+# Each path can be overridden from the environment (used by benchmarks/)
+DATASET_PATH = os.environ.get('BANKBOT_DATASET_PATH', os.path.join(os.path.dirname(__file__), 'bankbot', 'milestone 2', 'bank_chatbot_dataset.csv'))
+USER_DATA_FILE = os.environ.get('BANKBOT_USER_DATA_FILE', os.path.join(os.path.dirname(__file__), 'user_data.json'))
+CONVERSATION_LOG_FILE = os.environ.get('BANKBOT_CONVERSATION_LOG', os.path.join(os.path.dirname(__file__), 'conversations.jsonl'))
+STATE_DB_FILE = os.environ.get('BANKBOT_STATE_DB', os.path.join(os.path.dirname(__file__), 'chat_state.db'))
 
 def load_dataset():
     dataset = []
@@ -52,117 +92,169 @@ def load_dataset():
                 dataset.append(row)
     return dataset
 
-def load_user_data():
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_user_data(data):
-    with open(USER_DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
+# rows past this offset were appended by other workers after we loaded
+dataset_offset = os.path.getsize(DATASET_PATH) if os.path.exists(DATASET_PATH) else 0
 dataset = load_dataset()
-user_data = load_user_data()
-
-# Normalization helper
-def normalize_text(s):
-    if not s:
-        return ''
-    s = s.lower().strip()
-    s = s.replace("what's", "what is").replace("it's", "it is").replace("i'm", "i am")
-    allowed = set(string.ascii_lowercase + string.digits + ' ')
-    s = ''.join(ch for ch in s if ch in allowed)
-    s = ' '.join(s.split())
-    return s
+
+# Conversations and per-user chat state live in a SQLite database shared by
+# all workers; the older conversations.jsonl or user_data.json is imported
+# once on first start. Active users' sessions stay in memory up to
+# BANKBOT_SESSION_MEMORY_MB.
+SESSION_MEMORY_MB = float(os.environ.get('BANKBOT_SESSION_MEMORY_MB', '64'))
+conversation_store = ConversationStore(STATE_DB_FILE, memory_budget=int(SESSION_MEMORY_MB * 1024 * 1024))
+migrate_conversation_log(CONVERSATION_LOG_FILE, conversation_store)
+migrate_user_data(USER_DATA_FILE, conversation_store)
+
+intent_cache = ResultCache(maxsize=INTENT_CACHE_SIZE)
+
+def build_intent_index(rows, training, faq):
+    return IntentIndex(rows + training_rows(training, rows), faq,
+                       threshold=INTENT_THRESHOLD, artifact_dir=DEFAULT_ARTIFACT_DIR,
+                       spell_distance=SPELL_MAX_DISTANCE)
+
+# Matcher and TF-IDF engine over the dataset plus the admin training
+# examples, a BM25 index of the admin FAQs and a spelling index of their
+# words. Admin edits trigger a
+# background rebuild that replaces the whole index at once. Fitted models
+# are memory-mapped from model_cache/ when their input is unchanged
+# (BANKBOT_MODEL_DIR, empty to always refit).
+intent_reloader = IntentReloader(dataset, [training_data, faq_data], build_intent_index,
+                                 interval=INTENT_RELOAD_INTERVAL, on_swap=intent_cache.clear)
+intent_reloader.start()
+
+# ---------- Metrics ----------
+# Served at /metrics; set BANKBOT_PROFILE_SLOW_MS to keep folded stacks of
+# requests slower than that under profiles/ (see metrics.py).
+CHAT_STAGE_SECONDS = metrics.REGISTRY.histogram(
+    'bankbot_chat_stage_seconds', 'Time spent in each stage of /api/chat.', ['stage'])
+INTENT_MATCHES = metrics.REGISTRY.counter(
+    'bankbot_intent_match_total', 'Uncached intent lookups by the pass that answered them.', ['source'])
+SPELL_CORRECTIONS = metrics.REGISTRY.counter(
+    'bankbot_spell_corrections_total', 'Messages whose typos were corrected, or cut short by the time budget.', ['outcome'])
+profiler = metrics.profiler_from_env(os.path.join(os.path.dirname(__file__), 'profiles'))
+request_seconds = metrics.install_flask(app, 'bankbot', profiler=profiler)
+
+DIGITS_RE = re.compile(r'\d+')
 
 def find_intent_response(user_message):
-    if not user_message:
-        return None
-    message_lower = user_message.strip().lower()
-    message_norm = normalize_text(user_message)
-
-    for row in dataset:
-        row_text = (row.get('text') or '').strip().lower()
-        row_norm = normalize_text(row_text)
-        if row_norm and row_norm == message_norm:
-            return {
-                'intent': row.get('intent', ''),
-                'response': row.get('response', ''),
-                'entities': row.get('entities', '')
-            }
-
-    message_digits = re.findall(r'\d+', user_message)
-    digits_concat = ''.join(message_digits)
-    for row in dataset:
-        entities = (row.get('entities') or '').strip()
-        if 'ACCOUNT_NUMBER' in entities or 'MONEY' in entities:
-            parts = [p for p in entities.split('|') if ':' in p]
-            for p in parts:
-                key, val = p.split(':', 1)
-                val = val.strip()
-                if val and re.search(r'\d+', val):
-                    if val in user_message or val in digits_concat or any(val == d for d in message_digits):
-                        return {
-                            'intent': row.get('intent', ''),
-                            'response': row.get('response', ''),
-                            'entities': row.get('entities', '')
-                        }
-
-    msg_tokens = set(message_norm.split())
-    best_row = None
-    best_score = 0
-    for row in dataset:
-        row_text = (row.get('text') or '').strip().lower()
-        row_norm = normalize_text(row_text)
-        if not row_norm:
-            continue
-        row_tokens = set(row_norm.split())
-        overlap = len(msg_tokens & row_tokens)
-        score = overlap
-        if score > best_score:
-            best_score = score
-            best_row = row
-    if best_row and best_score >= 1:
-        return {
-            'intent': best_row.get('intent', ''),
-            'response': best_row.get('response', ''),
-            'entities': best_row.get('entities', '')
-        }
+    return lookup_intent(user_message)[2]
 
-    return None
+def lookup_intent(user_message):
+    """(matcher pass, confidence, result) for a message.
 
-def extract_entities(text, entities_str):
-    entities = {}
-    if not entities_str:
-        return entities
-
-    for ent in entities_str.split('|'):
-        if ':' in ent:
-            key, val = ent.split(':', 1)
-            key = key.strip().upper()
-            val = val.strip()
-            if key == 'ACCOUNT_NUMBER' and val:
-                entities['account_number'] = val
-            elif key == 'MONEY' and val:
-                entities['amount'] = val
-            elif key == 'PERSON' and val:
-                entities['person'] = val
-
-    if 'account_number' not in entities:
-        m = re.search(r'\b(\d{6,})\b', text)
-        if m:
-            entities['account_number'] = m.group(1)
-    if 'amount' not in entities:
-        m = re.search(r'\b(\d+)\b', text)
-        if m:
-            entities['amount'] = m.group(1)
-    if 'person' not in entities:
-        m = re.search(r'\b([A-Za-z]{2,})\b', text)
-        if m:
-            entities['person'] = m.group(1)
-
-    return entities
+    Messages without digits depend only on their case-folded text, so
+    repeated phrases ("hi", "balance") are answered from the cache.
+    Digit messages can hit the entity pass and are never cached.
+    """
+    if not user_message or DIGITS_RE.search(user_message):
+        INTENT_CACHE_BYPASS.inc()
+        return _find_intent_response(user_message)
+    key = user_message.strip().lower()
+    generation = intent_cache.generation
+    found, match = intent_cache.get(key)
+    if not found:
+        match = _find_intent_response(user_message)
+        intent_cache.put(key, match, generation=generation)
+    source, confidence, result = match
+    return source, confidence, dict(result) if result else result
+
+def _find_intent_response(user_message):
+    # deterministic passes count as certain; the others carry their score
+    index = intent_reloader.current  # one index for the whole lookup, even mid-reload
+    source, result = index.matcher.match_with_pass(user_message, passes=('exact', 'entity'))
+    if result:
+        INTENT_MATCHES.inc(source=source)
+        return source, 1.0, result
+    # the looser passes see the message with its typos corrected
+    corrected, finished = index.spell.correct(user_message, SPELL_BUDGET_MS)
+    if not finished:
+        SPELL_CORRECTIONS.inc(outcome='timeout')
+    if corrected != normalize_text(user_message):
+        SPELL_CORRECTIONS.inc(outcome='corrected')
+        user_message = corrected
+        source, result = index.matcher.match_with_pass(user_message, passes=('exact',))
+        if result:
+            INTENT_MATCHES.inc(source='spelling')
+            return 'spelling', 1.0, result
+    faq = index.faq.best(user_message, FAQ_MIN_CONFIDENCE)
+    if faq is not None:
+        INTENT_MATCHES.inc(source='faq')
+        return 'faq', faq['confidence'], {'intent': FAQ_INTENT, 'response': faq['answer'], 'entities': ''}
+    scored = index.engine.predict(user_message)
+    if scored['payload'] is not None:
+        INTENT_MATCHES.inc(source='tfidf')
+        row = scored['payload']
+        return 'tfidf', scored['score'], {
+            'intent': row.get('intent', ''),
+            'response': row.get('response', ''),
+            'entities': row.get('entities', '')
+        }
+    source, result = index.matcher.match_with_pass(user_message, passes=('overlap',))
+    INTENT_MATCHES.inc(source=source or 'out_of_scope')
+    return source or 'out_of_scope', scored['score'], result
+
+# New training rows are indexed immediately and written to the CSV in
+# background batches, so chat requests never wait on the disk. Rows other
+# workers append are picked up by dataset_writer.sync() on each chat.
+def _index_dataset_row(row):
+    intent_reloader.add_row(row)
+    intent_cache.clear()
+
+dataset_writer = DatasetWriter(DATASET_PATH, existing_rows=dataset, offset=dataset_offset)
+dataset_writer.add_listener(_index_dataset_row)
+atexit.register(dataset_writer.close)
+
+# Every answered chat is queued for the admin panel's query log (see
+# chat_events.py); empty BANKBOT_CHAT_EVENTS_DB turns this off. Events are
+# dropped, never waited for, when the admin side falls behind.
+CHAT_EVENTS_DB = os.environ.get('BANKBOT_CHAT_EVENTS_DB', os.path.join(ADMIN_DATA_DIR, 'chat_events.db'))
+chat_events = None
+if CHAT_EVENTS_DB:
+    chat_events = EventWriter(CHAT_EVENTS_DB,
+                              buffer_size=int(os.environ.get('BANKBOT_CHAT_EVENTS_BUFFER', '10000')),
+                              max_pending=int(os.environ.get('BANKBOT_CHAT_EVENTS_MAX_PENDING', '1000000')))
+    atexit.register(chat_events.close)
+    metrics.REGISTRY.register_collector(
+        'bankbot_chat_events_total', 'counter', 'Chat events for the admin panel by outcome.',
+        lambda: [({'outcome': 'queued'}, chat_events.queued), ({'outcome': 'dropped'}, chat_events.dropped)])
+
+INTENT_CACHE_BYPASS = metrics.REGISTRY.counter(
+    'bankbot_intent_cache_bypass_total', 'Intent lookups not cached because the message has digits.')
+metrics.REGISTRY.register_collector(
+    'bankbot_intent_cache_total', 'counter', 'Intent cache lookups by result.',
+    lambda: [({'result': 'hit'}, intent_cache.hits), ({'result': 'miss'}, intent_cache.misses)])
+metrics.REGISTRY.register_collector(
+    'bankbot_file_write_bytes_total', 'counter', 'Bytes written to the chat data files.',
+    lambda: [({'file': 'conversations'}, conversation_store.bytes_written),
+             ({'file': 'dataset'}, dataset_writer.bytes_written)])
+metrics.REGISTRY.register_collector(
+    'bankbot_sessions', 'gauge', 'Chat sessions held in memory.',
+    lambda: [({}, conversation_store.session_info()['sessions'])])
+metrics.REGISTRY.register_collector(
+    'bankbot_session_bytes', 'gauge', 'Estimated size of the in-memory chat sessions.',
+    lambda: [({}, conversation_store.session_info()['bytes'])])
+metrics.REGISTRY.register_collector(
+    'bankbot_intent_rows', 'gauge', 'Rows indexed by the intent engine.',
+    lambda: [({}, len(intent_reloader.current.engine))])
+DIALOGUE_FOLLOW_UPS = metrics.REGISTRY.counter(
+    'bankbot_dialogue_follow_ups_total', 'Replies to a pending question answered without intent matching.', ['state'])
+metrics.REGISTRY.register_collector(
+    'bankbot_intent_reloads_total', 'counter', 'Intent index rebuilds after admin edits.',
+    lambda: [({}, intent_reloader.reloads)])
+
+# ---------- Admission control ----------
+# Each user may send BANKBOT_RATE_LIMIT_PER_S chats per second (bursts of
+# BANKBOT_RATE_LIMIT_BURST) and at most BANKBOT_CHAT_MAX_CONCURRENT chats
+# run at once; the rest get 429/503 with Retry-After before any database
+# work. Set BANKBOT_RATE_LIMIT_DB to share the per-user limits between
+# worker processes (serve.py does when --workers > 1).
+admission_control = admission.from_env()
+metrics.REGISTRY.register_collector(
+    'bankbot_chat_shed_total', 'counter', 'Chats turned away by admission control.',
+    lambda: [({'reason': reason}, n) for reason, n in admission_control.shed.items()])
+metrics.REGISTRY.register_collector(
+    'bankbot_chats_in_flight', 'gauge', 'Chats being answered by this worker.',
+    lambda: [({}, admission_control.in_flight)])
 
 def get_intent_color(intent):
     intent_colors = {
@@ -176,6 +268,7 @@ def get_intent_color(intent):
         'branch_locator': '#795548',
         'transfer_money': '#FF5722',
         'thanks': '#8BC34A',
+        FAQ_INTENT: '#3F51B5',
         'out_of_scope': '#757575'
     }
     return intent_colors.get(intent, '#757575')
@@ -202,41 +295,45 @@ class Admin(db.Model):
 with app.app_context():
     db.create_all()
 
-# Helper functions to try to find an admin script in the project (used only for helpful suggestions)
-def _find_local_admin_file(base_dir):
-    candidates = []
-    for root, dirs, files in os.walk(base_dir):
-        for name in files:
-            lname = name.lower()
-            if 'admin' in lname and lname.endswith('.py'):
-                candidates.append(os.path.join(root, name))
-    for p in candidates:
-        if os.path.basename(p).lower() == 'admin_app.py':
-            return p
-    return candidates[0] if candidates else None
-
-def _infer_admin_port_and_path(admin_file_path):
-    port = None
-    route_path = '/admin'
-    try:
-        with open(admin_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            src = f.read()
-        m = re.search(r'\b(app|admin_app)\.run\([^)]*port\s*=\s*(\d+)', src)
-        if m:
-            port = int(m.group(2))
-        else:
-            m2 = re.search(r'\bPORT\s*=\s*(\d+)', src)
-            if m2:
-                port = int(m2.group(1))
-        if re.search(r"@\w+\.route\(['\"]\/admin\/login['\"]", src):
-            route_path = '/admin/login'
-        elif re.search(r"@\w+\.route\(['\"]\/admin['\"]", src):
-            route_path = '/admin'
-    except Exception:
-        pass
-    if not port:
-        port = 8501  # streamlit default if your admin is a streamlit app
-    return port, route_path
+# Balances the bot reports come from the User table, looked up through the
+# unique index on account_number and cached for BANKBOT_BALANCE_CACHE_TTL
+# seconds (0 disables the cache). Keys are (user id, account number): a
+# user only ever sees the balance of an account they own.
+def _lookup_balance(key):
+    user_id, account_number = key
+    row = (db.session.query(User.balance)
+           .filter(User.account_number == account_number, User.id == user_id).first())
+    if row is None:
+        return None
+    return row[0] or 0.0
+
+account_cache = dialogue.AccountCache(_lookup_balance, ttl=float(os.environ.get('BANKBOT_BALANCE_CACHE_TTL', '5')))
+metrics.REGISTRY.register_collector(
+    'bankbot_account_cache_total', 'counter', 'Balance lookups by cache result.',
+    lambda: [({'result': 'hit'}, account_cache.hits), ({'result': 'miss'}, account_cache.misses)])
+
+# Reachability of the admin panel is probed in the background (every
+# BANKBOT_ADMIN_PROBE_TTL seconds) so /admin/launch never blocks on it.
+admin_probe = AdminPanelProbe(ADMIN_PANEL_URL, os.path.dirname(__file__),
+                              ttl=float(os.environ.get('BANKBOT_ADMIN_PROBE_TTL', '10')))
+admin_probe.start()
+
+# ---------- Static assets ----------
+# `python static_assets.py build` writes hashed, resized and precompressed
+# copies of static/ to static/dist/. Templates get their URLs from
+# asset_url()/asset_srcset() (plain /static URLs until a build exists), and
+# the static route serves the hashed dist/ files as immutable (the manifest
+# is revalidated), picking the gzip or brotli copy the browser accepts.
+asset_manifest = WatchedFile(os.path.join(app.static_folder, DIST, MANIFEST), load_manifest, interval=5.0)
+assets = Assets(asset_manifest.get, lambda filename: url_for('static', filename=filename))
+app.jinja_env.globals.update(asset_url=assets.url, asset_srcset=assets.srcset)
+
+def static_file(filename):
+    if filename.startswith(DIST + '/'):
+        return send_built(assets, os.path.join(app.static_folder, DIST), filename[len(DIST) + 1:], request)
+    return app.send_static_file(filename)
+
+app.view_functions['static'] = static_file
 
 # -----------------------------
 # Routes
@@ -345,46 +442,26 @@ def admin_login():
 # ---------- Admin Launch / Redirect (tries ADMIN_PANEL_URL or suggests start command) ----------
 @app.route('/admin/launch')
 def admin_launch():
-    # try configured ADMIN_PANEL_URL first
-    parsed = urlparse(ADMIN_PANEL_URL)
-    cfg_host = parsed.hostname or 'localhost'
-    cfg_port = parsed.port or (443 if parsed.scheme == 'https' else 80)
-
-    def _can_connect(host, port, timeout=2):
-        try:
-            s = socket.create_connection((host, port), timeout=timeout)
-            s.close()
-            return True
-        except Exception:
-            return False
-
-    if _can_connect(cfg_host, cfg_port):
-        return redirect(ADMIN_PANEL_URL)
-
-    # try to discover a local admin script and infer URL
-    base_dir = os.path.dirname(__file__)
-    admin_file = _find_local_admin_file(base_dir)
-    suggested_url = None
-    suggested_cmd = None
-    if admin_file:
-        port_suggest, route_path = _infer_admin_port_and_path(admin_file)
-        suggested_url = f'http://localhost:{port_suggest}{route_path}'
-        if _can_connect('localhost', port_suggest):
-            return redirect(suggested_url)
-        suggested_cmd = f'cd "{os.path.dirname(admin_file)}"\npython "{os.path.basename(admin_file)}"'
-        # If this is a Streamlit app, recommend streamlit run
-        if os.path.basename(admin_file).lower().endswith('.py'):
-            suggested_cmd = f'cd "{os.path.dirname(admin_file)}"\nstreamlit run "{os.path.basename(admin_file)}"'
+    # answered from the prober's last snapshot; no socket or file I/O here
+    state = admin_probe.status()
+    if state and state['reachable_url']:
+        return redirect(state['reachable_url'])
+    admin_probe.refresh()
+    checking = state is None
+    state = state or {}
+    admin_file = state.get('admin_file')
+    suggested_url = state.get('suggested_url')
+    suggested_cmd = state.get('suggested_cmd')
 
     # helpful HTML if nothing reachable
     msg = f"""
     <!doctype html>
     <html>
-    <head><meta charset="utf-8"><title>Admin Panel Unavailable</title></head>
+    <head><meta charset="utf-8"><meta http-equiv="refresh" content="{2 if checking else 10}"><title>Admin Panel Unavailable</title></head>
     <body style="font-family:Arial,Helvetica,sans-serif;color:#222;padding:24px;">
-      <h2>Admin panel is not reachable</h2>
+      <h2>{'Checking the admin panel…' if checking else 'Admin panel is not reachable'}</h2>
       <p>Could not connect to the admin panel at <strong>{ADMIN_PANEL_URL}</strong>.</p>
-      <p>Detected admin file: <strong>{admin_file or 'None found'}</strong></p>
+      <p>Detected admin file: <strong>{admin_file or ('Searching…' if checking else 'None found')}</strong></p>
       <p>Suggested URL to try: <strong>{suggested_url or 'N/A'}</strong></p>
       <p>If you have an admin script, start it in a separate terminal. Example:</p>
       <pre style="background:#f5f5f7;padding:12px;border-radius:6px;">{suggested_cmd or 'No local admin script found.'}</pre>
@@ -397,7 +474,7 @@ $env:ADMIN_PANEL_URL = '{suggested_url or ADMIN_PANEL_URL}'</pre>
     </body>
     </html>
     """
-    return msg, 502
+    return msg, 503 if checking else 502
 
 # ---------- Create Account ----------
 @app.route('/create_account', methods=['GET', 'POST'])
@@ -422,6 +499,7 @@ def create_account():
             user.account_type = account_type
             user.balance = float(balance)  # Convert to float before saving
             db.session.commit()
+            account_cache.invalidate((user.id, account_number))
             return redirect(url_for('dashboard'))
         except Exception as e:
             db.session.rollback()
@@ -472,39 +550,96 @@ def bankbot():
     return render_template('bankbot.html', username=session['username'])
 
 def append_to_dataset_row(text, intent, response, entities_str=''):
-    os.makedirs(os.path.dirname(DATASET_PATH), exist_ok=True)
-    file_exists = os.path.exists(DATASET_PATH) and os.path.getsize(DATASET_PATH) > 0
-
-    for row in dataset:
-        if row.get('text') == text and row.get('intent') == intent and row.get('entities') == entities_str:
-            return False
-
-    with open(DATASET_PATH, 'a', encoding='utf-8-sig', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['text','intent','response','entities'])
-        writer.writerow([text, intent, response, entities_str])
-
-    dataset.append({'text': text, 'intent': intent, 'response': response, 'entities': entities_str})
-    return True
-
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    if 'user_id' not in session:
-        return {'error': 'Unauthorized'}, 401
-
-    user_message = request.json.get('message', '').strip()
-    user = User.query.get(session['user_id'])
-    user_id_str = str(session['user_id'])
-
-    if user_id_str not in user_data:
-        user_data[user_id_str] = {
+    return dataset_writer.add(text, intent, response, entities_str)
+
+# ---------- Dialogue follow-ups ----------
+# When the bot asked for an account number, an amount or a recipient, the
+# session's 'dialogue' state says so and the user's answer is handled here
+# without intent matching. Each handler returns (reply, intent, state updates).
+def _balance_answer(user_id, account_numbers):
+    # someone else's account gets the same answer as a missing one
+    for number in account_numbers:
+        balance = account_cache.get((user_id, number))
+        if balance is not None:
+            return (f"💰 Your balance is {balance:,.2f}.", 'check_balance',
+                    {'dialogue': None, 'account_number': number, 'balance': balance})
+    return (f"I couldn't find account {account_numbers[0]} among your accounts. Please check the number and try again.",
+            'check_balance', {'dialogue': dialogue.AWAITING_ACCOUNT_NUMBER})
+
+def _transfer_answer(person, amount):
+    if not person:
+        return (f"💸 Who should I send {amount or 'the money'} to?", 'transfer_money',
+                {'dialogue': dialogue.AWAITING_RECIPIENT, 'amount': amount, 'person': None})
+    if not amount:
+        return (f"💸 How much would you like to send to {person}?", 'transfer_money',
+                {'dialogue': dialogue.AWAITING_AMOUNT, 'amount': None, 'person': person})
+    return (f"💸 OK, sending {amount} to {person}.", 'transfer_money',
+            {'dialogue': None, 'amount': amount, 'person': person,
+             'last_amount': amount, 'last_recipient': person})
+
+def _is_command(message_norm):
+    return message_norm in intent_reloader.current.matcher.exact
+
+def _answer_follow_up(user_id, pending, user_message, state):
+    value = dialogue.parse_reply(pending, user_message, is_command=_is_command)
+    if value is None:
+        amount = dialogue.bare_amount(user_message)
+        if pending == dialogue.AWAITING_RECIPIENT and amount:
+            # the amount came before the name: keep it and ask again
+            return _transfer_answer(None, amount)
+        return None
+    if pending == dialogue.AWAITING_ACCOUNT_NUMBER:
+        return _balance_answer(user_id, value)
+    if pending == dialogue.AWAITING_RECIPIENT:
+        return _transfer_answer(value, state.get('amount'))
+    return _transfer_answer(state.get('person'), value)
+
+def _save_turn(user_id_str, state_updates, user_message, bot_reply, intent):
+    with CHAT_STAGE_SECONDS.time(stage='save_conversation'):
+        if state_updates:
+            conversation_store.update_state(user_id_str, **state_updates)
+        conversation_store.append_turn(user_id_str, user_message, bot_reply, intent)
+
+def handle_chat(user_id, user_message):
+    """Answer one chat message for a logged-in user; needs an app context."""
+    start = time.perf_counter()
+    reply, source, confidence = _answer_chat(user_id, user_message)
+    if chat_events is not None:
+        chat_events.emit(user_message, reply['intent'], source, confidence,
+                         round((time.perf_counter() - start) * 1000, 3))
+    return reply
+
+def _answer_chat(user_id, user_message):
+    """(reply, matcher pass, confidence) for handle_chat."""
+    with CHAT_STAGE_SECONDS.time(stage='sync_dataset'):
+        dataset_writer.sync()
+    with CHAT_STAGE_SECONDS.time(stage='user_lookup'):
+        user = User.query.get(user_id)
+    user_id_str = str(user_id)
+
+    state_updates = {}
+    state = conversation_store.get_state(user_id_str)
+    if state is None:
+        state = {}
+        state_updates = {
             'account_number': user.account_number,
-            'balance': user.balance,
-            'conversations': []
+            'balance': user.balance
         }
 
-    result = find_intent_response(user_message)
+    pending = state.get('dialogue')
+    if pending:
+        with CHAT_STAGE_SECONDS.time(stage='dialogue'):
+            answer = _answer_follow_up(user_id, pending, user_message, state)
+        if answer is not None:
+            DIALOGUE_FOLLOW_UPS.inc(state=pending)
+            bot_reply, intent, updates = answer
+            state_updates.update(updates)
+            _save_turn(user_id_str, state_updates, user_message, bot_reply, intent)
+            return {'reply': bot_reply, 'intent': intent, 'intent_color': get_intent_color(intent)}, 'dialogue', 1.0
+        # the user moved on; the question is dropped below
+
+    with CHAT_STAGE_SECONDS.time(stage='find_intent_response'):
+        source, confidence, result = lookup_intent(user_message)
     intent = 'out_of_scope'
     intent_color = get_intent_color(intent)
     entities = {}
@@ -513,44 +648,42 @@ def chat():
     if result:
         intent = result.get('intent', 'out_of_scope')
         intent_color = get_intent_color(intent)
-        entities = extract_entities(user_message, result.get('entities', ''))
+        with CHAT_STAGE_SECONDS.time(stage='extract_entities'):
+            entities = dialogue.entities_for(intent, user_message)
         bot_reply = (result.get('response') or '').strip()
+        answer = None
+        if intent == 'check_balance' and entities.get('account_number'):
+            # never a balance remembered from another chat
+            answer = _balance_answer(user_id, [entities['account_number']])
+        elif intent == 'transfer_money' and (entities or not bot_reply):
+            # what the user asked for, never the training example's names
+            answer = _transfer_answer(entities.get('person'), entities.get('amount'))
+        if answer is not None:
+            bot_reply, intent, updates = answer
+            state_updates.update(updates)
+            _save_turn(user_id_str, state_updates, user_message, bot_reply, intent)
+            return {'reply': bot_reply, 'intent': intent, 'intent_color': intent_color}, source, confidence
+        state_updates['dialogue'] = dialogue.next_state(intent, entities)
+        if state_updates['dialogue'] is not None:
+            # a new question: forget the answers to the last one
+            state_updates.update(amount=None, person=None)
+        elif not pending:
+            del state_updates['dialogue']
         if not bot_reply:
-            if entities.get('amount'):
-                bot_reply = f"💰 Your balance is {entities['amount']}."
-            else:
-                acct = entities.get('account_number', '')
-                if acct:
-                    for row in dataset:
-                        ents = (row.get('entities') or '')
-                        if f"ACCOUNT_NUMBER:{acct}" in ents and 'MONEY:' in ents:
-                            m = re.search(r'MONEY:(\d+)', ents)
-                            if m:
-                                bot_reply = f"💰 Your balance is {m.group(1)}."
-                                entities['amount'] = m.group(1)
-                                break
-        if not bot_reply:
-            reply_digits = re.findall(r'\d+', user_message)
+            reply_digits = DIGITS_RE.findall(user_message)
             if reply_digits:
                 bot_reply = f"💰 Your balance is {reply_digits[0]}."
         if bot_reply is None:
             bot_reply = ''
 
         if entities:
-            user_data[user_id_str].update(entities)
+            state_updates.update(entities)
             if 'amount' in entities:
-                user_data[user_id_str]['last_amount'] = entities['amount']
+                state_updates['last_amount'] = entities['amount']
             if 'person' in entities:
-                user_data[user_id_str]['last_recipient'] = entities['person']
-            if 'account_number' in entities:
-                user_data[user_id_str]['account_number'] = entities['account_number']
+                state_updates['last_recipient'] = entities['person']
 
-        user_data[user_id_str]['conversations'].append({
-            'user': user_message,
-            'bot': bot_reply,
-            'intent': intent
-        })
-        save_user_data(user_data)
+        _save_turn(user_id_str, state_updates, user_message, bot_reply, intent)
 
         add_entities = []
         if 'amount' in entities:
@@ -559,31 +692,85 @@ def chat():
             add_entities.append(f"ACCOUNT_NUMBER:{entities['account_number']}")
         entities_str = '|'.join(add_entities)
 
-        reply_digits = re.findall(r'\d+', str(bot_reply))
+        reply_digits = DIGITS_RE.findall(str(bot_reply))
         if not entities_str and reply_digits:
             entities_str = f"MONEY:{reply_digits[0]}"
 
-        if entities_str:
+        # FAQ answers live in faq.json; digits in them are not balances
+        if entities_str and intent != FAQ_INTENT:
             try:
-                append_to_dataset_row(user_message, intent, bot_reply, entities_str)
+                with CHAT_STAGE_SECONDS.time(stage='append_to_dataset_row'):
+                    append_to_dataset_row(user_message, intent, bot_reply, entities_str)
             except Exception:
                 pass
     else:
         bot_reply = "I can only assist with banking questions. Try asking about balance, transfers, loans, or cards."
         intent = "out_of_scope"
         intent_color = get_intent_color(intent)
-        user_data[user_id_str]['conversations'].append({
-            'user': user_message,
-            'bot': bot_reply,
-            'intent': intent
-        })
-        save_user_data(user_data)
+        if pending:
+            state_updates['dialogue'] = None
+        _save_turn(user_id_str, state_updates, user_message, bot_reply, intent)
 
     return {
         'reply': bot_reply,
         'intent': intent,
         'intent_color': intent_color
-    }
+    }, source, confidence
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    if 'user_id' not in session:
+        return {'error': 'Unauthorized'}, 401
+
+    try:
+        release = admission_control.admit(session['user_id'])
+    except admission.Rejected as exc:
+        return exc.payload(), exc.status, exc.headers()
+    try:
+        user_message = request.json.get('message', '').strip()
+        return handle_chat(session['user_id'], user_message)
+    finally:
+        release()
+
+# ---------- Intent Cache Stats (admin) ----------
+@app.route('/admin/cache_stats')
+def cache_stats():
+    if 'admin_id' not in session:
+        return {'error': 'Unauthorized'}, 401
+    return intent_cache.info()
+
+# ---------- Bulk User Import (admin) ----------
+# rejected rows listed in the response; the rest are only counted
+IMPORT_MAX_ERRORS = int(os.environ.get('BANKBOT_IMPORT_MAX_ERRORS', '1000'))
+
+@app.route('/admin/users/import', methods=['POST'])
+def import_users():
+    if 'admin_id' not in session:
+        return {'error': 'Unauthorized'}, 401
+    upload = request.files.get('file')
+    if upload is not None:
+        fmt = request.args.get('format') or user_import.guess_format(upload.filename, upload.mimetype)
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    else:
+        fmt = request.args.get('format') or user_import.guess_format(content_type=request.mimetype)
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    if fmt not in ('csv', 'ndjson'):
+        return {'error': 'format must be csv or ndjson'}, 400
+
+    errors = []
+
+    def on_error(line, error, record):
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({'line': line, 'error': error})
+
+    try:
+        importer = user_import.import_users(db.engine, User.__table__, stream, fmt, on_error=on_error)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return {'error': f'Could not read the upload: {e}'}, 400
+    finally:
+        # rows already committed stay; cached "no such account" answers must go
+        account_cache.clear()
+    return {**importer.summary(), 'error_details': errors, 'errors_truncated': importer.errors > len(errors)}
 
 # ---------- Logout ----------
 @app.route('/logout')
@@ -592,5 +779,6 @@ def logout():
     return redirect(url_for('home'))
 
 # ---------- Run Server ----------
+# Development server only; use serve.py for production.
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
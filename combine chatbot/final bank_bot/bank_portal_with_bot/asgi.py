@@ -0,0 +1,106 @@
+# asgi.py
+# ASGI entry point for the portal. /api/chat is served natively: the
+# message is matched on a bounded thread pool so a slow request never
+# blocks the event loop. Every other route goes to the Flask app.
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+
+from admission import Rejected
+from app import admission_control, app, handle_chat, profiler, request_seconds
+from metrics import track_request
+
+# Chats admitted beyond the pool size (BANKBOT_CHAT_MAX_CONCURRENT, see
+# admission.py) wait in the executor's queue
+CHAT_WORKERS = int(os.environ.get('BANKBOT_CHAT_WORKERS', '8'))
+
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix='chat')
+flask_asgi = WsgiToAsgi(app)
+
+
+def _load_session(scope):
+    cookie_name = app.config.get('SESSION_COOKIE_NAME', 'session')
+    raw = b'; '.join(v for k, v in scope.get('headers', []) if k == b'cookie')
+    morsel = SimpleCookie(raw.decode('latin-1')).get(cookie_name)
+    if morsel is None:
+        return {}
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+def _run_chat(user_id, message):
+    # same 'chat' endpoint label the Flask view reports under
+    with track_request(request_seconds, 'chat', profiler), app.app_context():
+        return handle_chat(user_id, message)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        event = await receive()
+        body += event.get('body', b'')
+        if not event.get('more_body'):
+            return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def chat_endpoint(scope, receive, send):
+    if scope['method'] != 'POST':
+        return await _send_json(send, 405, {'error': 'Method not allowed'}, [(b'allow', b'POST')])
+
+    user_id = _load_session(scope).get('user_id')
+    body = await _read_body(receive)
+    if user_id is None:
+        return await _send_json(send, 401, {'error': 'Unauthorized'})
+    try:
+        message = (json.loads(body or b'{}').get('message') or '').strip()
+    except (ValueError, AttributeError):
+        return await _send_json(send, 400, {'error': 'Invalid JSON body'})
+
+    try:
+        release = admission_control.admit(user_id)
+    except Rejected as exc:
+        headers = [(k.lower().encode(), v.encode()) for k, v in exc.headers().items()]
+        return await _send_json(send, exc.status, exc.payload(), headers)
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(chat_executor, _run_chat, user_id, message)
+    finally:
+        release()
+    await _send_json(send, 200, result)
+
+
+async def lifespan(receive, send):
+    while True:
+        event = await receive()
+        if event['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif event['type'] == 'lifespan.shutdown':
+            chat_executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/api/chat':
+        return await chat_endpoint(scope, receive, send)
+    return await flask_asgi(scope, receive, send)
@@ -1,8 +1,9 @@
+import os
 from flask import Flask, render_template, request, jsonify
 from chatbot_model import BankBotModel
 
 app = Flask(__name__)
-bot = BankBotModel()
+bot = BankBotModel(threshold=float(os.environ.get('BANKBOT_INTENT_THRESHOLD', '0.2')))
 
 @app.route('/')
 def home():
@@ -14,5 +15,10 @@ def chat():
     result = bot.get_response(user_message)
     return jsonify(result)
 
+@app.route('/get_batch', methods=['POST'])
+def chat_batch():
+    messages = request.json.get('messages', [])
+    return jsonify(bot.get_responses(messages))
+
 if __name__ == "__main__":
     app.run(debug=True)
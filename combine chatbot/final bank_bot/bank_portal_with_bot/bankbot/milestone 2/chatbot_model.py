@@ -1,23 +1,29 @@
 # chatbot_model.py
+import os
+import sys
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+# the intent engine is shared with the portal app two levels up
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from intent_engine import IntentEngine, DEFAULT_THRESHOLD, DEFAULT_ARTIFACT_DIR
 
 class BankBotModel:
-    def __init__(self, dataset_path="bank_chatbot_dataset.csv"):
+    def __init__(self, dataset_path="bank_chatbot_dataset.csv", threshold=DEFAULT_THRESHOLD,
+                 artifact_dir=DEFAULT_ARTIFACT_DIR):
         data = pd.read_csv(dataset_path)
         self.data = data[["text", "intent", "response"]]
-        self.vectorizer = TfidfVectorizer()
-        self.X = self.vectorizer.fit_transform(self.data["text"])
+        columns = (self.data["text"], self.data["intent"], self.data["response"])
+        if artifact_dir:
+            # reuses the fitted model saved by an earlier start when the texts are unchanged
+            self.engine = IntentEngine.cached(*columns, threshold=threshold, artifact_dir=artifact_dir)
+        else:
+            self.engine = IntentEngine(*columns, threshold=threshold)
+        self.vectorizer = self.engine.vectorizer
+        self.X = self.engine.matrix
 
     def get_response(self, user_input):
-        user_vec = self.vectorizer.transform([user_input.lower()])
-        similarity = cosine_similarity(user_vec, self.X)
-        idx = similarity.argmax()
+        result = self.engine.predict(user_input)
+        return {"intent": result["intent"], "response": result["response"]}
 
-        if similarity.max() < 0.2:
-            return {"intent": "out_of_scope", "response": "🤔 Sorry, I don’t have an answer for that question."}
-        else:
-            intent = self.data.iloc[idx]["intent"]
-            response = self.data.iloc[idx]["response"]
-            return {"intent": intent, "response": response}
+    def get_responses(self, user_inputs):
+        return [{"intent": r["intent"], "response": r["response"]} for r in self.engine.predict_batch(user_inputs)]
@@ -0,0 +1,269 @@
+# bench_chat.py
+# Benchmarks the chat hot path against synthetic datasets of growing size.
+#
+#   python benchmarks/bench_chat.py                     # 50, 5k, 50k, 500k rows
+#   python benchmarks/bench_chat.py --sizes 50,5000 --output results.json
+#   python benchmarks/bench_chat.py --update-baseline
+#
+# Every size runs in its own subprocess so peak RSS is measured per size.
+# Results are compared with benchmarks/baseline.json; the exit status is 1
+# when any p95 latency or throughput regresses beyond --tolerance.
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PORTAL_DIR = os.path.dirname(BENCH_DIR)
+MILESTONE_DIR = os.path.join(PORTAL_DIR, 'bankbot', 'milestone 2')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_SIZES = [50, 5000, 50000, 500000]
+
+INTENT_TEMPLATES = {
+    'greet': (['hi', 'hello', 'hey there', 'good morning', 'good evening {name}'], '👋 Hello! How can I help you today?'),
+    'goodbye': (['bye', 'goodbye', 'see you later', 'talk to you soon {name}'], '👋 Goodbye! Have a great day.'),
+    'check_balance': (['check my balance', 'what is my balance', 'show account balance', 'how much money do i have in {acct_type}'],
+                      '💰 I can help with that. What is your account number?'),
+    'transaction_inquiry': (['last transactions', 'show transaction history', 'statement for {month}'],
+                            "For a detailed statement, please click the 'Transactions' card on your dashboard."),
+    'loan_inquiry': (['loan', 'home loan', 'personal loan rates', 'loan for {item}'], "🏦 Visit the 'Loans' page."),
+    'card_inquiry': (['cards', 'my debit card', 'credit card limit', '{card} card offers'], "💳 Manage cards on the 'Cards' page."),
+    'block_card': (['block my card', 'lost my card', 'freeze {card} card'], "🚨 Block your card from the 'Cards' page."),
+    'branch_locator': (['find a branch', 'branch near {city}', 'branch timings'], "Visit the 'Branches' page."),
+    'transfer_money': (['send money', 'transfer funds', 'make a payment to {name}'], '💸 Who should I send it to?'),
+    'thanks': (['thank you', 'thanks a lot', 'thanks {name}'], "You're welcome!"),
+}
+FILLERS = {
+    'name': ['teja', 'sri', 'john', 'priya', 'ravi', 'sita', 'arjun', 'meena'],
+    'acct_type': ['savings', 'current', 'salary account', 'joint account'],
+    'month': ['january', 'march', 'june', 'october', 'last month'],
+    'item': ['car', 'education', 'home renovation', 'business'],
+    'card': ['debit', 'credit', 'platinum', 'travel'],
+    'city': ['hyderabad', 'chennai', 'mumbai', 'delhi', 'pune'],
+}
+QUERY_MIX = [
+    'hi', 'check my balance', 'what is my balance', 'balance', 'send 500 to teja',
+    'transfer 1500 to priya', 'my account number is {acct}', 'it is {acct}', 'home loan',
+    'how do i block my debit card', 'what is the weather today', 'thanks', 'branch near pune',
+    'show me my balance please', 'credit card limit increase', 'bye',
+]
+
+
+# ---------- Synthetic data ----------
+def _fill(template, rng):
+    return template.format(**{k: rng.choice(v) for k, v in FILLERS.items()})
+
+
+def generate_dataset(path, rows, seed=42):
+    rng = random.Random(seed)
+    intents = list(INTENT_TEMPLATES)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['text', 'intent', 'response', 'entities'])
+        for i in range(rows):
+            if i % 10 == 9:
+                acct = str(rng.randint(10 ** 11, 10 ** 12 - 1))
+                amount = str(rng.randint(100, 50000))
+                writer.writerow([f'it is {acct}', 'check_balance', f'💰 Your balance is {amount}.',
+                                 f'MONEY:{amount}|ACCOUNT_NUMBER:{acct}'])
+                continue
+            intent = intents[i % len(intents)]
+            templates, response = INTENT_TEMPLATES[intent]
+            text = _fill(rng.choice(templates), rng)
+            if i >= len(intents) * 4:
+                text = f'{text} {rng.choice(FILLERS["name"])} {i}'
+            writer.writerow([text, intent, response, ''])
+
+
+def generate_user_data(path, users, turns, seed=42):
+    rng = random.Random(seed)
+    data = {}
+    for uid in range(1, users + 1):
+        conversations = []
+        for _ in range(turns):
+            intent = rng.choice(list(INTENT_TEMPLATES))
+            templates, response = INTENT_TEMPLATES[intent]
+            conversations.append({'user': _fill(rng.choice(templates), rng), 'bot': response, 'intent': intent})
+        data[str(uid)] = {'account_number': str(100000000000 + uid), 'balance': 5000.0,
+                          'conversations': conversations}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def build_queries(count, seed=7):
+    rng = random.Random(seed)
+    return [rng.choice(QUERY_MIX).format(acct=rng.randint(10 ** 11, 10 ** 12 - 1)) for _ in range(count)]
+
+
+# ---------- Measurement ----------
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of a sorted list; 0.0 when it is empty."""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def measure(fn, inputs):
+    latencies = []
+    started = time.perf_counter()
+    for item in inputs:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 4),
+        'p95_ms': round(percentile(latencies, 95), 4),
+        'p99_ms': round(percentile(latencies, 99), 4),
+        'throughput_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def run_size(size, iterations, workdir):
+    """Runs inside the per-size subprocess; returns one result dict."""
+    dataset_path = os.path.join(workdir, 'bank_chatbot_dataset.csv')
+    generate_dataset(dataset_path, size)
+    generate_user_data(os.path.join(workdir, 'user_data.json'), users=50, turns=40)
+    os.environ.update({
+        'BANKBOT_DATASET_PATH': dataset_path,
+        'BANKBOT_USER_DATA_FILE': os.path.join(workdir, 'user_data.json'),
+        'BANKBOT_CONVERSATION_LOG': os.path.join(workdir, 'conversations.jsonl'),
+        'BANKBOT_STATE_DB': os.path.join(workdir, 'chat_state.db'),
+        'BANKBOT_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'BANKBOT_MODEL_DIR': os.path.join(workdir, 'model_cache'),
+        # no admin intents or FAQs, so the index covers exactly the dataset
+        'BANKBOT_ADMIN_DATA_DIR': workdir,
+        # one session sends every request: admission control would shed
+        # most of them and time its 429s instead of the chat
+        'BANKBOT_RATE_LIMIT_PER_S': '0',
+        'BANKBOT_CHAT_MAX_CONCURRENT': '0',
+    })
+    sys.path.insert(0, PORTAL_DIR)
+    sys.path.append(MILESTONE_DIR)
+
+    t0 = time.perf_counter()
+    import app as portal
+    startup_s = time.perf_counter() - t0
+    from chatbot_model import BankBotModel
+    from intent_engine import IntentEngine
+    t0 = time.perf_counter()
+    model = BankBotModel(dataset_path)
+    model_load_s = time.perf_counter() - t0
+    # a second start finds the artifact the import above saved
+    t0 = time.perf_counter()
+    IntentEngine.from_rows(portal.dataset, artifact_dir=os.environ['BANKBOT_MODEL_DIR'])
+    engine_cached_load_s = time.perf_counter() - t0
+
+    queries = build_queries(iterations)
+    stages = {
+        'find_intent_response': measure(portal.find_intent_response, queries),
+        'dialogue.entities_for': measure(lambda q: portal.dialogue.entities_for('transfer_money', q), queries),
+        'BankBotModel.get_response': measure(model.get_response, queries),
+    }
+
+    with portal.app.app_context():
+        user = portal.User(username='bench', email='bench@example.com', password='bench',
+                           account_number='999000111222', account_type='savings', balance=5000.0)
+        portal.db.session.add(user)
+        portal.db.session.commit()
+        user_id = user.id
+    client = portal.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['username'] = 'bench'
+    statuses = Counter()
+    stages['api_chat'] = measure(
+        lambda q: statuses.update([client.post('/api/chat', json={'message': q}).status_code]), queries)
+    if set(statuses) != {200}:
+        raise RuntimeError(f'/api/chat answered {dict(statuses)}; every request must succeed')
+    portal.dataset_writer.close()
+
+    return {
+        'rows': size,
+        'startup_s': round(startup_s, 3),
+        'model_load_s': round(model_load_s, 3),
+        'engine_cached_load_s': round(engine_cached_load_s, 3),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        'stages': stages,
+    }
+
+
+# ---------- Baseline comparison ----------
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get(size)
+        if not base:
+            continue
+        for stage, stats in result['stages'].items():
+            ref = base['stages'].get(stage)
+            if not ref:
+                continue
+            if ref['p95_ms'] and stats['p95_ms'] > ref['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{size} rows {stage}: p95 {stats['p95_ms']}ms > baseline {ref['p95_ms']}ms")
+            if ref['throughput_per_s'] and stats['throughput_per_s'] < ref['throughput_per_s'] * (1 - tolerance):
+                regressions.append(f"{size} rows {stage}: {stats['throughput_per_s']}/s < baseline {ref['throughput_per_s']}/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the /api/chat hot path.')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='comma-separated dataset row counts')
+    parser.add_argument('--iterations', type=int, default=500, help='calls per stage')
+    parser.add_argument('--output', help='write results JSON here (default: stdout)')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fractional regression')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_size is not None:
+        with tempfile.TemporaryDirectory() as workdir:
+            result = run_size(args.run_size, args.iterations, workdir)
+        print(json.dumps(result))
+        return 0
+
+    results = {}
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        print(f'running {size} rows...', file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-size', str(size), '--iterations', str(args.iterations)],
+            capture_output=True, text=True, cwd=PORTAL_DIR)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            return proc.returncode
+        results[str(size)] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(report + '\n')
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
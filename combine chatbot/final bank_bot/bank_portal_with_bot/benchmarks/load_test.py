@@ -0,0 +1,416 @@
+# load_test.py
+# Replays recorded chat traffic against a running service and reports
+# throughput, tail latency and errors per second and per load level.
+#
+#   python benchmarks/load_test.py portal --concurrency 1,4,16,64 --step 20
+#   python benchmarks/load_test.py portal --rate 20,50,100,200 --step 20
+#   python benchmarks/load_test.py backend --url http://127.0.0.1:5001 --rate 100
+#   python benchmarks/load_test.py milestone --url http://127.0.0.1:5000 --concurrency 8
+#
+# Targets: 'portal' posts to /api/chat (serve.py or app.py), 'backend' to
+# /predict (admin_pannel/backend.py), 'milestone' to /get (bankbot/milestone
+# 2/app.py). Messages come from the admin query log (admin_pannel/data,
+# hot segments and Parquet) and the conversations in chat_state.db; each
+# simulated user replays one conversation in order, so multi-turn flows
+# are exercised.
+#
+# --concurrency runs a closed loop: that many users each send their next
+# message as soon as the last reply arrives. --rate runs an open loop:
+# requests arrive at that many per second (Poisson) whether or not earlier
+# ones finished, and latency counts from the scheduled arrival, so a
+# saturated service shows up as growing latency rather than a slower
+# generator. Comma-separated levels run one after another for --step
+# seconds each; the first level that breaks --slo-ms, loses more than
+# --max-error-rate of its requests, or falls behind its rate is reported
+# as the saturation point.
+#
+# Portal users are registered through /user/register (load-N@example.com,
+# password 'loadtest') and given an account on first use; later runs log in.
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from bench_chat import percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PORTAL_DIR = os.path.dirname(BENCH_DIR)
+ADMIN_DIR = os.path.abspath(os.path.join(PORTAL_DIR, '..', 'admin_pannel'))
+# recorded traffic is read through the stores the apps write it with
+sys.path.insert(0, PORTAL_DIR)
+sys.path.append(ADMIN_DIR)
+from conversation_store import ConversationStore
+from query_log import QueryLog
+
+# the same defaults the portal and the admin backend use
+ADMIN_DATA_DIR = os.environ.get('BANKBOT_ADMIN_DATA_DIR', os.path.join(ADMIN_DIR, 'data'))
+STATE_DB_FILE = os.environ.get('BANKBOT_STATE_DB', os.path.join(PORTAL_DIR, 'chat_state.db'))
+
+TARGETS = {
+    'portal': {'url': 'http://127.0.0.1:5000', 'path': '/api/chat', 'field': 'message', 'login': True},
+    'backend': {'url': 'http://127.0.0.1:5001', 'path': '/predict', 'field': 'query', 'login': False},
+    'milestone': {'url': 'http://127.0.0.1:5000', 'path': '/get', 'field': 'message', 'login': False},
+}
+LOGIN_PASSWORD = 'loadtest'
+# statuses that mean the service shed the request rather than failed it
+REJECTED = (429, 503)
+
+
+# ---------- Workload ----------
+def load_scripts(admin_data_dir=ADMIN_DATA_DIR, state_db=STATE_DB_FILE, source='all'):
+    """Message sequences to replay: one per stored conversation, plus the query log.
+
+    Conversations are read from the chat_turns of the portal's
+    ConversationStore and queries through QueryLog, so compacted days and a
+    not yet imported user_queries.csv are both included.
+    """
+    scripts = []
+    if source in ('all', 'conversations') and os.path.exists(state_db):
+        store = ConversationStore(state_db)
+        try:
+            for user_id in store.user_ids():
+                turns = store.get_conversations(user_id, 0, store.count_conversations(user_id))
+                messages = [turn['user'] for turn in turns if turn['user']]
+                if messages:
+                    scripts.append(messages)
+        finally:
+            store.close()
+    if source in ('all', 'queries') and os.path.isdir(admin_data_dir):
+        log = QueryLog(admin_data_dir, legacy_csv=os.path.join(admin_data_dir, 'user_queries.csv'))
+        messages = [q for q in log.read(columns=['query'], limit=0)['query'] if q]
+        if messages:
+            scripts.append(messages)
+    if not scripts:
+        raise SystemExit(f'no messages found in the query log under {admin_data_dir} or in {state_db}')
+    return scripts
+
+
+# ---------- HTTP ----------
+class Client:
+    """One keep-alive connection and its session cookie; not thread-safe."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self.cookies = {}
+        self._conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self._conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, path, body=None, content_type=None):
+        """(status, body bytes); reconnects once if the server closed the connection."""
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in (0, 1):
+            if self._conn is None:
+                self._connect()
+            try:
+                self._conn.request(method, path, body=body, headers=headers)
+                response = self._conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt:
+                    raise
+                continue
+            for header in response.headers.get_all('Set-Cookie') or []:
+                name, _, value = header.split(';', 1)[0].partition('=')
+                self.cookies[name.strip()] = value.strip()
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                self.close()
+            return response.status, data
+
+    def post_json(self, path, payload):
+        return self.request('POST', path, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def post_form(self, path, fields):
+        return self.request('POST', path, urlencode(fields).encode('utf-8'), 'application/x-www-form-urlencoded')
+
+
+def login(client, n):
+    """Sign in portal user n, registering it and opening its account the first time."""
+    email = f'load-{n}@example.com'
+    status, body = client.post_form('/user/register', {'username': f'load{n}', 'email': email,
+                                                       'password': LOGIN_PASSWORD})
+    if status in (301, 302, 303):
+        client.post_form('/create_account', {'account_number': str(800000000000 + n),
+                                             'account_type': 'savings', 'balance': '5000'})
+        return
+    status, body = client.post_form('/user/login', {'email': email, 'password': LOGIN_PASSWORD})
+    if status not in (301, 302, 303):
+        raise RuntimeError(f'could not log in {email}: HTTP {status}')
+
+
+class Session:
+    """A simulated user: its own connection and a conversation to replay."""
+
+    def __init__(self, client, script, start=0):
+        self.client = client
+        self.script = script
+        self.pos = start % len(script)
+
+    def next_message(self):
+        message = self.script[self.pos]
+        self.pos = (self.pos + 1) % len(self.script)
+        return message
+
+
+def make_sessions(target, base_url, count, scripts, timeout, seed=11):
+    spec = TARGETS[target]
+    rng = random.Random(seed)
+    sessions = []
+    for n in range(count):
+        client = Client(base_url, timeout)
+        if spec['login']:
+            login(client, n)
+        script = scripts[n % len(scripts)]
+        sessions.append(Session(client, script, start=rng.randrange(len(script))))
+    return sessions
+
+
+# ---------- Recording ----------
+class Recorder:
+    """Latencies and outcomes bucketed by the second they completed in."""
+
+    def __init__(self, interval=1.0, live=True):
+        self.interval = interval
+        self.live = live
+        self.started = time.perf_counter()
+        self.buckets = {}  # interval index -> {'latencies': [], 'statuses': Counter()}
+        self.late = 0      # open-loop requests sent >10 ms after their arrival time
+        self._lock = threading.Lock()
+        self._printed = -1
+
+    def record(self, latency_ms, outcome):
+        index = int((time.perf_counter() - self.started) / self.interval)
+        with self._lock:
+            bucket = self.buckets.setdefault(index, {'latencies': [], 'statuses': Counter()})
+            bucket['latencies'].append(latency_ms)
+            bucket['statuses'][outcome] += 1
+        if self.live:
+            self._print_until(index - 1)
+
+    def _print_until(self, last):
+        with self._lock:
+            ready = [i for i in range(self._printed + 1, last + 1)]
+            self._printed = max(self._printed, last)
+        for index in ready:
+            bucket = self.buckets.get(index)
+            if bucket:
+                print(format_row(f'{index * self.interval:6.0f}s', summarize([bucket], self.interval)), file=sys.stderr)
+
+    def window(self, start, stop):
+        """Buckets for intervals starting in [start, stop) seconds."""
+        first, last = int(start / self.interval), int(stop / self.interval)
+        with self._lock:
+            return [self.buckets[i] for i in range(first, last) if i in self.buckets]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def summarize(buckets, seconds):
+    latencies = sorted(l for b in buckets for l in b['latencies'])
+    statuses = Counter()
+    for b in buckets:
+        statuses.update(b['statuses'])
+    total = sum(statuses.values())
+    ok = sum(n for s, n in statuses.items() if isinstance(s, int) and 200 <= s < 400)
+    rejected = sum(statuses[s] for s in REJECTED)
+    return {
+        'requests': total,
+        'ok': ok,
+        'rejected': rejected,
+        'errors': total - ok - rejected,
+        'error_rate': round((total - ok) / total, 4) if total else 0.0,
+        'throughput_per_s': round(ok / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        'statuses': {str(s): n for s, n in sorted(statuses.items(), key=lambda item: str(item[0]))},
+    }
+
+
+def format_row(label, stats):
+    return (f"{label:>10} {stats['requests']:7d} req {stats['throughput_per_s']:8.1f} ok/s "
+            f"p50 {stats['p50_ms']:8.1f} p95 {stats['p95_ms']:8.1f} p99 {stats['p99_ms']:8.1f} ms "
+            f"err {stats['errors']:5d} shed {stats['rejected']:5d}")
+
+
+# ---------- Load loops ----------
+def _send(spec, session, recorder, scheduled=None):
+    message = session.next_message()
+    sent = time.perf_counter()
+    try:
+        status, _ = session.client.post_json(spec['path'], {spec['field']: message})
+        outcome = status
+    except Exception as exc:
+        session.client.close()
+        outcome = type(exc).__name__
+    done = time.perf_counter()
+    recorder.record((done - (scheduled if scheduled is not None else sent)) * 1000.0, outcome)
+
+
+def run_closed(spec, sessions, recorder, concurrency, duration, think_ms=0.0):
+    """`concurrency` users, each sending again as soon as its reply arrives."""
+    deadline = time.perf_counter() + duration
+
+    def user(session):
+        while time.perf_counter() < deadline:
+            _send(spec, session, recorder)
+            if think_ms:
+                time.sleep(think_ms / 1000.0)
+
+    threads = [threading.Thread(target=user, args=(s,), daemon=True) for s in sessions[:concurrency]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run_open(spec, sessions, recorder, rate, duration, seed=5):
+    """Poisson arrivals at `rate` per second, served by up to len(sessions) in flight.
+
+    An arrival waits for a free session when all are busy; that wait is
+    part of its latency, as it would be for a real client.
+    """
+    rng = random.Random(seed)
+    idle = queue.Queue()
+    for session in sessions:
+        idle.put(session)
+
+    def task(scheduled):
+        session = idle.get()
+        try:
+            _send(spec, session, recorder, scheduled=scheduled)
+        finally:
+            idle.put(session)
+
+    with ThreadPoolExecutor(max_workers=len(sessions), thread_name_prefix='load') as pool:
+        start = time.perf_counter()
+        arrival = start
+        while arrival < start + duration:
+            arrival += rng.expovariate(rate)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.01:
+                recorder.late += 1
+            pool.submit(task, arrival)
+
+
+def saturation_point(steps, slo_ms, max_error_rate):
+    for step in steps:
+        stats = step['stats']
+        offered = step.get('rate')
+        if (stats['p99_ms'] > slo_ms or stats['error_rate'] > max_error_rate
+                or (offered and stats['throughput_per_s'] < 0.9 * offered)):
+            return step['level']
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay chat traffic against a running service.')
+    parser.add_argument('target', choices=sorted(TARGETS))
+    parser.add_argument('--url', help='base URL (default per target, e.g. http://127.0.0.1:5000)')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', default=None, help='closed loop: comma-separated user counts')
+    load.add_argument('--rate', default=None, help='open loop: comma-separated requests per second')
+    parser.add_argument('--max-in-flight', type=int, default=64, help='open loop: concurrent connections')
+    parser.add_argument('--step', type=float, default=20.0, help='seconds per load level')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='closed loop: pause between a reply and the next message')
+    parser.add_argument('--source', choices=('all', 'conversations', 'queries'), default='all')
+    parser.add_argument('--admin-data', default=ADMIN_DATA_DIR, help='admin data directory holding the query log')
+    parser.add_argument('--state-db', default=STATE_DB_FILE, help="the portal's chat_state.db")
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--slo-ms', type=float, default=500.0, help='p99 latency a level must stay under')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds per live report line')
+    parser.add_argument('--quiet', action='store_true', help='no live per-interval lines')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+
+    spec = TARGETS[args.target]
+    base_url = args.url or spec['url']
+    if args.rate:
+        mode, levels = 'open', [float(r) for r in args.rate.split(',') if r.strip()]
+        session_count = args.max_in_flight
+    else:
+        mode, levels = 'closed', [int(c) for c in (args.concurrency or '8').split(',') if c.strip()]
+        session_count = max(levels)
+
+    scripts = load_scripts(args.admin_data, args.state_db, args.source)
+    print(f'{args.target} {base_url}{spec["path"]}: {sum(map(len, scripts))} messages in {len(scripts)} scripts, '
+          f'{mode} loop, levels {levels}', file=sys.stderr)
+    sessions = make_sessions(args.target, base_url, session_count, scripts, args.timeout)
+
+    recorder = Recorder(args.interval, live=not args.quiet)
+    steps = []
+    for level in levels:
+        start = recorder.elapsed()
+        late_before = recorder.late
+        if mode == 'open':
+            run_open(spec, sessions, recorder, level, args.step)
+        else:
+            run_closed(spec, sessions, recorder, level, args.step, args.think_ms)
+        stop = recorder.elapsed()
+        # leave out the partial intervals at both ends of the level
+        buckets = recorder.window(start + args.interval, stop - args.interval) or recorder.window(start, stop + args.interval)
+        seconds = max(args.interval, len(buckets) * args.interval)
+        step = {'level': level, 'stats': summarize(buckets, seconds)}
+        if mode == 'open':
+            step['rate'] = level
+            step['late_arrivals'] = recorder.late - late_before
+        steps.append(step)
+        print(format_row(f'{mode} {level:g}', step['stats']), file=sys.stderr)
+    for session in sessions:
+        session.client.close()
+
+    saturated = saturation_point(steps, args.slo_ms, args.max_error_rate)
+    if saturated is None:
+        print(f'no saturation up to {levels[-1]:g} (p99 <= {args.slo_ms:g} ms)', file=sys.stderr)
+    else:
+        print(f'saturated at {mode} level {saturated:g}', file=sys.stderr)
+    if any(step.get('late_arrivals') for step in steps):
+        print('warning: the generator fell behind its arrival schedule; results understate the load',
+              file=sys.stderr)
+
+    timeline = []
+    for index in sorted(recorder.buckets):
+        stats = summarize([recorder.buckets[index]], args.interval)
+        stats.pop('statuses')
+        timeline.append(dict(t=round(index * args.interval, 3), **stats))
+    report = json.dumps({'target': args.target, 'url': base_url + spec['path'], 'mode': mode,
+                         'saturation_level': saturated, 'steps': steps, 'timeline': timeline}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# chat_events.py
+# Chat events (query, intent, matcher pass, confidence, latency) handed from
+# the portal to the admin panel through a SQLite table used as a queue.
+# The portal side never waits on the database; the admin side drains the
+# table in batches (admin_pannel/event_consumer.py).
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+EVENT_FIELDS = ('created', 'query', 'intent', 'source', 'confidence', 'latency_ms')
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_MAX_PENDING = 1000000
+DEFAULT_BATCH_SIZE = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS chat_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    query TEXT NOT NULL,
+    intent TEXT NOT NULL,
+    source TEXT,
+    confidence REAL,
+    latency_ms REAL
+);
+'''
+
+
+def connect(path, timeout=5.0):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+class EventWriter:
+    """Portal side of the queue.
+
+    emit() appends to an in-memory buffer of at most `buffer_size` events
+    and returns at once; a background thread writes the buffer to the
+    table every `flush_interval` seconds or `batch_size` events. When the
+    buffer is full, or the table already holds `max_pending` events the
+    consumer has not taken, events are dropped and counted rather than
+    slowing chats down.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE, max_pending=DEFAULT_MAX_PENDING,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_interval=0.5):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queued = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name='chat-events', daemon=True)
+        self._thread.start()
+
+    def emit(self, query, intent, source=None, confidence=None, latency_ms=None):
+        event = (time.time(), query or '', intent or '', source, confidence, latency_ms)
+        with self._lock:
+            if self._closed or len(self._buffer) >= self.buffer_size:
+                self.dropped += 1
+                return False
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _take(self):
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+        return events
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        events = self._take()
+        if not events:
+            return 0
+        try:
+            if self._conn is None:
+                self._conn = connect(self.path)
+            with _transaction(self._conn) as conn:
+                first, last = conn.execute('SELECT MIN(id), MAX(id) FROM chat_events').fetchone()
+                # ids only grow and the consumer deletes from the front
+                pending = last - first + 1 if first is not None else 0
+                room = max(0, self.max_pending - pending)
+                if room < len(events):
+                    self.dropped += len(events) - room
+                    events = events[:room]
+                conn.executemany(
+                    f"INSERT INTO chat_events ({', '.join(EVENT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)", events)
+        except sqlite3.Error:
+            # the admin side is best effort; never let it reach a chat
+            self.write_errors += 1
+            self.dropped += len(events)
+            return 0
+        self.queued += len(events)
+        return len(events)
+
+    def info(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {'queued': self.queued, 'dropped': self.dropped, 'buffered': buffered,
+                'write_errors': self.write_errors}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+
+
+def drain(conn, handle, batch_size=5000):
+    """Pass the oldest events to `handle(list of dicts)` and delete them.
+
+    Events are deleted in the same transaction that read them, after
+    `handle` returns, so an event is handled at least once; if `handle`
+    raises, they stay queued. Returns the number of events handled.
+    """
+    with _transaction(conn):
+        rows = conn.execute(
+            f"SELECT id, {', '.join(EVENT_FIELDS)} FROM chat_events ORDER BY id LIMIT ?", (batch_size,)).fetchall()
+        if not rows:
+            return 0
+        handle([dict(zip(EVENT_FIELDS, row[1:])) for row in rows])
+        conn.execute('DELETE FROM chat_events WHERE id <= ?', (rows[-1][0],))
+    return len(rows)
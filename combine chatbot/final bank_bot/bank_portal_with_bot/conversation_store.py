@@ -0,0 +1,363 @@
+# conversation_store.py
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Turns kept in memory per active user; older ones are read from the database
+RECENT_TURNS = 20
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+STATE_FIELDS = ('account_number', 'balance', 'amount', 'person', 'last_amount', 'last_recipient', 'dialogue')
+# rough per-object costs used for the memory budget
+SESSION_OVERHEAD = 600
+TURN_OVERHEAD = 150
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS chat_users (
+    user_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT '{}',
+    turns INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_users_seq ON chat_users (seq);
+CREATE TABLE IF NOT EXISTS chat_turns (
+    user_id TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    user_message TEXT,
+    bot_reply TEXT,
+    intent TEXT,
+    PRIMARY KEY (user_id, n)
+) WITHOUT ROWID;
+'''
+
+_UNSET = object()
+
+
+class Session:
+    """One user's chat state and most recent turns, kept compact.
+
+    The usual state fields are slots rather than dict keys, turns are
+    (user, bot, intent) tuples in a ring of at most RECENT_TURNS, and
+    intent names are interned so every turn shares one copy of each. The
+    ring always holds the user's last len(turns) turns; it starts empty
+    and fills as the user chats. `seq` is the version of the user's row
+    this copy was read at.
+    """
+
+    __slots__ = STATE_FIELDS + ('extra', 'turns', 'turn_count', 'seq', 'nbytes')
+
+    def __init__(self, state=None, seq=0, turn_count=0):
+        for name in STATE_FIELDS:
+            setattr(self, name, _UNSET)
+        self.extra = None
+        self.turns = deque(maxlen=RECENT_TURNS)
+        self.turn_count = turn_count
+        self.seq = seq
+        self.nbytes = SESSION_OVERHEAD
+        if state:
+            self.update(state)
+
+    def update(self, fields):
+        for name, value in fields.items():
+            if name in STATE_FIELDS:
+                setattr(self, name, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[name] = value
+
+    def state(self):
+        state = {name: getattr(self, name) for name in STATE_FIELDS if getattr(self, name) is not _UNSET}
+        if self.extra:
+            state.update(self.extra)
+        return state
+
+    def push(self, user_message, bot_reply, intent):
+        if len(self.turns) == self.turns.maxlen:
+            self.nbytes -= self._size(self.turns[0])
+        turn = (user_message, bot_reply, sys.intern(intent or ''))
+        self.turns.append(turn)
+        self.nbytes += self._size(turn)
+
+    @staticmethod
+    def _size(turn):
+        return TURN_OVERHEAD + len(turn[0] or '') + len(turn[1] or '')
+
+
+class ConversationStore:
+    """Chat turns and per-user state in a SQLite database in WAL mode.
+
+    The database is the source of truth and is shared by every worker
+    process. Each process keeps active users as Session objects in an LRU
+    bounded by `memory_budget` bytes. Every write moves the user's row to
+    a new, store-wide increasing `seq`; before each call the store reads
+    MAX(seq) and, if another process wrote since it last looked, drops the
+    cached sessions whose rows moved on. When nothing changed elsewhere
+    that check is one index lookup.
+    """
+
+    def __init__(self, path, memory_budget=DEFAULT_MEMORY_BUDGET, timeout=30.0):
+        self.path = path
+        self.memory_budget = memory_budget
+        self._lock = threading.RLock()
+        self._sessions = OrderedDict()  # user_id -> Session, least recently used first
+        self._session_bytes = 0
+        self.bytes_written = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # autocommit; writes open their own BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._synced_seq = self._max_seq()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _max_seq(self):
+        return self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM chat_users').fetchone()[0]
+
+    def __contains__(self, user_id):
+        with self._lock:
+            self._sync()
+            return self._session(user_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM chat_users').fetchone()[0]
+
+    def user_ids(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT user_id FROM chat_users')]
+
+    # ---------- Sessions ----------
+    def _sync(self):
+        """Drop cached sessions other processes have written since the last call."""
+        latest = self._max_seq()
+        if latest == self._synced_seq:
+            return
+        if self._sessions:
+            changed = self._conn.execute('SELECT user_id, seq FROM chat_users WHERE seq > ?', (self._synced_seq,))
+            for user_id, seq in changed.fetchall():
+                session = self._sessions.get(user_id)
+                if session is not None and session.seq != seq:
+                    self._drop(user_id)
+        self._synced_seq = latest
+
+    def _advance(self, seq):
+        # our own write is the only change since the last sync
+        if seq == self._synced_seq + 1:
+            self._synced_seq = seq
+
+    def _session(self, user_id):
+        """Cached Session for user_id, loading it on a miss; None for unknown users."""
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self._sessions.move_to_end(user_id)
+            return session
+        row = self._conn.execute('SELECT state, turns, seq FROM chat_users WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        session = Session(json.loads(row[0]), seq=row[2], turn_count=row[1])
+        self._cache(user_id, session)
+        return session
+
+    def _cache(self, user_id, session):
+        self._drop(user_id)
+        self._sessions[user_id] = session
+        self._session_bytes += session.nbytes
+        self._evict()
+
+    def _drop(self, user_id):
+        session = self._sessions.pop(user_id, None)
+        if session is not None:
+            self._session_bytes -= session.nbytes
+
+    def _evict(self):
+        # idle users are dropped first; everything they hold is already on disk
+        while self._session_bytes > self.memory_budget and len(self._sessions) > 1:
+            _, session = self._sessions.popitem(last=False)
+            self._session_bytes -= session.nbytes
+
+    def session_info(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'bytes': self._session_bytes,
+                    'budget': self.memory_budget}
+
+    # ---------- State ----------
+    def get_state(self, user_id):
+        with self._lock:
+            self._sync()
+            session = self._session(user_id)
+            return session.state() if session is not None else None
+
+    def update_state(self, user_id, **fields):
+        with self._lock:
+            self._sync()
+            # merge into the stored state, not the cached copy, so concurrent
+            # writers in other processes never lose each other's fields
+            with self._transaction() as conn:
+                row = conn.execute('SELECT state, turns, seq FROM chat_users WHERE user_id = ?', (user_id,)).fetchone()
+                state = json.loads(row[0]) if row else {}
+                state.update(fields)
+                encoded = json.dumps(state, ensure_ascii=False)
+                seq = self._max_seq() + 1
+                if row:
+                    conn.execute('UPDATE chat_users SET state = ?, seq = ? WHERE user_id = ?', (encoded, seq, user_id))
+                else:
+                    conn.execute('INSERT INTO chat_users (user_id, state, turns, seq) VALUES (?, ?, 0, ?)',
+                                 (user_id, encoded, seq))
+            self.bytes_written += len(encoded)
+            session = self._sessions.get(user_id)
+            if session is not None and row is not None and session.seq == row[2]:
+                session.update(fields)
+                session.seq = seq
+            else:
+                self._cache(user_id, Session(state, seq=seq, turn_count=row[1] if row else 0))
+            self._advance(seq)
+            return state
+
+    # ---------- Conversations ----------
+    def append_turn(self, user_id, user_message, bot_reply, intent):
+        with self._lock:
+            self._sync()
+            with self._transaction() as conn:
+                row = conn.execute('SELECT state, turns, seq FROM chat_users WHERE user_id = ?', (user_id,)).fetchone()
+                n = row[1] if row else 0
+                seq = self._max_seq() + 1
+                conn.execute('INSERT INTO chat_turns (user_id, n, user_message, bot_reply, intent) VALUES (?, ?, ?, ?, ?)',
+                             (user_id, n, user_message, bot_reply, intent))
+                if row:
+                    conn.execute('UPDATE chat_users SET turns = ?, seq = ? WHERE user_id = ?', (n + 1, seq, user_id))
+                else:
+                    conn.execute('INSERT INTO chat_users (user_id, state, turns, seq) VALUES (?, ?, 1, ?)',
+                                 (user_id, '{}', seq))
+            self.bytes_written += len(user_message or '') + len(bot_reply or '') + len(intent or '')
+            session = self._sessions.get(user_id)
+            if session is None or row is None or session.seq != row[2]:
+                session = Session(json.loads(row[0]) if row else None)
+                self._cache(user_id, session)
+            before = session.nbytes
+            session.push(user_message, bot_reply, intent)
+            session.turn_count = n + 1
+            session.seq = seq
+            self._session_bytes += session.nbytes - before
+            self._evict()
+            self._advance(seq)
+
+    def count_conversations(self, user_id):
+        with self._lock:
+            self._sync()
+            session = self._session(user_id)
+            return session.turn_count if session is not None else 0
+
+    def get_conversations(self, user_id, start=0, limit=50):
+        """Turns [start, start + limit) in chronological order.
+
+        Recent pages come from memory, older ones from one range query.
+        """
+        with self._lock:
+            self._sync()
+            session = self._session(user_id)
+            if session is None:
+                return []
+            total = session.turn_count
+            end = min(total, start + limit)
+            if start >= end:
+                return []
+            if total - start <= len(session.turns):
+                recent = list(session.turns)[len(session.turns) - (total - start):][:end - start]
+                return [{'user': u, 'bot': b, 'intent': i} for u, b, i in recent]
+            rows = self._conn.execute(
+                'SELECT user_message, bot_reply, intent FROM chat_turns WHERE user_id = ? AND n >= ? AND n < ? ORDER BY n',
+                (user_id, start, end))
+            return [{'user': u, 'bot': b, 'intent': i} for u, b, i in rows]
+
+    def recent_conversations(self, user_id, limit=20):
+        total = self.count_conversations(user_id)
+        return self.get_conversations(user_id, start=max(0, total - limit), limit=limit)
+
+    # ---------- Import ----------
+    def import_users(self, users):
+        """Load (user_id, state, [(user, bot, intent)]) records for users the store does not have.
+
+        Runs as one transaction; users already stored keep what they have,
+        so workers starting together import legacy data only once.
+        Returns the number of users added.
+        """
+        with self._lock:
+            with self._transaction() as conn:
+                seq = self._max_seq()
+                count = 0
+                for user_id, state, turns in users:
+                    if conn.execute('SELECT 1 FROM chat_users WHERE user_id = ?', (user_id,)).fetchone():
+                        continue
+                    seq += 1
+                    count += 1
+                    conn.execute('INSERT INTO chat_users (user_id, state, turns, seq) VALUES (?, ?, ?, ?)',
+                                 (user_id, json.dumps(state, ensure_ascii=False), len(turns), seq))
+                    conn.executemany(
+                        'INSERT INTO chat_turns (user_id, n, user_message, bot_reply, intent) VALUES (?, ?, ?, ?, ?)',
+                        [(user_id, n, u, b, i) for n, (u, b, i) in enumerate(turns)])
+            self._sync()
+            return count
+
+
+def migrate_user_data(user_data_file, store):
+    """One-shot import of the legacy user_data.json layout into an empty store."""
+    if len(store) or not os.path.exists(user_data_file):
+        return 0
+    with open(user_data_file, 'r') as f:
+        legacy = json.load(f)
+    return store.import_users(
+        (user_id,
+         {k: v for k, v in record.items() if k != 'conversations'},
+         [(t.get('user', ''), t.get('bot', ''), t.get('intent', '')) for t in record.get('conversations', [])])
+        for user_id, record in legacy.items())
+
+
+def migrate_conversation_log(log_path, store):
+    """One-shot import of the conversations.jsonl log used before SQLite.
+
+    Users the store does not have yet are added; those it has keep their
+    stored history. The log is renamed to *.imported once that is
+    committed, so later starts skip it.
+    """
+    states = {}
+    turns = {}
+    try:
+        with open(log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from an interrupted write
+                user_id = record.get('u')
+                if record.get('t') == 'state':
+                    states[user_id] = record.get('state') or {}
+                    turns.setdefault(user_id, [])
+                elif record.get('t') == 'turn':
+                    turns.setdefault(user_id, []).append(
+                        (record.get('user', ''), record.get('bot', ''), record.get('intent', '')))
+    except FileNotFoundError:
+        return 0  # nothing to import, or another worker already did
+    count = store.import_users((u, states.get(u, {}), t) for u, t in turns.items())
+    try:
+        os.replace(log_path, log_path + '.imported')
+    except OSError:
+        pass  # another worker renamed it first
+    return count
@@ -0,0 +1,208 @@
+# dataset_writer.py
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run one worker
+    fcntl = None
+
+FIELDNAMES = ['text', 'intent', 'response', 'entities']
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DatasetWriter:
+    """Write-behind appender for the chatbot training CSV.
+
+    add() dedups against a hash set and returns immediately; a background
+    thread appends queued rows in batches (by size or age) and fsyncs.
+    Listeners are told about each accepted row right away so in-memory
+    indexes do not wait for the disk.
+
+    The CSV is shared by every worker process. Appends hold an exclusive
+    flock, and sync() reads the rows other processes appended since this
+    one last looked (a stat() when nothing changed) and hands them to the
+    same listeners, so every worker converges on the same dataset.
+    """
+
+    def __init__(self, path, existing_rows=(), batch_size=100, flush_interval=1.0, offset=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._seen = {self._key(r.get('text'), r.get('intent'), r.get('entities')) for r in existing_rows}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        # bytes of the CSV already reflected in existing_rows / listeners
+        if offset is None:
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+        self._offset = offset
+        self._file_lock = threading.Lock()
+        self._skip = set()  # queued rows another process already wrote
+        self.bytes_written = 0
+
+    @staticmethod
+    def _key(text, intent, entities):
+        return (text or '', intent or '', entities or '')
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def add(self, text, intent, response, entities_str=''):
+        key = self._key(text, intent, entities_str)
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            row = {'text': text, 'intent': intent, 'response': response, 'entities': entities_str}
+            for callback in self._listeners:
+                callback(row)
+        self._ensure_started()
+        self._queue.put(row)
+        return True
+
+    # ---------- Other processes ----------
+    @staticmethod
+    def _lock_file(f, exclusive):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    @staticmethod
+    def _unlock_file(f):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _follow(self, f):
+        """Read the rows appended after self._offset; caller holds the file lock.
+
+        Rows not seen here yet are added and passed to the listeners. A
+        row whose key is already known was also added here and may still
+        be queued, so its key goes to self._skip and _write() drops it.
+        """
+        size = os.fstat(f.fileno()).st_size
+        if size < self._offset:
+            logger.warning('%s shrank; re-reading it from the start', self.path)
+            self._offset = 0
+        if size == self._offset:
+            return
+        f.seek(self._offset)
+        data = f.read(size - self._offset)
+        text = data.decode('utf-8-sig' if self._offset == 0 else 'utf-8', errors='replace')
+        self._offset = size
+        with self._lock:
+            for fields in csv.reader(io.StringIO(text)):
+                if not fields or fields == FIELDNAMES:
+                    continue
+                fields = [v.strip() for v in fields] + [''] * (len(FIELDNAMES) - len(fields))
+                row = dict(zip(FIELDNAMES, fields))
+                key = self._key(row['text'], row['intent'], row['entities'])
+                if key in self._seen:
+                    self._skip.add(key)
+                    continue
+                self._seen.add(key)
+                for callback in self._listeners:
+                    callback(row)
+
+    def sync(self):
+        """Pick up rows other processes appended; cheap when there are none."""
+        try:
+            if os.path.getsize(self.path) == self._offset:
+                return
+        except OSError:
+            return
+        with self._file_lock:
+            with open(self.path, 'rb') as f:
+                self._lock_file(f, exclusive=False)
+                try:
+                    self._follow(f)
+                finally:
+                    self._unlock_file(f)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='dataset-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                if batch:
+                    self._write(batch)
+                return
+            if row is not None:
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                if self._write(batch):
+                    batch = []
+                    deadline = None
+                else:
+                    deadline = time.monotonic() + self.flush_interval
+
+    @staticmethod
+    def _encode(rows, f, size):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if size == 0:
+            writer.writerow(FIELDNAMES)
+        else:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) not in (b'\n', b'\r'):
+                buf.write('\r\n')
+        writer.writerows([[r['text'], r['intent'], r['response'], r['entities']] for r in rows])
+        # only a new file gets the BOM; appending one mid-file corrupts the first field
+        return buf.getvalue().encode('utf-8-sig' if size == 0 else 'utf-8')
+
+    def _write(self, rows):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._file_lock, open(self.path, 'a+b') as f:
+                self._lock_file(f, exclusive=True)
+                try:
+                    # another worker may have appended the same rows already
+                    self._follow(f)
+                    if self._skip:
+                        with self._lock:
+                            keep = [r for r in rows if self._key(r['text'], r['intent'], r['entities']) not in self._skip]
+                            self._skip.difference_update(self._key(r['text'], r['intent'], r['entities']) for r in rows)
+                        rows = keep
+                    if rows:
+                        size = os.fstat(f.fileno()).st_size
+                        data = self._encode(rows, f, size)
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        self._offset = size + len(data)
+                        self.bytes_written += len(data)
+                finally:
+                    self._unlock_file(f)
+            return True
+        except OSError:
+            logger.exception('Failed to append %d rows to %s, will retry', len(rows), self.path)
+            return False
+
+    def close(self, timeout=5.0):
+        """Flush queued rows and stop the background thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,168 @@
+# dialogue.py
+# Per-session dialogue state: what the bot last asked the user for. A reply
+# to that question goes straight to its handler instead of through intent
+# matching.
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from intent_index import normalize_text
+
+AWAITING_ACCOUNT_NUMBER = 'awaiting_account_number'
+AWAITING_AMOUNT = 'awaiting_amount'
+AWAITING_RECIPIENT = 'awaiting_recipient'
+
+# account numbers are digits, optionally behind a short prefix ("ACC1001")
+ACCOUNT_TOKEN_RE = re.compile(r'\b([A-Za-z]{0,4}\d{4,})\b')
+AMOUNT_RE = re.compile(r'\b(\d+(?:\.\d{1,2})?)\b')
+# a message that is only an amount: "300", "rs 300", "300 rupees"
+BARE_AMOUNT_RE = re.compile(r'^\D{0,8}?(\d+(?:\.\d{1,2})?)\D{0,8}$')
+NAME_RE = re.compile(r"^[A-Za-z][A-Za-z .'-]{0,40}$")
+# words around a name in replies like "to Teja" or "send it to Ravi"
+NAME_FILLER = {'to', 'send', 'it', 'pay', 'please', 'for', 'the', 'is', 'its', 'name', 'recipient', 'transfer'}
+MAX_NAME_WORDS = 3
+# "send 500 to Ravi", "transfer money to my friend Priya"
+TRANSFER_TO_RE = re.compile(r"\bto\s+([A-Za-z][A-Za-z.'-]*(?:\s+[A-Za-z][A-Za-z.'-]*){0,3})")
+NOT_A_NAME = NAME_FILLER | {'my', 'me', 'friend', 'account', 'accounts', 'savings', 'current', 'rupees', 'rs',
+                            'inr', 'dollars', 'money', 'now', 'today', 'someone', 'him', 'her', 'them', 'bank'}
+
+
+def next_state(intent, entities):
+    """The question a reply for `intent` leaves open, given the entities it carried."""
+    if intent == 'check_balance' and not entities.get('account_number'):
+        return AWAITING_ACCOUNT_NUMBER
+    if intent == 'transfer_money':
+        if not entities.get('person'):
+            return AWAITING_RECIPIENT
+        if not entities.get('amount'):
+            return AWAITING_AMOUNT
+    return None
+
+
+def account_numbers(message):
+    return ACCOUNT_TOKEN_RE.findall(message or '')
+
+
+def amount(message):
+    m = AMOUNT_RE.search(message or '')
+    return m.group(1) if m else None
+
+
+def bare_amount(message):
+    m = BARE_AMOUNT_RE.match((message or '').strip())
+    return m.group(1) if m else None
+
+
+def recipient(message):
+    """The name in a reply to "who should I send it to?", or None."""
+    text = (message or '').strip().rstrip('.!')
+    if not NAME_RE.match(text):
+        return None
+    words = [w for w in text.split() if w.lower() not in NAME_FILLER]
+    if not words or len(words) > MAX_NAME_WORDS:
+        return None
+    return ' '.join(words)
+
+
+def transfer_recipient(message):
+    """The name after "to" in a transfer request, or None if the user gave none."""
+    name = None
+    for m in TRANSFER_TO_RE.finditer(message or ''):
+        words = []
+        for word in m.group(1).split():
+            if word.lower() in NOT_A_NAME:
+                if words:
+                    break
+                continue
+            words.append(word.strip(".'-"))
+        if words:
+            name = ' '.join(words[:MAX_NAME_WORDS])
+    return name
+
+
+def entities_for(intent, message):
+    """Entities the user typed in `message` for the intents that act on them.
+
+    Only the message counts: the matched training row's entities describe
+    its own example ("send 500 rupees to Teja"), not this request.
+    """
+    entities = {}
+    if intent == 'check_balance':
+        numbers = account_numbers(message)
+        if numbers:
+            entities['account_number'] = numbers[0]
+    elif intent == 'transfer_money':
+        value, person = amount(message), transfer_recipient(message)
+        if value:
+            entities['amount'] = value
+        if person:
+            entities['person'] = person
+    return entities
+
+
+def parse_reply(state, message, is_command=None):
+    """The value a message gives for the pending question, or None.
+
+    `is_command(normalized_text)` tells known bot phrases ("balance",
+    "send 500 rupees to Teja") apart from answers, so those still reach
+    the matcher.
+    """
+    if is_command is not None and is_command(normalize_text(message)):
+        return None
+    if state == AWAITING_ACCOUNT_NUMBER:
+        return account_numbers(message) or None
+    if state == AWAITING_AMOUNT:
+        return amount(message)
+    if state == AWAITING_RECIPIENT:
+        return recipient(message)
+    return None
+
+
+class AccountCache:
+    """Read-through cache of `lookup(key)` results.
+
+    Results, including "no such account" (None), are kept for `ttl`
+    seconds in an LRU of `maxsize` entries, so a user retrying the same
+    number costs one query. Other workers' balance changes show up within
+    `ttl`; invalidate() drops an entry this process changed.
+    """
+
+    def __init__(self, lookup, ttl=5.0, maxsize=1024):
+        self.lookup = lookup
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # account number -> (expires, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = self.lookup(key)
+        if self.maxsize > 0 and self.ttl > 0:
+            with self._lock:
+                self._data[key] = (now + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'ttl': self.ttl}
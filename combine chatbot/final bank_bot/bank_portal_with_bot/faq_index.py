@@ -0,0 +1,251 @@
+# faq_index.py
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from intent_engine import IntentEngine, prune_artifacts
+from intent_index import normalize_text
+
+FAQ_INTENT = 'faq'
+K1 = 1.2
+B = 0.75
+# Similarity (see FaqIndex.best) a question needs to answer a message
+DEFAULT_MIN_CONFIDENCE = 0.5
+# BM25 hits re-ranked by that similarity
+CANDIDATES = 5
+ARTIFACT_VERSION = 1
+ARTIFACT_PREFIX = 'faq-bm25-'
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text):
+    return normalize_text(text).split()
+
+
+class FaqIndex:
+    """BM25 inverted index over FAQ questions with MaxScore top-k retrieval.
+
+    Each posting stores its precomputed BM25 impact (IDF times saturated
+    term frequency), so scoring a question only adds floats. Every term
+    also keeps its largest impact as an upper bound, which lets search()
+    score questions one at a time in id order while skipping most of the
+    long, low-IDF postings of words like "my" or "is".
+    """
+
+    def __init__(self, questions, answers, k1=K1, b=B, arrays=None):
+        self.questions = list(questions)
+        self.answers = list(answers)
+        self.k1 = k1
+        self.b = b
+        if arrays is None:
+            arrays = self._build(self.questions, k1, b)
+        self._set_arrays(*arrays)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def term_document_counts(self):
+        """{term: number of questions containing it}."""
+        return {term: self._offsets[t + 1] - self._offsets[t] for term, t in self._terms.items()}
+
+    # ---------- Building ----------
+    @staticmethod
+    def _build(questions, k1, b):
+        postings = {}  # term -> [(doc, tf)]
+        lengths = []
+        for doc, question in enumerate(questions):
+            tokens = tokenize(question)
+            lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc, tf))
+        n = len(questions)
+        avgdl = (sum(lengths) / n) if n and sum(lengths) else 1.0
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        docs = []
+        impacts = []
+        idf = np.zeros(len(terms), dtype=np.float64)
+        for t, term in enumerate(terms):
+            plist = postings[term]
+            idf[t] = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc, tf in plist:
+                norm = k1 * (1 - b + b * lengths[doc] / avgdl)
+                docs.append(doc)
+                impacts.append(idf[t] * tf * (k1 + 1) / (tf + norm))
+            offsets[t + 1] = len(docs)
+        return (terms, offsets, np.asarray(docs, dtype=np.int32), np.asarray(impacts, dtype=np.float64), idf, avgdl)
+
+    def _set_arrays(self, terms, offsets, docs, impacts, idf, avgdl):
+        self._terms = {term: i for i, term in enumerate(terms)}
+        self._offsets = np.asarray(offsets).tolist()
+        self._docs = docs
+        self._impacts = impacts
+        self._idf = np.asarray(idf, dtype=np.float64).tolist()
+        # each question's score against itself; no query can score higher
+        self._self_scores = np.bincount(docs, weights=impacts, minlength=len(self.questions))
+        starts = np.asarray(offsets[:-1], dtype=np.int64)
+        self._upper = np.maximum.reduceat(impacts, starts).tolist() if len(impacts) else []
+        self._avgdl = float(avgdl)
+
+    # ---------- Retrieval ----------
+    def search(self, query, k=5, min_score=0.0):
+        """[(doc, score)] for the k best questions scoring above `min_score`.
+
+        Best first; ties go to the earlier question. MaxScore pruning:
+        query terms are ordered by their upper bound, and the longest
+        prefix whose bounds add up to no more than the bar is
+        "non-essential" - a question containing only those terms cannot
+        make the top k. Candidates come from the essential postings alone,
+        summed with numpy. The k-th best partial score then raises the bar,
+        and only candidates that can still clear it probe the
+        non-essential postings (by binary search), highest bound first.
+        """
+        terms = sorted({t for t in map(self._terms.get, tokenize(query)) if t is not None},
+                       key=lambda t: self._upper[t])
+        if not terms:
+            return []
+        bounds = np.cumsum([self._upper[t] for t in terms])  # bounds[i]: sum of the bounds of terms[0..i]
+        first_essential = int(np.searchsorted(bounds, min_score, side='right'))
+        if first_essential == len(terms):
+            return []
+        spans = [(self._offsets[t], self._offsets[t + 1]) for t in terms]
+        docs = np.concatenate([self._docs[s:e] for s, e in spans[first_essential:]])
+        impacts = np.concatenate([self._impacts[s:e] for s, e in spans[first_essential:]])
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=impacts)
+
+        for i in range(first_essential - 1, -1, -1):
+            # every candidate's partial score is a lower bound on its total
+            bar = min_score
+            if len(scores) >= k:
+                bar = max(bar, np.partition(scores, len(scores) - k)[len(scores) - k])
+            # keep candidates that can beat the bar; ties with it may still
+            # win on document order, so only a strict shortfall is pruned
+            keep = scores + bounds[i] >= bar if bar > min_score else scores + bounds[i] > min_score
+            candidates, scores = candidates[keep], scores[keep]
+            if not len(candidates):
+                return []
+            start, stop = spans[i]
+            postings = self._docs[start:stop]
+            pos = np.searchsorted(postings, candidates)
+            found = pos < len(postings)
+            found[found] = postings[pos[found]] == candidates[found]
+            scores[found] += self._impacts[start:stop][pos[found]]
+
+        keep = scores > min_score
+        candidates, scores = candidates[keep], scores[keep]
+        order = np.lexsort((candidates, -scores))[:k]
+        return [(int(candidates[j]), float(scores[j])) for j in order]
+
+    def _ideal_score(self, tokens):
+        # score of a question made of exactly these tokens; unseen tokens
+        # count with the IDF of a term no question contains
+        n = len(self.questions)
+        unseen_idf = math.log(1 + (n + 0.5) / 0.5)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self._avgdl)
+        total = 0.0
+        for token in set(tokens):
+            t = self._terms.get(token)
+            idf = self._idf[t] if t is not None else unseen_idf
+            total += idf * (self.k1 + 1) / (1 + norm)
+        return total
+
+    def best(self, query, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        """The best matching FAQ as a dict, or None below `min_confidence`.
+
+        Confidence is the geometric mean of the BM25 score over the score
+        of a question identical to the message and over the question's
+        score against itself, so it is 0..1, and rare words missing from
+        either side pull it down ("my card" does not answer "How can I
+        block my debit card?").
+        """
+        ideal = self._ideal_score(tokenize(query))
+        if not ideal:
+            return None
+        # a score never exceeds the question's own, so confidence is at most
+        # sqrt(score / ideal): everything under c^2 * ideal is pruned in search
+        floor = min_confidence * min_confidence * ideal * (1 - 1e-9)
+        best = None
+        for doc, score in self.search(query, k=CANDIDATES, min_score=floor):
+            confidence = min(1.0, math.sqrt(score / ideal * score / self._self_scores[doc]))
+            if confidence >= min_confidence and (best is None or confidence > best['confidence']):
+                best = {'question': self.questions[doc], 'answer': self.answers[doc],
+                        'score': score, 'confidence': confidence, 'index': doc}
+        return best
+
+    # ---------- Artifacts ----------
+    def save(self, directory):
+        """Write the postings as .npy files via a temporary directory."""
+        terms = sorted(self._terms, key=self._terms.get)
+        tmp_dir = f'{directory}.tmp-{os.getpid()}-{threading.get_ident()}'
+        os.makedirs(tmp_dir)
+        try:
+            np.save(os.path.join(tmp_dir, 'offsets.npy'), np.asarray(self._offsets, dtype=np.int64))
+            np.save(os.path.join(tmp_dir, 'docs.npy'), self._docs)
+            np.save(os.path.join(tmp_dir, 'impacts.npy'), self._impacts)
+            np.save(os.path.join(tmp_dir, 'idf.npy'), np.asarray(self._idf, dtype=np.float64))
+            with open(os.path.join(tmp_dir, 'terms.json'), 'w', encoding='utf-8') as f:
+                json.dump(terms, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({'version': ARTIFACT_VERSION, 'docs': len(self.questions), 'k1': self.k1, 'b': self.b,
+                           'avgdl': self._avgdl, 'content_hash': IntentEngine.content_hash(self.questions)}, f)
+            os.replace(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, 'meta.json')):
+                raise
+            # another process saved the same artifact first
+
+    @classmethod
+    def load(cls, directory, questions, answers):
+        """Index from save() output; raises ValueError if it is for other questions."""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        questions = list(questions)
+        if (meta.get('version') != ARTIFACT_VERSION or meta.get('docs') != len(questions)
+                or meta.get('content_hash') != IntentEngine.content_hash(questions)):
+            raise ValueError(f'artifact {directory} does not match the FAQ')
+        with open(os.path.join(directory, 'terms.json'), encoding='utf-8') as f:
+            terms = json.load(f)
+        # postings are memory-mapped, so workers share one copy
+        arrays = [np.load(os.path.join(directory, name), mmap_mode='r')
+                  for name in ('offsets.npy', 'docs.npy', 'impacts.npy', 'idf.npy')]
+        return cls(questions, answers, k1=meta['k1'], b=meta['b'], arrays=[terms] + arrays + [meta['avgdl']])
+
+    @classmethod
+    def cached(cls, questions, answers, artifact_dir):
+        """Load the saved index for these questions, building and saving it on a miss."""
+        questions = list(questions)
+        directory = os.path.join(artifact_dir, f'{ARTIFACT_PREFIX}v{ARTIFACT_VERSION}-{IntentEngine.content_hash(questions)[:24]}')
+        if os.path.exists(os.path.join(directory, 'meta.json')):
+            try:
+                return cls.load(directory, questions, answers)
+            except (OSError, ValueError, KeyError):
+                logger.warning('Ignoring unreadable FAQ index %s', directory, exc_info=True)
+        index = cls(questions, answers)
+        try:
+            os.makedirs(artifact_dir, exist_ok=True)
+            index.save(directory)
+            prune_artifacts(artifact_dir, keep=directory, prefix=ARTIFACT_PREFIX)
+        except OSError:
+            logger.warning('Could not save FAQ index %s', directory, exc_info=True)
+        return index
+
+    @classmethod
+    def from_entries(cls, entries, artifact_dir=None):
+        """Index faq.json entries ({'q': question, 'a': answer})."""
+        entries = [e for e in entries or [] if (e.get('q') or '').strip()]
+        questions = [e['q'].strip() for e in entries]
+        answers = [(e.get('a') or '').strip() for e in entries]
+        if artifact_dir and questions:
+            return cls.cached(questions, answers, artifact_dir)
+        return cls(questions, answers)
@@ -0,0 +1,305 @@
+# intent_engine.py
+import csv
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+DEFAULT_THRESHOLD = 0.2
+MAX_DELTA_ROWS = 1024
+OUT_OF_SCOPE_RESPONSE = "🤔 Sorry, I don’t have an answer for that question."
+
+# Fitted models are cached here as memory-mappable artifacts (see cached())
+ARTIFACT_VERSION = 1
+DEFAULT_ARTIFACT_DIR = os.environ.get(
+    'BANKBOT_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_cache'))
+KEEP_ARTIFACTS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def prune_artifacts(artifact_dir, keep, prefix='tfidf-'):
+    """Remove all but the newest KEEP_ARTIFACTS `prefix` artifacts (never `keep`).
+
+    Processes that still map a removed artifact keep their open mapping.
+    """
+    names = [n for n in os.listdir(artifact_dir) if n.startswith(prefix) and '.tmp-' not in n]
+    paths = sorted((os.path.join(artifact_dir, n) for n in names), key=os.path.getmtime, reverse=True)
+    for path in paths[KEEP_ARTIFACTS:]:
+        if os.path.abspath(path) != os.path.abspath(keep):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class IntentEngine:
+    """TF-IDF intent scorer shared by the portal and the milestone-2 bot.
+
+    Rows are L2-normalized once, so cosine similarity is a sparse dot
+    product and only rows sharing a term with the message get scored.
+    """
+
+    def __init__(self, texts, intents, responses, payloads=None, threshold=DEFAULT_THRESHOLD, fitted=None):
+        self.texts = list(texts)
+        self.intents = list(intents)
+        self.responses = list(responses)
+        self.payloads = list(payloads) if payloads is not None else [None] * len(self.texts)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._pending = []
+        if fitted is not None:
+            # (vectorizer, normalized terms x rows matrix) from load()
+            self.vectorizer, matrix_t = fitted
+            self._set_index(matrix_t)
+            return
+        self.vectorizer = TfidfVectorizer()
+        try:
+            matrix = self.vectorizer.fit_transform(self.texts)
+        except ValueError:
+            # empty vocabulary: nothing can ever score above the threshold
+            self.vectorizer = None
+            matrix = sp.csr_matrix((len(self.texts), 0))
+        self._set_matrix(matrix)
+
+    @classmethod
+    def from_rows(cls, rows, threshold=DEFAULT_THRESHOLD, artifact_dir=None):
+        rows = list(rows)
+        columns = (
+            [row.get('text') or '' for row in rows],
+            [row.get('intent', '') for row in rows],
+            [row.get('response', '') for row in rows],
+        )
+        if artifact_dir:
+            return cls.cached(*columns, payloads=rows, threshold=threshold, artifact_dir=artifact_dir)
+        return cls(*columns, payloads=rows, threshold=threshold)
+
+    @classmethod
+    def from_csv(cls, dataset_path, threshold=DEFAULT_THRESHOLD, artifact_dir=None):
+        rows = []
+        if os.path.exists(dataset_path):
+            with open(dataset_path, 'r', encoding='utf-8-sig') as f:
+                for row in csv.DictReader(f):
+                    rows.append({k: (v or '').strip() for k, v in row.items()})
+        return cls.from_rows(rows, threshold=threshold, artifact_dir=artifact_dir)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _set_matrix(self, matrix):
+        matrix = normalize(sp.csr_matrix(matrix, dtype=np.float64), norm='l2', copy=False)
+        self._set_index(matrix.T.tocsr())
+
+    def _set_index(self, matrix_t):
+        # terms x rows, so a query vector selects only the rows it touches;
+        # rows appended later live in a small delta until it is merged in
+        self._segments = (matrix_t, sp.csr_matrix((0, matrix_t.shape[0])))
+        if self.vectorizer is not None:
+            self._analyzer = self.vectorizer.build_analyzer()
+            self._vocabulary = self.vectorizer.vocabulary_
+            self._idf = self.vectorizer.idf_.tolist()
+
+    @property
+    def matrix_t(self):
+        return self._segments[0]
+
+    @property
+    def matrix(self):
+        """Rows x terms view of the fitted rows (no copy)."""
+        return self._segments[0].T
+
+    # ---------- Artifacts ----------
+    @staticmethod
+    def content_hash(texts):
+        joined = '\0'.join(map(str, texts))
+        return hashlib.sha256(joined.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def save(self, directory):
+        """Write the fitted vocabulary, IDF and matrix as .npy files.
+
+        Rows added with add() after fitting are not included. The files
+        are written to a temporary directory that is renamed into place,
+        so readers never see a partial artifact.
+        """
+        if self.vectorizer is None:
+            raise ValueError('nothing to save: the vocabulary is empty')
+        matrix_t = self.matrix_t
+        terms = sorted(self._vocabulary, key=self._vocabulary.get)
+        tmp_dir = f'{directory}.tmp-{os.getpid()}-{threading.get_ident()}'
+        os.makedirs(tmp_dir)
+        try:
+            np.save(os.path.join(tmp_dir, 'idf.npy'), np.asarray(self.vectorizer.idf_, dtype=np.float64))
+            np.save(os.path.join(tmp_dir, 'data.npy'), matrix_t.data)
+            np.save(os.path.join(tmp_dir, 'indices.npy'), matrix_t.indices)
+            np.save(os.path.join(tmp_dir, 'indptr.npy'), matrix_t.indptr)
+            with open(os.path.join(tmp_dir, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+                json.dump(terms, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({'version': ARTIFACT_VERSION, 'rows': matrix_t.shape[1], 'terms': matrix_t.shape[0],
+                           'content_hash': self.content_hash(self.texts[:matrix_t.shape[1]])}, f)
+            os.replace(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, 'meta.json')):
+                raise
+            # another process saved the same artifact first
+
+    @classmethod
+    def load(cls, directory, texts, intents, responses, payloads=None, threshold=DEFAULT_THRESHOLD, mmap=True):
+        """Build an engine from save() output without refitting.
+
+        With mmap the matrix arrays are memory-mapped read-only, so every
+        worker process loading the same artifact shares one copy in the
+        page cache. Raises ValueError if the artifact does not match.
+        """
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        texts = list(texts)
+        if meta.get('version') != ARTIFACT_VERSION or meta.get('rows') != len(texts):
+            raise ValueError(f'artifact {directory} does not match the dataset')
+        mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mode)
+                  for name in ('data.npy', 'indices.npy', 'indptr.npy')]
+        matrix_t = sp.csr_matrix(tuple(arrays), shape=(meta['terms'], meta['rows']), copy=False)
+        with open(os.path.join(directory, 'vocabulary.json'), encoding='utf-8') as f:
+            terms = json.load(f)
+        vectorizer = TfidfVectorizer()
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        vectorizer.idf_ = np.load(os.path.join(directory, 'idf.npy'))
+        return cls(texts, intents, responses, payloads=payloads, threshold=threshold,
+                   fitted=(vectorizer, matrix_t))
+
+    @classmethod
+    def cached(cls, texts, intents, responses, payloads=None, threshold=DEFAULT_THRESHOLD,
+               artifact_dir=DEFAULT_ARTIFACT_DIR):
+        """Load the artifact for these texts, fitting and saving it on a miss.
+
+        Artifacts are keyed by a hash of the training texts, so a changed
+        dataset is refit once and every later start just maps the files.
+        """
+        texts = list(texts)
+        directory = os.path.join(artifact_dir, f'tfidf-v{ARTIFACT_VERSION}-{cls.content_hash(texts)[:24]}')
+        if os.path.exists(os.path.join(directory, 'meta.json')):
+            try:
+                return cls.load(directory, texts, intents, responses, payloads=payloads, threshold=threshold)
+            except (OSError, ValueError, KeyError):
+                logger.warning('Ignoring unreadable model artifact %s', directory, exc_info=True)
+        engine = cls(texts, intents, responses, payloads=payloads, threshold=threshold)
+        if engine.vectorizer is not None:
+            try:
+                os.makedirs(artifact_dir, exist_ok=True)
+                engine.save(directory)
+                prune_artifacts(artifact_dir, keep=directory)
+            except OSError:
+                logger.warning('Could not save model artifact %s', directory, exc_info=True)
+        return engine
+
+    def add(self, text, intent, response, payload=None):
+        """Append a row using the fitted vocabulary (IDF weights are not refit)."""
+        with self._lock:
+            self.texts.append(text or '')
+            self.intents.append(intent)
+            self.responses.append(response)
+            self.payloads.append(payload)
+            self._pending.append(text or '')
+
+    def add_row(self, row):
+        self.add(row.get('text') or '', row.get('intent', ''), row.get('response', ''), payload=row)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            matrix_t, delta = self._segments
+            delta = sp.vstack([delta, self._vectorize(pending)], format='csr')
+            if delta.shape[0] > max(MAX_DELTA_ROWS, self.matrix.shape[0] // 20):
+                self._set_matrix(sp.vstack([self.matrix, delta], format='csr'))
+            else:
+                self._segments = (matrix_t, delta)
+
+    def _vectorize(self, messages):
+        """Same vectors as vectorizer.transform() + l2, without its per-call overhead."""
+        width = self.matrix.shape[1]
+        if self.vectorizer is None:
+            return sp.csr_matrix((len(messages), width))
+        analyzer, vocabulary, idf = self._analyzer, self._vocabulary, self._idf
+        indptr, indices, data = [0], [], []
+        for message in messages:
+            counts = {}
+            for token in analyzer((message or '').lower()):
+                j = vocabulary.get(token)
+                if j is not None:
+                    counts[j] = counts.get(j, 0) + 1
+            weights = [n * idf[j] for j, n in counts.items()]
+            norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+            indices.extend(counts)
+            data.extend(w / norm for w in weights)
+            indptr.append(len(indices))
+        return sp.csr_matrix((np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32),
+                              np.asarray(indptr, dtype=np.int32)), shape=(len(messages), width))
+
+    def _scores(self, messages):
+        self._flush_pending()
+        matrix_t, delta = self._segments
+        queries = self._vectorize(messages)
+        scores = queries @ matrix_t
+        if delta.shape[0]:
+            scores = sp.hstack([scores, queries @ delta.T], format='csr')
+        return scores.tocsr()
+
+    @staticmethod
+    def _top_k_row(scores, row, k):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        data = scores.data[start:end]
+        idx = scores.indices[start:end]
+        if len(data) > k:
+            kth = np.partition(data, len(data) - k)[len(data) - k]
+            keep = data >= kth
+            data, idx = data[keep], idx[keep]
+        # highest score first, earliest row on ties (matches dense argmax)
+        order = np.lexsort((idx, -data))[:k]
+        return [(int(idx[i]), float(data[i])) for i in order]
+
+    def top_k(self, message, k=5):
+        scores = self._scores([message])
+        return self._top_k_row(scores, 0, k)
+
+    def _result(self, hits):
+        if not hits or hits[0][1] < self.threshold:
+            score = hits[0][1] if hits else 0.0
+            return {'intent': 'out_of_scope', 'response': OUT_OF_SCOPE_RESPONSE,
+                    'score': score, 'index': None, 'payload': None}
+        idx, score = hits[0]
+        return {'intent': self.intents[idx], 'response': self.responses[idx],
+                'score': score, 'index': idx, 'payload': self.payloads[idx]}
+
+    def predict(self, message):
+        return self._result(self.top_k(message, k=1))
+
+    def predict_batch(self, messages):
+        messages = list(messages)
+        if not messages:
+            return []
+        scores = self._scores(messages)
+        return [self._result(self._top_k_row(scores, i, 1)) for i in range(len(messages))]
+
+
+if __name__ == '__main__':
+    # python intent_engine.py build [dataset.csv]
+    # Prebuilds the model artifact so workers start by mapping it.
+    if sys.argv[1:2] == ['build']:
+        here = os.path.dirname(os.path.abspath(__file__))
+        path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(here, 'bankbot', 'milestone 2', 'bank_chatbot_dataset.csv')
+        engine = IntentEngine.from_csv(path, artifact_dir=DEFAULT_ARTIFACT_DIR)
+        print(f'{len(engine)} rows, {engine.matrix_t.shape[0]} terms -> {DEFAULT_ARTIFACT_DIR}')
+    else:
+        print('usage: python intent_engine.py build [dataset.csv]')
@@ -0,0 +1,186 @@
+# intent_index.py
+import re
+import string
+import threading
+from collections import OrderedDict
+
+PASSES = ('exact', 'entity', 'overlap')
+
+
+_ALLOWED = frozenset(string.ascii_lowercase + string.digits + ' ')
+_CONTRACTIONS = (("what's", "what is"), ("it's", "it is"), ("i'm", "i am"))
+_DIGITS_RE = re.compile(r'\d+')
+
+
+class _DropDisallowed(dict):
+    # str.translate table: keep [a-z0-9 ], delete everything else.
+    # Entries are filled in the first time each character is seen.
+    def __missing__(self, codepoint):
+        value = codepoint if chr(codepoint) in _ALLOWED else None
+        self[codepoint] = value
+        return value
+
+
+_DROP_TABLE = _DropDisallowed()
+
+
+# Normalization helper
+def normalize_text(s):
+    if not s:
+        return ''
+    s = s.lower().strip()
+    for short, full in _CONTRACTIONS:
+        s = s.replace(short, full)
+    s = s.translate(_DROP_TABLE)
+    return ' '.join(s.split())
+
+
+class ResultCache:
+    """Thread-safe, size-bounded LRU cache with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value)."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, generation=None):
+        """Store value unless the cache was cleared since `generation` was read."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+
+class IntentMatcher:
+    """Indexes dataset rows once so each lookup avoids scanning the dataset.
+
+    Lookups return the same row the old three linear passes returned:
+    exact normalized text first, then an ACCOUNT_NUMBER/MONEY entity value
+    found in the message, then the row with the largest token overlap.
+    Ties always go to the earliest row.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = []
+        self.exact = {}        # normalized text -> first row index
+        self.entity_values = {}  # entity value -> first row index
+        self.postings = {}     # token -> ascending row indexes
+        self.max_value_len = 0
+        self._lock = threading.Lock()
+        for row in rows:
+            self.add_row(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_row(self, row):
+        with self._lock:
+            idx = len(self.rows)
+            self.rows.append(row)
+
+            row_norm = normalize_text(row.get('text') or '')
+            if row_norm:
+                self.exact.setdefault(row_norm, idx)
+                for token in set(row_norm.split()):
+                    self.postings.setdefault(token, []).append(idx)
+
+            entities = (row.get('entities') or '').strip()
+            if 'ACCOUNT_NUMBER' in entities or 'MONEY' in entities:
+                for part in entities.split('|'):
+                    if ':' not in part:
+                        continue
+                    val = part.split(':', 1)[1].strip()
+                    if val and _DIGITS_RE.search(val):
+                        self.entity_values.setdefault(val, idx)
+                        self.max_value_len = max(self.max_value_len, len(val))
+
+    def _result(self, idx):
+        row = self.rows[idx]
+        return {
+            'intent': row.get('intent', ''),
+            'response': row.get('response', ''),
+            'entities': row.get('entities', '')
+        }
+
+    def _match_exact(self, message_norm):
+        if not message_norm:
+            return None
+        return self.exact.get(message_norm)
+
+    def _match_entity(self, user_message):
+        if not self.entity_values:
+            return None
+        digits_concat = ''.join(_DIGITS_RE.findall(user_message))
+        best = None
+        for haystack in (user_message, digits_concat):
+            # Every entity value contained in the message is one of its
+            # substrings, so probe those instead of every indexed value.
+            n = len(haystack)
+            for start in range(n):
+                stop = min(n, start + self.max_value_len)
+                for end in range(start + 1, stop + 1):
+                    idx = self.entity_values.get(haystack[start:end])
+                    if idx is not None and (best is None or idx < best):
+                        best = idx
+        return best
+
+    def _match_overlap(self, message_norm):
+        counts = {}
+        for token in set(message_norm.split()):
+            for idx in self.postings.get(token, ()):
+                counts[idx] = counts.get(idx, 0) + 1
+        best_idx = None
+        best_score = 0
+        for idx, score in counts.items():
+            if score > best_score or (score == best_score and idx < best_idx):
+                best_idx = idx
+                best_score = score
+        return best_idx
+
+    def match_with_pass(self, user_message, passes=PASSES):
+        """Return (pass name, result) for the first pass that finds a row."""
+        if not user_message:
+            return None, None
+        message_norm = normalize_text(user_message)
+
+        for name in passes:
+            if name == 'exact':
+                idx = self._match_exact(message_norm)
+            elif name == 'entity':
+                idx = self._match_entity(user_message)
+            else:
+                idx = self._match_overlap(message_norm)
+            if idx is not None:
+                return name, self._result(idx)
+        return None, None
+
+    def match(self, user_message, passes=PASSES):
+        return self.match_with_pass(user_message, passes)[1]
@@ -0,0 +1,149 @@
+# intent_reloader.py
+# Keeps the portal's intent indexes in step with the admin panel: training
+# intents and FAQs edited there are folded into a freshly built index that
+# replaces the live one in a single assignment.
+import logging
+import threading
+import time
+
+from faq_index import FaqIndex
+from intent_engine import DEFAULT_THRESHOLD, IntentEngine
+from intent_index import IntentMatcher, normalize_text
+from spell_index import DEFAULT_MAX_DISTANCE, SpellIndex
+
+logger = logging.getLogger(__name__)
+
+# reply for admin intents that have no response anywhere in the dataset
+TRAINING_FALLBACK_RESPONSE = 'I can help with {topic}. Could you tell me a little more?'
+
+
+def training_rows(training, rows):
+    """Rows for the admin training examples.
+
+    An intent's reply is its own 'response' if the admin gave one, else the
+    first plain dataset response for that intent, else a generic prompt.
+    """
+    responses = {}
+    for row in rows:
+        if row.get('response') and not row.get('entities'):
+            responses.setdefault(row.get('intent', ''), row['response'])
+    result = []
+    for item in (training or {}).get('intents', []):
+        intent = (item.get('intent') or '').strip()
+        if not intent:
+            continue
+        response = (item.get('response') or responses.get(intent)
+                    or TRAINING_FALLBACK_RESPONSE.format(topic=intent.replace('_', ' ')))
+        for example in item.get('examples', []):
+            if example and example.strip():
+                result.append({'text': example.strip(), 'intent': intent, 'response': response, 'entities': ''})
+    return result
+
+
+class IntentIndex:
+    """Matcher and TF-IDF engine over one row set, plus a BM25 FAQ index.
+
+    `spell` corrects typos towards the words of the rows and FAQ questions.
+    """
+
+    __slots__ = ('matcher', 'engine', 'faq', 'spell', 'version')
+
+    def __init__(self, rows, faq=(), threshold=DEFAULT_THRESHOLD, artifact_dir=None, version=0,
+                 spell_distance=DEFAULT_MAX_DISTANCE):
+        self.matcher = IntentMatcher(rows)
+        self.engine = IntentEngine.from_rows(rows, threshold=threshold, artifact_dir=artifact_dir)
+        self.faq = FaqIndex.from_entries(faq, artifact_dir=artifact_dir)
+        counts = {token: len(postings) for token, postings in self.matcher.postings.items()}
+        for term, n in self.faq.term_document_counts().items():
+            counts[term] = counts.get(term, 0) + n
+        self.spell = SpellIndex(counts, max_distance=spell_distance)
+        self.version = version
+
+    def add_row(self, row):
+        self.matcher.add_row(row)
+        self.engine.add_row(row)
+        for token in set(normalize_text(row.get('text') or '').split()):
+            self.spell.add_word(token)
+
+
+class IntentReloader:
+    """Rebuilds the IntentIndex when a watched admin file changes.
+
+    `rows` is the live dataset list; add_row() appends to it and to the
+    current index. `sources` are WatchedFile objects, and
+    `build(rows, *values)` makes an IntentIndex from a copy of the rows
+    and the sources' current values. A daemon thread checks the files
+    every `interval` seconds and builds the new index off the request
+    path; rows added meanwhile are replayed
+    onto it before it replaces `current`. Callers read `current` once per
+    lookup, so a request only ever sees one complete index.
+    """
+
+    def __init__(self, rows, sources, build, interval=2.0, on_swap=None):
+        self.rows = rows
+        self.sources = sources
+        self.build = build
+        self.interval = interval
+        self.on_swap = on_swap
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._pending = None  # rows added while a rebuild is running
+        self._thread = None
+        self._versions, rows, values = self._snapshot()
+        self.current = build(rows, *values)
+
+    def _snapshot(self):
+        values = [source.get() for source in self.sources]
+        return tuple(source.version for source in self.sources), list(self.rows), values
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='intent-reloader', daemon=True)
+                self._thread.start()
+
+    def add_row(self, row):
+        with self._lock:
+            self.rows.append(row)
+            self.current.add_row(row)
+            if self._pending is not None:
+                self._pending.append(row)
+
+    def reload(self):
+        """Build a new index from the current files and swap it in."""
+        started = time.perf_counter()
+        with self._lock:
+            versions, rows, values = self._snapshot()
+            self._pending = []
+        try:
+            index = self.build(rows, *values)
+            index.version = self.current.version + 1
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for row in self._pending:
+                index.add_row(row)
+            self._pending = None
+            self._versions = versions
+            self.current = index
+            self.reloads += 1
+        if self.on_swap is not None:
+            self.on_swap()
+        logger.info('Intent index reloaded (%d rows) in %.2fs', len(index.matcher), time.perf_counter() - started)
+        return index
+
+    def _changed(self):
+        for source in self.sources:
+            source.get()
+        return tuple(source.version for source in self.sources) != self._versions
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self._changed():
+                    self.reload()
+            except Exception:
+                logger.exception('Intent index reload failed; keeping the current index')
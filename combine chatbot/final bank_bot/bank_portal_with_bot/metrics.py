@@ -0,0 +1,283 @@
+# metrics.py
+# In-process counters and histograms rendered in the Prometheus text
+# format, and an opt-in sampling profiler that keeps folded stacks of the
+# slowest requests. Values are per process: with several uvicorn workers
+# each one serves its own /metrics.
+import bisect
+import heapq
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(v)}' for key, v in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                running += n
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(float(bound)))])} {running}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, kind, documentation, collect):
+        """`collect()` returns [(labels dict, value)], read at scrape time.
+
+        Used for values other objects already keep (cache hits, bytes
+        written) so the hot path does not count them twice.
+        """
+        self._collectors.append((name, kind, documentation, collect))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        for name, kind, documentation, collect in self._collectors:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in collect():
+                lines.append(f'{name}{_labels(list(labels), list(labels.values()))} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+# ---------- Slow request profiler ----------
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests; keeps the slowest ones.
+
+    A daemon thread wakes every `interval_ms` and records the current stack
+    of each thread between begin() and end(). Requests slower than
+    `threshold_ms` are written to `out_dir` as folded stacks
+    ("frame;frame;frame count" per line), the input format of
+    flamegraph.pl and speedscope. Only the `keep` slowest files are kept.
+    """
+
+    def __init__(self, out_dir, threshold_ms=250, interval_ms=5, keep=20):
+        self.out_dir = out_dir
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.keep = keep
+        self._active = {}   # thread ident -> {folded stack: samples}
+        self._slowest = []  # min-heap of (seconds, path)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+        os.makedirs(out_dir, exist_ok=True)
+        self._thread.start()
+
+    @staticmethod
+    def _fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stack = self._fold(frame)
+                        samples[stack] = samples.get(stack, 0) + 1
+            del frames
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = {}
+
+    def end(self, label, seconds):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or seconds < self.threshold:
+            return None
+        with self._lock:
+            if len(self._slowest) >= self.keep and seconds <= self._slowest[0][0]:
+                return None
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(seconds * 1000)}ms-{label}-{threading.get_ident()}.folded'
+        path = os.path.join(self.out_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, n in sorted(samples.items()):
+                f.write(f'{stack} {n}\n')
+        with self._lock:
+            heapq.heappush(self._slowest, (seconds, path))
+            while len(self._slowest) > self.keep:
+                _, old = heapq.heappop(self._slowest)
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return path
+
+
+def profiler_from_env(default_dir):
+    """Profiler configured by BANKBOT_PROFILE_SLOW_MS, or None when unset."""
+    threshold = os.environ.get('BANKBOT_PROFILE_SLOW_MS')
+    if not threshold:
+        return None
+    return SlowRequestProfiler(
+        os.environ.get('BANKBOT_PROFILE_DIR', default_dir),
+        threshold_ms=float(threshold),
+        interval_ms=float(os.environ.get('BANKBOT_PROFILE_INTERVAL_MS', '5')),
+        keep=int(os.environ.get('BANKBOT_PROFILE_KEEP', '20')),
+    )
+
+
+# ---------- Flask integration ----------
+def install_flask(app, prefix, registry=REGISTRY, profiler=None):
+    """Time every request and serve registry.render() at /metrics.
+
+    /metrics only answers loopback clients unless BANKBOT_METRICS_PUBLIC=1.
+    Returns the request-duration histogram so callers can time requests
+    served outside Flask with track_request().
+    """
+    from flask import g, request, Response
+
+    request_seconds = registry.histogram(f'{prefix}_request_seconds', 'Request duration by endpoint.', ['endpoint'])
+    public = os.environ.get('BANKBOT_METRICS_PUBLIC') == '1'
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+        if profiler is not None:
+            profiler.begin()
+
+    @app.teardown_request
+    def _stop_request_timer(exc=None):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.observe(seconds, endpoint=endpoint)
+        if profiler is not None:
+            profiler.end(endpoint, seconds)
+
+    @app.route('/metrics')
+    def metrics():
+        if not public and request.remote_addr not in ('127.0.0.1', '::1'):
+            return {'error': 'Forbidden'}, 403
+        return Response(registry.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    return request_seconds
+
+
+@contextmanager
+def track_request(request_seconds, endpoint, profiler=None):
+    """Same timing as install_flask() for requests that bypass Flask."""
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.begin()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        request_seconds.observe(seconds, endpoint=endpoint)
+        if profiler is not None:
+            profiler.end(endpoint, seconds)
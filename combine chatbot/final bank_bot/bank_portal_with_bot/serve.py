@@ -0,0 +1,39 @@
+# serve.py
+# Production launcher: runs the ASGI app (asgi.py) under uvicorn instead
+# of Flask's debug server.
+import argparse
+import os
+
+import uvicorn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the bank portal with uvicorn.')
+    parser.add_argument('--host', default=os.environ.get('BANKBOT_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('BANKBOT_PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('BANKBOT_WORKERS', '1')),
+                        help='number of worker processes')
+    parser.add_argument('--chat-threads', type=int, default=int(os.environ.get('BANKBOT_CHAT_WORKERS', '8')),
+                        help='chat matching threads per worker')
+    parser.add_argument('--log-level', default=os.environ.get('BANKBOT_LOG_LEVEL', 'info'))
+    args = parser.parse_args(argv)
+
+    # read by asgi.py when each worker imports it
+    os.environ['BANKBOT_CHAT_WORKERS'] = str(args.chat_threads)
+    os.environ['BANKBOT_WORKERS'] = str(args.workers)
+    if args.workers > 1:
+        # per-user rate limits must hold whichever worker gets the request
+        os.environ.setdefault('BANKBOT_RATE_LIMIT_DB',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rate_limits.db'))
+    uvicorn.run(
+        'asgi:application',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+if __name__ == '__main__':
+    main()
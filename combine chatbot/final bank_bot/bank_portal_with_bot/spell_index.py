@@ -0,0 +1,120 @@
+# spell_index.py
+import time
+
+from intent_index import normalize_text
+
+DEFAULT_MAX_DISTANCE = 2
+# only the first PREFIX_LENGTH characters are indexed; longer words are
+# found through their prefix and then checked in full
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 3
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent swaps cost 1), or limit + 1 if above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        best = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            best = min(best, value)
+        if best > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def _deletes(word, distance):
+    """Every string made by deleting up to `distance` characters from word."""
+    result = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - result
+        result |= frontier
+    return result
+
+
+class SpellIndex:
+    """Symmetric-delete (SymSpell) index for correcting typos in messages.
+
+    Every vocabulary word is stored under each string obtained by deleting
+    up to `max_distance` characters from its prefix. A misspelling shares
+    one of those delete strings with the words near it, so a lookup only
+    hashes the deletes of the input and measures the distance to the few
+    words they lead to, however large the vocabulary.
+    """
+
+    def __init__(self, counts=None, max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.counts = {}   # word -> number of rows containing it
+        self._deletes = {}  # delete string -> words
+        for word, count in (counts or {}).items():
+            self.add_word(word, count)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add_word(self, word, count=1):
+        if not word or any(c.isdigit() for c in word):
+            return
+        if word in self.counts:
+            self.counts[word] += count
+            return
+        self.counts[word] = count
+        if len(word) < MIN_WORD_LENGTH:
+            return  # known, but never offered as a correction
+        for key in _deletes(word[:PREFIX_LENGTH], self.max_distance):
+            self._deletes.setdefault(key, []).append(word)
+
+    def _limit(self, word):
+        # short words have few neighbours to spare: one edit below 5 letters
+        return min(self.max_distance, 1) if len(word) < 5 else self.max_distance
+
+    def lookup(self, word):
+        """Closest vocabulary word within the edit limit, or None.
+
+        Ties prefer the same first letter, then the more common word.
+        """
+        if word in self.counts:
+            return word
+        limit = self._limit(word)
+        best = None
+        best_key = None
+        seen = set()
+        for key in _deletes(word[:PREFIX_LENGTH], limit):
+            for candidate in self._deletes.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, limit)
+                if distance > limit:
+                    continue
+                rank = (distance, candidate[0] != word[0], -self.counts[candidate], candidate)
+                if best_key is None or rank < best_key:
+                    best, best_key = candidate, rank
+        return best
+
+    def correct(self, message, budget_ms=None):
+        """(corrected text, whether it finished within budget_ms).
+
+        The text is normalized; unknown words of MIN_WORD_LENGTH letters or
+        more are replaced by their closest vocabulary word. Once the budget
+        is spent the remaining words are left as they are.
+        """
+        words = normalize_text(message).split()
+        deadline = None if budget_ms is None else time.perf_counter() + budget_ms / 1000.0
+        for i, word in enumerate(words):
+            if word in self.counts or len(word) < MIN_WORD_LENGTH or any(c.isdigit() for c in word):
+                continue
+            if deadline is not None and time.perf_counter() > deadline:
+                return ' '.join(words), False
+            words[i] = self.lookup(word) or word
+        return ' '.join(words), True
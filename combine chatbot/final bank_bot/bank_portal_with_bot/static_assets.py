@@ -0,0 +1,223 @@
+# static_assets.py
+# Build step for static/: content-hashed copies of every file, resized
+# WebP/AVIF variants of images and gzip/brotli copies of text files, all
+# under static/dist/ with a manifest.json the portal reads to emit URLs.
+#
+#   python static_assets.py build
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+from io import BytesIO
+
+try:
+    import brotli
+except ImportError:  # optional; gzip copies are still built
+    brotli = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(HERE, 'static')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+TEXT_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# resized widths; the image's own width is always kept as the largest
+IMAGE_WIDTHS = (160, 320, 640, 1280)
+IMAGE_QUALITY = {'webp': 80, 'avif': 55}
+# Accept-Encoding token -> suffix of the precompressed copy
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+# a compressed copy must save at least this much to be kept
+MIN_SAVING = 0.1
+HASH_LENGTH = 12
+_HASHED_RE = re.compile(rf'\.([0-9a-f]{{{HASH_LENGTH}}})\.[^./]+$')
+
+
+def _hashed_name(root, ext, data):
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f'{root}.{digest}{ext}'
+
+
+def _image_formats():
+    from PIL import features
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def _encode_image(image, fmt):
+    out = BytesIO()
+    if fmt in ('jpg', 'jpeg'):
+        image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif fmt == 'png':
+        image.save(out, 'PNG', optimize=True)
+    else:
+        image.save(out, fmt.upper(), quality=IMAGE_QUALITY[fmt])
+    return out.getvalue()
+
+
+def _build_image(name, data, write):
+    """{'file', 'width', 'height', 'variants': {format: {width: file}}}."""
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    image.load()
+    width, height = image.size
+    root, ext = os.path.splitext(name)
+    own_format = ext.lstrip('.').lower()
+    widths = sorted({w for w in IMAGE_WIDTHS if w < width} | {width})
+    variants = {}
+    for fmt in [own_format] + _image_formats():
+        variants[fmt] = {}
+        for w in widths:
+            resized = image if w == width else image.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+            encoded = _encode_image(resized, fmt)
+            variants[fmt][str(w)] = write(_hashed_name(f'{root}.{w}', '.' + fmt, encoded), encoded)
+    return {'file': write(_hashed_name(root, ext, data), data), 'width': width, 'height': height, 'variants': variants}
+
+
+def _compress(data):
+    copies = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copies['br'] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in copies.items() if len(body) <= len(data) * (1 - MIN_SAVING)}
+
+
+def build(static_dir=STATIC_DIR):
+    """Rebuild static/dist/ and return the manifest.
+
+    Files are written to a temporary directory that then replaces dist/,
+    so a running portal never sees half a build.
+    """
+    dist_dir = os.path.join(static_dir, DIST)
+    tmp_dir = f'{dist_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    manifest = {'version': MANIFEST_VERSION, 'assets': {}, 'encodings': {}}
+
+    def write(rel, body):
+        path = os.path.join(tmp_dir, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        if rel.lower().endswith(TEXT_EXTENSIONS):
+            compressed = _compress(body)
+            for encoding, copy in compressed.items():
+                with open(path + ENCODINGS[encoding], 'wb') as f:
+                    f.write(copy)
+            if compressed:
+                # best first, the order responses prefer them in
+                manifest['encodings'][rel] = [e for e in ENCODINGS if e in compressed]
+        return rel
+
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist_dir and not d.startswith(f'{DIST}.tmp'))
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                manifest['assets'][name] = _build_image(name, data, write)
+            else:
+                manifest['assets'][name] = {'file': write(_hashed_name(*os.path.splitext(name), data), data)}
+
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    old_dir = f'{dist_dir}.old-{os.getpid()}'
+    if os.path.exists(dist_dir):
+        os.replace(dist_dir, old_dir)
+    os.replace(tmp_dir, dist_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f'{path} is not a version {MANIFEST_VERSION} asset manifest')
+    return manifest
+
+
+class Assets:
+    """URLs for built assets, falling back to the plain static files.
+
+    `manifest` is a callable returning the current manifest (a
+    WatchedFile's get, so a rebuild is picked up without a restart) and
+    `static_url(filename)` makes a /static URL.
+    """
+
+    def __init__(self, manifest, static_url):
+        self.manifest = manifest
+        self.static_url = static_url
+
+    def _entry(self, filename):
+        return (self.manifest() or {}).get('assets', {}).get(filename)
+
+    def url(self, filename, width=None, format=None):
+        """URL of the built file, or of its smallest variant at least `width` wide."""
+        entry = self._entry(filename)
+        if entry is None:
+            return self.static_url(filename)
+        if width is None and format is None:
+            return self.static_url(f"{DIST}/{entry['file']}")
+        variants = entry.get('variants', {}).get(format or os.path.splitext(filename)[1].lstrip('.').lower())
+        if not variants:
+            return self.static_url(f"{DIST}/{entry['file']}")
+        widths = sorted(int(w) for w in variants)
+        chosen = next((w for w in widths if width is None or w >= width), widths[-1])
+        return self.static_url(f'{DIST}/{variants[str(chosen)]}')
+
+    def srcset(self, filename, format):
+        """'url 160w, url 320w, ...' for a <source>; empty if there is no such variant."""
+        entry = self._entry(filename)
+        variants = (entry or {}).get('variants', {}).get(format)
+        if not variants:
+            return ''
+        return ', '.join(f'{self.static_url(f"{DIST}/{variants[w]}")} {w}w'
+                         for w in sorted(variants, key=int))
+
+    def encodings(self, rel):
+        return (self.manifest() or {}).get('encodings', {}).get(rel, [])
+
+
+def send_built(assets, dist_dir, rel, request):
+    """Response for static/dist/<rel>, with ETag/304 and the precompressed
+    copy the client accepts. Content-hashed files are immutable; anything
+    else (manifest.json) must be revalidated."""
+    from flask import abort, send_file
+    from werkzeug.security import safe_join
+
+    path = safe_join(dist_dir, rel)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    available = assets.encodings(rel)
+    encoding = request.accept_encodings.best_match(available) if available else None
+    mimetype = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+    hashed = _HASHED_RE.search(rel)
+    if hashed:
+        # the file name already carries the content hash
+        etag = hashed.group(1) + (f'-{encoding}' if encoding else '')
+    else:
+        etag = True
+    response = send_file(path + ENCODINGS[encoding] if encoding else path, mimetype=mimetype,
+                         etag=etag, conditional=True, max_age=365 * 24 * 3600 if hashed else None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if available:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if hashed else 'no-cache'
+    return response
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['build']:
+        manifest = build()
+        files = sum(1 + sum(len(v) for v in a.get('variants', {}).values()) for a in manifest['assets'].values())
+        print(f"{len(manifest['assets'])} assets, {files} files -> {os.path.join(STATIC_DIR, DIST)}"
+              + ('' if brotli is not None else ' (brotli not installed: gzip only)'))
+    else:
+        print('usage: python static_assets.py build')
@@ -0,0 +1,64 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PORTAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PORTAL_DIR)
+
+# Modules read their paths from the environment when they are imported, so
+# point every file the portal writes at a scratch directory first.
+WORKDIR = tempfile.mkdtemp(prefix='bankbot-tests-')
+DATASET = os.path.join(WORKDIR, 'bank_chatbot_dataset.csv')
+shutil.copy(os.path.join(PORTAL_DIR, 'bankbot', 'milestone 2', 'bank_chatbot_dataset.csv'), DATASET)
+os.environ.update({
+    'BANKBOT_DATASET_PATH': DATASET,
+    'BANKBOT_USER_DATA_FILE': os.path.join(WORKDIR, 'user_data.json'),
+    'BANKBOT_CONVERSATION_LOG': os.path.join(WORKDIR, 'conversations.jsonl'),
+    'BANKBOT_STATE_DB': os.path.join(WORKDIR, 'chat_state.db'),
+    'BANKBOT_DATABASE_URI': 'sqlite:///' + os.path.join(WORKDIR, 'bank.db'),
+    'BANKBOT_MODEL_DIR': os.path.join(WORKDIR, 'model_cache'),
+    'BANKBOT_ADMIN_DATA_DIR': WORKDIR,
+    'BANKBOT_CHAT_EVENTS_DB': '',
+    'BANKBOT_RATE_LIMIT_PER_S': '0',
+    'BANKBOT_CHAT_MAX_CONCURRENT': '0',
+    'BANKBOT_BALANCE_CACHE_TTL': '0',
+})
+
+
+def pytest_sessionfinish(session):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def portal():
+    import app
+    return app
+
+
+@pytest.fixture
+def make_user(portal):
+    def make(name, account_number=None, balance=0.0):
+        with portal.app.app_context():
+            user = portal.User(username=name, email=f'{name}@example.com', password='secret',
+                               account_number=account_number, account_type='savings', balance=balance)
+            portal.db.session.add(user)
+            portal.db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def chat(portal):
+    """chat(user_id, message) -> the /api/chat JSON reply, as that user."""
+    client = portal.app.test_client()
+
+    def send(user_id, message):
+        with client.session_transaction() as s:
+            s['user_id'] = user_id
+        response = client.post('/api/chat', json={'message': message})
+        assert response.status_code == 200
+        return response.get_json()
+    return send
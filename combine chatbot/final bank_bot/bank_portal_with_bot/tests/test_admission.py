@@ -0,0 +1,69 @@
+import pytest
+
+import admission
+
+
+def test_memory_buckets_allow_the_burst_then_refuse():
+    buckets = admission.MemoryBuckets(rate=1, burst=3)
+    assert [buckets.take('u') for _ in range(3)] == [0, 0, 0]
+    assert 0 < buckets.take('u') <= 1
+    # other users have their own bucket
+    assert buckets.take('v') == 0
+
+
+def test_sqlite_buckets_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'rate_limits.db')
+    first = admission.SQLiteBuckets(path, rate=0.5, burst=2)
+    second = admission.SQLiteBuckets(path, rate=0.5, burst=2)
+    try:
+        assert first.take('u') == 0
+        assert second.take('u') == 0
+        assert first.take('u') > 0
+    finally:
+        first.close()
+        second.close()
+
+
+def test_rate_limited_user_gets_429():
+    controller = admission.AdmissionController(admission.MemoryBuckets(rate=1, burst=1), max_concurrent=0)
+    controller.admit('u')()
+    with pytest.raises(admission.Rejected) as exc:
+        controller.admit('u')
+    assert exc.value.status == 429
+    assert exc.value.headers() == {'Retry-After': '1'}
+    assert controller.shed['rate_limited'] == 1
+    assert controller.in_flight == 0
+
+
+def test_concurrency_limit_gives_503_until_a_chat_finishes():
+    controller = admission.AdmissionController(max_concurrent=2)
+    releases = [controller.admit('u'), controller.admit('v')]
+    with pytest.raises(admission.Rejected) as exc:
+        controller.admit('w')
+    assert exc.value.status == 503
+    assert exc.value.payload()['error'] == 'Server busy'
+    releases.pop()()
+    with controller.admitted('w'):
+        assert controller.in_flight == 2
+    assert controller.in_flight == 1
+
+
+def test_from_env():
+    controller = admission.from_env({'BANKBOT_RATE_LIMIT_PER_S': '0', 'BANKBOT_CHAT_MAX_CONCURRENT': '0'})
+    assert controller.buckets is None and controller.max_concurrent == 0
+    controller = admission.from_env({'BANKBOT_CHAT_MAX_CONCURRENT': '10', 'BANKBOT_WORKERS': '4'})
+    assert isinstance(controller.buckets, admission.MemoryBuckets)
+    assert controller.max_concurrent == 3
+
+
+def test_api_chat_is_rate_limited(portal, make_user, monkeypatch):
+    user = make_user('rate-limited')
+    monkeypatch.setattr(portal, 'admission_control',
+                        admission.AdmissionController(admission.MemoryBuckets(rate=0.01, burst=1), max_concurrent=0))
+    client = portal.app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'] = user
+    assert client.post('/api/chat', json={'message': 'hello'}).status_code == 200
+    response = client.post('/api/chat', json={'message': 'hello'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
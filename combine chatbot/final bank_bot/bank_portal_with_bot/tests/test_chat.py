@@ -0,0 +1,49 @@
+def test_balance_of_own_account(make_user, chat):
+    user = make_user('alice', '100000000001', 5000)
+    assert chat(user, 'check balance')['reply'] == '💰 Of course. What is your account number?'
+    reply = chat(user, '100000000001')
+    assert reply['intent'] == 'check_balance'
+    assert reply['reply'] == '💰 Your balance is 5,000.00.'
+
+
+def test_balance_of_another_users_account_is_refused(make_user, chat):
+    make_user('bob', '100000000002', 900)
+    mallory = make_user('mallory', '100000000003', 10)
+    chat(mallory, 'check balance')
+    reply = chat(mallory, '100000000002')
+    assert "couldn't find account 100000000002" in reply['reply']
+    assert '900' not in reply['reply']
+
+
+def test_balance_lookup_is_scoped_to_the_user(portal, make_user):
+    owner = make_user('grace', '100000000006', 300)
+    other = make_user('heidi')
+    with portal.app.app_context():
+        assert portal._lookup_balance((owner, '100000000006')) == 300
+        assert portal._lookup_balance((other, '100000000006')) is None
+
+
+def test_balance_follow_up_after_a_refusal(make_user, chat):
+    make_user('carol', '100000000004', 700)
+    dave = make_user('dave', '100000000005', 42)
+    assert 'account number' in chat(dave, 'check balance')['reply']
+    assert "couldn't find account" in chat(dave, '100000000004')['reply']
+    # still waiting for a number: the user's own one answers it
+    assert chat(dave, '100000000005')['reply'] == '💰 Your balance is 42.00.'
+
+
+def test_transfer_uses_the_message_not_the_dataset_row(make_user, chat):
+    user = make_user('erin')
+    assert chat(user, 'send 500 to john')['reply'] == '💸 OK, sending 500 to john.'
+    assert chat(user, 'transfer 200 to Priya Sharma')['reply'] == '💸 OK, sending 200 to Priya Sharma.'
+
+
+def test_transfer_asks_for_what_is_missing(make_user, chat):
+    user = make_user('frank')
+    assert chat(user, 'transfer money')['reply'].endswith('Who should I send it to?')
+    assert chat(user, 'Ravi')['reply'] == '💸 How much would you like to send to Ravi?'
+    assert chat(user, '250')['reply'] == '💸 OK, sending 250 to Ravi.'
+
+
+def test_chat_needs_a_login(portal):
+    assert portal.app.test_client().post('/api/chat', json={'message': 'hi'}).status_code == 401
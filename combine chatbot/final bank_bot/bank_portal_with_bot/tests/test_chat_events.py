@@ -0,0 +1,48 @@
+import pytest
+
+import chat_events
+
+
+def test_events_reach_the_queue_and_drain_once(tmp_path):
+    path = str(tmp_path / 'chat_events.db')
+    writer = chat_events.EventWriter(path, flush_interval=60)
+    assert writer.emit('hi', 'greeting', 'exact', 1.0, 0.5)
+    assert writer.emit('what', 'out_of_scope', 'tfidf', 0.1, 2.5)
+    assert writer.flush() == 2
+    conn = chat_events.connect(path)
+    handled = []
+    assert chat_events.drain(conn, handled.extend, batch_size=1) == 1
+    assert chat_events.drain(conn, handled.extend) == 1
+    assert chat_events.drain(conn, handled.extend) == 0
+    assert [(e['query'], e['source'], e['latency_ms']) for e in handled] == [('hi', 'exact', 0.5),
+                                                                            ('what', 'tfidf', 2.5)]
+    writer.close()
+
+
+def test_a_failed_handler_leaves_events_queued(tmp_path):
+    path = str(tmp_path / 'chat_events.db')
+    writer = chat_events.EventWriter(path, flush_interval=60)
+    writer.emit('hi', 'greeting')
+    writer.flush()
+    conn = chat_events.connect(path)
+
+    def fail(events):
+        raise RuntimeError('query log unavailable')
+
+    with pytest.raises(RuntimeError):
+        chat_events.drain(conn, fail)
+    assert chat_events.drain(conn, lambda events: None) == 1
+    writer.close()
+
+
+def test_full_buffer_and_queue_drop_events(tmp_path):
+    writer = chat_events.EventWriter(str(tmp_path / 'chat_events.db'), buffer_size=2, max_pending=3,
+                                     flush_interval=60)
+    assert writer.emit('a', 'x') and writer.emit('b', 'x')
+    assert not writer.emit('c', 'x')
+    assert writer.flush() == 2
+    writer.emit('d', 'x')
+    writer.emit('e', 'x')
+    assert writer.flush() == 1
+    assert writer.info() == {'queued': 3, 'dropped': 2, 'buffered': 0, 'write_errors': 0}
+    writer.close()
@@ -0,0 +1,79 @@
+import json
+
+from conversation_store import ConversationStore, migrate_conversation_log, migrate_user_data
+
+
+def write_log(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+        f.write('{"t": "turn", "u": "torn')  # interrupted last write
+
+
+def test_turns_and_state(tmp_path):
+    store = ConversationStore(str(tmp_path / 'state.db'))
+    assert store.get_state('1') is None
+    store.update_state('1', dialogue='awaiting_amount', person='Ravi')
+    store.update_state('1', dialogue=None)
+    for i in range(30):
+        store.append_turn('1', f'q{i}', f'a{i}', 'greeting')
+    assert store.get_state('1') == {'dialogue': None, 'person': 'Ravi'}
+    assert store.count_conversations('1') == 30
+    assert [t['user'] for t in store.recent_conversations('1', limit=3)] == ['q27', 'q28', 'q29']
+    assert store.get_conversations('1', start=0, limit=1) == [{'user': 'q0', 'bot': 'a0', 'intent': 'greeting'}]
+
+
+def test_writes_from_another_process_are_seen(tmp_path):
+    path = str(tmp_path / 'state.db')
+    first, second = ConversationStore(path), ConversationStore(path)
+    first.update_state('1', step=1)
+    assert second.get_state('1') == {'step': 1}
+    second.update_state('1', step=2)
+    first.append_turn('1', 'hi', 'hello', 'greeting')
+    assert first.get_state('1') == {'step': 2}
+    assert second.count_conversations('1') == 1
+
+
+def test_sessions_stay_within_the_memory_budget(tmp_path):
+    store = ConversationStore(str(tmp_path / 'state.db'), memory_budget=20000)
+    for user in range(50):
+        store.append_turn(str(user), 'x' * 200, 'y' * 200, 'greeting')
+    info = store.session_info()
+    assert info['bytes'] <= 20000 and info['sessions'] < 50
+    # evicted users are reloaded from the database
+    assert store.count_conversations('0') == 1 and '0' in store
+
+
+def test_conversation_log_is_imported_once(tmp_path):
+    log = tmp_path / 'conversations.jsonl'
+    write_log(log, [{'t': 'state', 'u': '1', 'state': {'balance': 10}},
+                    {'t': 'turn', 'u': '1', 'user': 'hi', 'bot': 'hello', 'intent': 'greeting'}])
+    store = ConversationStore(str(tmp_path / 'state.db'))
+    assert migrate_conversation_log(str(log), store) == 1
+    assert not log.exists() and (tmp_path / 'conversations.jsonl.imported').exists()
+    assert migrate_conversation_log(str(log), store) == 0
+    assert store.get_state('1') == {'balance': 10}
+    assert store.count_conversations('1') == 1
+
+
+def test_conversation_log_is_merged_into_a_store_with_users(tmp_path):
+    log = tmp_path / 'conversations.jsonl'
+    write_log(log, [{'t': 'turn', 'u': '1', 'user': 'old', 'bot': 'old', 'intent': 'greeting'},
+                    {'t': 'turn', 'u': '2', 'user': 'hi', 'bot': 'hello', 'intent': 'greeting'}])
+    store = ConversationStore(str(tmp_path / 'state.db'))
+    store.append_turn('1', 'new', 'new', 'greeting')
+    assert migrate_conversation_log(str(log), store) == 1
+    assert not log.exists()
+    # users already stored keep their own history
+    assert [t['user'] for t in store.recent_conversations('1')] == ['new']
+    assert [t['user'] for t in store.recent_conversations('2')] == ['hi']
+
+
+def test_user_data_json_only_fills_an_empty_store(tmp_path):
+    user_data = tmp_path / 'user_data.json'
+    user_data.write_text(json.dumps({'7': {'balance': 5, 'conversations': [
+        {'user': 'hi', 'bot': 'hello', 'intent': 'greeting'}]}}))
+    store = ConversationStore(str(tmp_path / 'state.db'))
+    assert migrate_user_data(str(user_data), store) == 1
+    assert store.get_state('7') == {'balance': 5}
+    assert migrate_user_data(str(user_data), store) == 0
@@ -0,0 +1,51 @@
+import csv
+
+from dataset_writer import FIELDNAMES, DatasetWriter
+
+
+def read_rows(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_rows_are_deduplicated_and_written_behind(tmp_path):
+    path = str(tmp_path / 'dataset.csv')
+    seen = []
+    writer = DatasetWriter(path, existing_rows=[{'text': 'hi', 'intent': 'greeting', 'entities': ''}],
+                           flush_interval=0.05)
+    writer.add_listener(seen.append)
+    assert writer.add('hi', 'greeting', 'Hello!') is False
+    assert writer.add('balance 500', 'check_balance', '💰 500', 'MONEY:500') is True
+    assert writer.add('balance 500', 'check_balance', 'again', 'MONEY:500') is False
+    assert [r['text'] for r in seen] == ['balance 500']
+    writer.close()
+    assert read_rows(path) == [{'text': 'balance 500', 'intent': 'check_balance', 'response': '💰 500',
+                                'entities': 'MONEY:500'}]
+    with open(path, 'rb') as f:
+        assert f.read().startswith(b'\xef\xbb\xbf' + ','.join(FIELDNAMES).encode())
+
+
+def test_workers_pick_up_each_others_rows(tmp_path):
+    path = str(tmp_path / 'dataset.csv')
+    first, second = DatasetWriter(path, flush_interval=0.01), DatasetWriter(path, flush_interval=0.01)
+    seen = []
+    second.add_listener(seen.append)
+    first.add('send 5 to Ravi', 'transfer_money', 'OK', 'MONEY:5')
+    first.close()
+    second.sync()
+    assert [r['text'] for r in seen] == ['send 5 to Ravi']
+    # the same row added in both workers is written once
+    first.add('pay 7', 'transfer_money', 'OK', 'MONEY:7')
+    second.add('pay 7', 'transfer_money', 'OK', 'MONEY:7')
+    first.close()
+    second.close()
+    assert [r['text'] for r in read_rows(path)] == ['send 5 to Ravi', 'pay 7']
+
+
+def test_appends_after_a_file_without_a_final_newline(tmp_path):
+    path = tmp_path / 'dataset.csv'
+    path.write_bytes(b'text,intent,response,entities\r\nhi,greeting,Hello,')
+    writer = DatasetWriter(str(path))
+    writer.add('bye', 'goodbye', 'Bye', '')
+    writer.close()
+    assert [r['text'] for r in read_rows(path)] == ['hi', 'bye']
@@ -0,0 +1,55 @@
+import dialogue
+
+
+def test_transfer_entities_come_from_the_message():
+    assert dialogue.entities_for('transfer_money', 'send 500 to john') == {'amount': '500', 'person': 'john'}
+    assert dialogue.entities_for('transfer_money', 'please transfer 20.50 to my friend Anil Kumar now') == \
+        {'amount': '20.50', 'person': 'Anil Kumar'}
+    assert dialogue.entities_for('transfer_money', 'I want to send money') == {}
+
+
+def test_transfer_recipient_skips_filler_words():
+    assert dialogue.transfer_recipient('transfer to my savings account') is None
+    assert dialogue.transfer_recipient('I need to send 100 to Teja') == 'Teja'
+    assert dialogue.transfer_recipient('send it to the bank') is None
+
+
+def test_balance_entities():
+    assert dialogue.entities_for('check_balance', 'balance of ACC1001') == {'account_number': 'ACC1001'}
+    assert dialogue.entities_for('check_balance', 'what is my balance') == {}
+    assert dialogue.entities_for('greeting', 'send 500 to john') == {}
+
+
+def test_next_state():
+    assert dialogue.next_state('check_balance', {}) == dialogue.AWAITING_ACCOUNT_NUMBER
+    assert dialogue.next_state('check_balance', {'account_number': '1234'}) is None
+    assert dialogue.next_state('transfer_money', {'amount': '5'}) == dialogue.AWAITING_RECIPIENT
+    assert dialogue.next_state('transfer_money', {'person': 'Ravi'}) == dialogue.AWAITING_AMOUNT
+    assert dialogue.next_state('transfer_money', {'person': 'Ravi', 'amount': '5'}) is None
+
+
+def test_parse_reply():
+    assert dialogue.parse_reply(dialogue.AWAITING_ACCOUNT_NUMBER, 'it is 12345678') == ['12345678']
+    assert dialogue.parse_reply(dialogue.AWAITING_AMOUNT, 'make it 250.75') == '250.75'
+    assert dialogue.parse_reply(dialogue.AWAITING_RECIPIENT, 'to Ravi.') == 'Ravi'
+    assert dialogue.parse_reply(dialogue.AWAITING_RECIPIENT, 'what are your loan rates today?') is None
+    assert dialogue.parse_reply(dialogue.AWAITING_AMOUNT, 'check balance', is_command=lambda m: True) is None
+
+
+def test_account_cache_reads_through_and_invalidates():
+    calls = []
+
+    def lookup(key):
+        calls.append(key)
+        return {(1, 'A1'): 10.0}.get(key)
+
+    cache = dialogue.AccountCache(lookup, ttl=60, maxsize=2)
+    assert cache.get((1, 'A1')) == 10.0
+    assert cache.get((1, 'A1')) == 10.0
+    assert cache.get((2, 'A1')) is None
+    assert cache.get((2, 'A1')) is None
+    assert calls == [(1, 'A1'), (2, 'A1')]
+    cache.invalidate((1, 'A1'))
+    cache.get((1, 'A1'))
+    assert calls[-1] == (1, 'A1')
+    assert cache.info()['hits'] == 2
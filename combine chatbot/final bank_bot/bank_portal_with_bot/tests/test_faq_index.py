@@ -0,0 +1,71 @@
+import math
+import random
+
+import pytest
+
+from faq_index import FaqIndex, tokenize
+
+WORDS = ['card', 'debit', 'credit', 'block', 'lost', 'loan', 'rate', 'interest', 'home', 'my', 'is', 'the',
+         'how', 'can', 'i', 'open', 'account', 'savings', 'fixed', 'deposit', 'pin', 'reset', 'atm', 'limit']
+
+
+def brute_force(index, query, k, min_score=0.0):
+    """Plain BM25 over every question, best first, earlier question on ties."""
+    docs = [tokenize(q) for q in index.questions]
+    n = len(docs)
+    avgdl = sum(map(len, docs)) / n
+    terms = set(tokenize(query))
+    df = {term: sum(term in d for d in docs) for term in terms}
+    scores = []
+    for i, doc in enumerate(docs):
+        score = 0.0
+        for term in terms:
+            if term not in doc:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            tf = doc.count(term)
+            score += idf * tf * (index.k1 + 1) / (tf + index.k1 * (1 - index.b + index.b * len(doc) / avgdl))
+        if score > min_score:
+            scores.append((i, score))
+    scores.sort(key=lambda s: (-s[1], s[0]))
+    return scores[:k]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_maxscore_top_k_matches_brute_force(seed):
+    rng = random.Random(seed)
+    questions = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 9))) for _ in range(300)]
+    index = FaqIndex(questions, [''] * len(questions))
+    for _ in range(50):
+        query = ' '.join(rng.choice(WORDS + ['unknown']) for _ in range(rng.randint(1, 6)))
+        k = rng.choice([1, 3, 5, 10])
+        min_score = rng.choice([0.0, 0.0, 1.0, 3.0])
+        got = index.search(query, k=k, min_score=min_score)
+        expected = brute_force(index, query, k, min_score)
+        assert [d for d, _ in got] == [d for d, _ in expected], query
+        assert [s for _, s in got] == pytest.approx([s for _, s in expected])
+
+
+def test_best_answers_close_questions_only():
+    index = FaqIndex(['How can I block my debit card?', 'What is the home loan interest rate?'],
+                     ['Call us to block it.', 'It is 8.5%.'])
+    best = index.best('how do i block my debit card')
+    assert best['answer'] == 'Call us to block it.'
+    assert 0.5 <= best['confidence'] <= 1.0
+    assert index.best('my card') is None
+    assert index.best('weather tomorrow') is None
+
+
+def test_term_document_counts():
+    index = FaqIndex(['block my card', 'my card my pin'], ['a', 'b'])
+    assert index.term_document_counts() == {'block': 1, 'card': 2, 'my': 2, 'pin': 1}
+
+
+def test_artifact_round_trip(tmp_path):
+    questions = ['How can I reset my ATM pin?', 'How do I open a savings account?']
+    entries = [{'q': q, 'a': q.upper()} for q in questions]
+    index = FaqIndex.from_entries(entries, artifact_dir=str(tmp_path))
+    loaded = FaqIndex.from_entries(entries, artifact_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    assert loaded.search('reset pin') == index.search('reset pin')
+    assert loaded.best('open a savings account')['index'] == 1
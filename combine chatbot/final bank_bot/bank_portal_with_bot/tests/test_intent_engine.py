@@ -0,0 +1,57 @@
+import os
+
+from intent_engine import KEEP_ARTIFACTS, OUT_OF_SCOPE_RESPONSE, IntentEngine, prune_artifacts
+
+ROWS = [
+    {'text': 'what is my account balance', 'intent': 'check_balance', 'response': 'Which account?'},
+    {'text': 'transfer money to a friend', 'intent': 'transfer_money', 'response': 'To whom?'},
+    {'text': 'block my lost debit card', 'intent': 'card_block', 'response': 'Blocked.'},
+    {'text': 'home loan interest rate', 'intent': 'loan', 'response': '8%.'},
+]
+
+
+def test_predict():
+    engine = IntentEngine.from_rows(ROWS)
+    result = engine.predict('show my balance')
+    assert result['intent'] == 'check_balance' and result['index'] == 0
+    assert result['payload'] is ROWS[0]
+    assert engine.predict('weather tomorrow') == {'intent': 'out_of_scope', 'response': OUT_OF_SCOPE_RESPONSE,
+                                                  'score': 0.0, 'index': None, 'payload': None}
+    assert [r['intent'] for r in engine.predict_batch(['lost card', 'loan rate'])] == ['card_block', 'loan']
+
+
+def test_top_k_matches_dense_scores():
+    engine = IntentEngine.from_rows(ROWS)
+    query = engine.vectorizer.transform(['my card balance'])
+    dense = (engine.matrix @ query.T).toarray().ravel()
+    expected = sorted(((i, s) for i, s in enumerate(dense) if s > 0), key=lambda x: (-x[1], x[0]))
+    got = engine.top_k('my card balance', k=10)
+    assert [i for i, _ in got] == [i for i, _ in expected]
+
+
+def test_added_rows_are_scored_without_a_refit():
+    engine = IntentEngine.from_rows(ROWS)
+    engine.add_row({'text': 'block my credit card', 'intent': 'credit_block', 'response': 'Done.'})
+    assert len(engine) == 5
+    assert engine.predict('block credit card')['intent'] == 'credit_block'
+
+
+def test_artifact_is_reused(tmp_path):
+    first = IntentEngine.from_rows(ROWS, artifact_dir=str(tmp_path))
+    artifacts = os.listdir(tmp_path)
+    assert len(artifacts) == 1
+    second = IntentEngine.from_rows(ROWS, artifact_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == artifacts
+    assert second.top_k('lost debit card') == first.top_k('lost debit card')
+    IntentEngine.from_rows(ROWS[:3], artifact_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_prune_keeps_the_newest_artifacts_of_one_prefix(tmp_path):
+    for i in range(KEEP_ARTIFACTS + 2):
+        (tmp_path / f'tfidf-{i}').mkdir()
+        os.utime(tmp_path / f'tfidf-{i}', (i, i))
+    (tmp_path / 'faq-0').mkdir()
+    prune_artifacts(str(tmp_path), keep=str(tmp_path / 'tfidf-0'))
+    newest = {f'tfidf-{i}' for i in range(2, KEEP_ARTIFACTS + 2)}
+    assert set(os.listdir(tmp_path)) == newest | {'tfidf-0', 'faq-0'}
@@ -0,0 +1,48 @@
+from intent_index import IntentMatcher, ResultCache, normalize_text
+
+ROWS = [
+    {'text': 'What is my balance?', 'intent': 'check_balance', 'response': 'Which account?', 'entities': ''},
+    {'text': 'send 500 rupees to Teja', 'intent': 'transfer_money', 'response': 'Sent.',
+     'entities': 'MONEY:500|PERSON:Teja'},
+    {'text': 'balance for 12345678', 'intent': 'check_balance', 'response': '',
+     'entities': 'ACCOUNT_NUMBER:12345678'},
+    {'text': 'apply for a home loan', 'intent': 'loan', 'response': 'Sure.', 'entities': ''},
+    {'text': 'loan interest rates', 'intent': 'loan_rates', 'response': '8%.', 'entities': ''},
+]
+
+
+def test_normalize_text():
+    assert normalize_text("  What's   MY Balance?! ") == 'what is my balance'
+    assert normalize_text(None) == ''
+
+
+def test_passes_in_order():
+    matcher = IntentMatcher(ROWS)
+    assert matcher.match_with_pass('what is my BALANCE')[0] == 'exact'
+    assert matcher.match_with_pass('account 12345678 please') == \
+        ('entity', {'intent': 'check_balance', 'response': '', 'entities': 'ACCOUNT_NUMBER:12345678'})
+    name, result = matcher.match_with_pass('loan rates')
+    assert (name, result['intent']) == ('overlap', 'loan_rates')
+    assert matcher.match_with_pass('weather') == (None, None)
+    assert matcher.match('', passes=('exact',)) is None
+
+
+def test_overlap_ties_go_to_the_earliest_row():
+    matcher = IntentMatcher(ROWS)
+    assert matcher.match('loan')['intent'] == 'loan'
+    matcher.add_row({'text': 'loan', 'intent': 'late', 'response': '', 'entities': ''})
+    assert matcher.match('loan')['intent'] == 'late'  # exact beats overlap
+
+
+def test_result_cache():
+    cache = ResultCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.put('c', 3)
+    assert cache.get('b') == (False, None)
+    generation = cache.generation
+    cache.clear()
+    cache.put('d', 4, generation=generation)
+    assert cache.get('d') == (False, None)
+    assert cache.info() == {'hits': 1, 'misses': 2, 'size': 0, 'maxsize': 2}
@@ -0,0 +1,55 @@
+from spell_index import SpellIndex, edit_distance
+
+
+def test_edit_distance_stops_at_the_limit():
+    assert edit_distance('balance', 'balance', 2) == 0
+    assert edit_distance('balnce', 'balance', 2) == 1
+    assert edit_distance('blaance', 'balance', 2) == 1  # transposition
+    assert edit_distance('xyz', 'balance', 2) > 2
+
+
+def test_lookup_finds_words_within_the_limit():
+    index = SpellIndex({'balance': 5, 'transfer': 3, 'account': 4, 'loan': 2})
+    assert index.lookup('balance') == 'balance'
+    assert index.lookup('balnce') == 'balance'
+    assert index.lookup('trnasfr') == 'transfer'
+    assert index.lookup('acount') == 'account'
+    assert index.lookup('zzzzzz') is None
+
+
+def test_short_words_get_one_edit():
+    index = SpellIndex({'loan': 1, 'card': 1})
+    assert index.lookup('lon') == 'loan'
+    assert index.lookup('ln') is None
+    assert index.lookup('cxyd') is None
+
+
+def test_ties_prefer_the_same_first_letter_then_the_commoner_word():
+    index = SpellIndex({'cart': 1, 'dart': 1})
+    assert index.lookup('cartt') == 'cart'
+    index = SpellIndex({'bond': 1, 'band': 9})
+    assert index.lookup('bend') == 'band'
+
+
+def test_matches_a_linear_scan():
+    words = ['deposit', 'withdraw', 'statement', 'interest', 'savings', 'current', 'cheque', 'branch',
+             'mobile', 'banking', 'password', 'transaction', 'limit', 'credit', 'debit']
+    index = SpellIndex({w: 1 for w in words})
+    for typo in ['deposti', 'withdrw', 'statment', 'intrest', 'savngs', 'currnet', 'chequ', 'brnch',
+                 'moble', 'bnking', 'pasword', 'transacton', 'limt', 'credti', 'debt']:
+        linear = min(words, key=lambda w: (edit_distance(typo, w, 2), w[0] != typo[0], w))
+        assert index.lookup(typo) == linear, typo
+
+
+def test_correct_rewrites_unknown_words_only():
+    index = SpellIndex({'check': 2, 'my': 5, 'balance': 3})
+    assert index.correct('Chek my balnce 123') == ('check my balance 123', True)
+    assert index.correct('chek my balnce', budget_ms=0) == ('chek my balnce', False)
+
+
+def test_intent_index_vocabulary_includes_faq_words():
+    from intent_reloader import IntentIndex
+    rows = [{'text': 'check my balance', 'intent': 'check_balance', 'response': 'Which account?', 'entities': ''}]
+    index = IntentIndex(rows, faq=[{'q': 'How do I reset my ATM pin?', 'a': 'At any ATM.'}])
+    assert index.spell.correct('resett my pinn') == ('reset my pin', True)
+    assert index.spell.correct('balanse') == ('balance', True)
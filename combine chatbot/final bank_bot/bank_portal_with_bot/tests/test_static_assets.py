@@ -0,0 +1,92 @@
+import gzip
+from io import BytesIO
+
+import pytest
+from flask import Flask, request
+
+import static_assets
+from static_assets import DIST, MANIFEST, Assets, build, load_manifest, send_built
+
+
+def png(width, height):
+    from PIL import Image
+    buf = BytesIO()
+    Image.new('RGB', (width, height), (30, 90, 200)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@pytest.fixture(scope='module')
+def built(tmp_path_factory):
+    static_dir = tmp_path_factory.mktemp('assets') / 'static'
+    (static_dir / 'css').mkdir(parents=True)
+    (static_dir / 'css' / 'site.css').write_text('body { color: #123456; }\n' * 200)
+    (static_dir / 'logo.png').write_bytes(png(400, 100))
+    manifest = build(str(static_dir))
+    assets = Assets(lambda: manifest, lambda filename: f'/static/{filename}')
+    app = Flask(__name__)
+
+    @app.route('/static/dist/<path:rel>')
+    def dist(rel):
+        return send_built(assets, str(static_dir / DIST), rel, request)
+
+    return static_dir, manifest, assets, app.test_client()
+
+
+def test_build_writes_hashed_files_and_a_manifest(built):
+    static_dir, manifest, _, _ = built
+    assert load_manifest(str(static_dir / DIST / MANIFEST)) == manifest
+    css = manifest['assets']['css/site.css']['file']
+    assert css.startswith('css/site.') and css.endswith('.css')
+    assert manifest['encodings'][css][-1] == 'gzip'
+    with gzip.open(static_dir / DIST / (css + '.gz')) as f:
+        assert f.read() == (static_dir / 'css' / 'site.css').read_bytes()
+    logo = manifest['assets']['logo.png']
+    assert (logo['width'], logo['height']) == (400, 100)
+    assert sorted(logo['variants']['png'], key=int) == ['160', '320', '400']
+
+
+def test_urls_fall_back_to_static(built):
+    _, manifest, assets, _ = built
+    assert assets.url('missing.png') == '/static/missing.png'
+    assert assets.url('css/site.css') == f"/static/{DIST}/{manifest['assets']['css/site.css']['file']}"
+    variants = manifest['assets']['logo.png']['variants']['png']
+    assert assets.url('logo.png', width=1) == f"/static/{DIST}/{variants['160']}"
+    assert assets.url('logo.png', width=300) == f"/static/{DIST}/{variants['320']}"
+    assert assets.srcset('logo.png', 'png').count('w,') == len(variants) - 1
+    assert assets.srcset('logo.png', 'bmp') == ''
+
+
+def test_hashed_files_are_immutable(built):
+    _, manifest, _, client = built
+    css = manifest['assets']['css/site.css']['file']
+    response = client.get(f'/static/dist/{css}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    etag = response.headers['ETag']
+    assert client.get(f'/static/dist/{css}', headers={'Accept-Encoding': 'gzip',
+                                                       'If-None-Match': etag}).status_code == 304
+    plain = client.get(f'/static/dist/{css}')
+    assert 'Content-Encoding' not in plain.headers and plain.headers['ETag'] != etag
+
+
+def test_manifest_is_revalidated(built):
+    static_dir, _, _, client = built
+    response = client.get(f'/static/dist/{MANIFEST}')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert client.get(f'/static/dist/{MANIFEST}',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_missing_and_escaping_paths_are_404(built):
+    _, _, _, client = built
+    assert client.get('/static/dist/nope.css').status_code == 404
+    assert client.get('/static/dist/../../etc/passwd').status_code == 404
+
+
+def test_an_old_manifest_is_rejected(tmp_path):
+    path = tmp_path / MANIFEST
+    path.write_text('{"version": 0}')
+    with pytest.raises(ValueError):
+        load_manifest(str(path))
+    assert static_assets.MANIFEST_VERSION != 0
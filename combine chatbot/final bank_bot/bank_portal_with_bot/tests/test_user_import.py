@@ -0,0 +1,114 @@
+import io
+import json
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, func, select
+
+import user_import
+
+
+def user_table(account_required=False):
+    return Table(
+        'user', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('username', String(100), nullable=False),
+        Column('email', String(100), nullable=False, unique=True),
+        Column('password', String(100), nullable=False),
+        Column('account_number', String(20), nullable=not account_required, unique=True),
+        Column('account_type', String(50), nullable=not account_required),
+        Column('balance', Float),
+    )
+
+
+def setup(tmp_path, **kwargs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bank.db'}")
+    table = user_table(**kwargs)
+    table.metadata.create_all(engine)
+    return engine, table
+
+
+def run(engine, table, text, fmt='csv', batch_size=2):
+    errors = []
+    importer = user_import.import_users(engine, table, io.StringIO(text), fmt, batch_size=batch_size,
+                                        on_error=lambda line, error, record: errors.append((line, error)))
+    return importer, errors
+
+
+def emails(engine, table):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(table.c.email)).scalars())
+
+
+def test_clean():
+    row, error = user_import.clean({'username': ' a ', 'email': 'A@Example.com', 'password': 'p',
+                                    'account_number': '123', 'balance': '10.5'})
+    assert error is None
+    assert row['username'] == 'a'
+    assert row['email'] == 'A@Example.com'  # compared as given, like /register
+    assert row['account_type'] == 'savings' and row['balance'] == 10.5
+    assert user_import.clean({'username': 'a', 'email': 'nope', 'password': 'p'}) == (None, 'invalid email')
+    assert user_import.clean({'username': 'a', 'email': 'a@x', 'password': ''}) == (None, 'missing password')
+    assert user_import.clean({'username': 'a', 'email': 'a@x', 'password': 'p', 'balance': '-1'}) == \
+        (None, 'negative balance')
+    assert user_import.clean(ValueError('bad'))[1] == 'invalid JSON: bad'
+
+
+def test_import_skips_duplicates_and_existing_rows(tmp_path):
+    engine, table = setup(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(table.insert(), {'username': 'old', 'email': 'old@x.com', 'password': 'p',
+                                      'account_number': '999'})
+    importer, errors = run(engine, table, (
+        'username,email,password,account_number,balance\n'
+        'a,a@x.com,p,100,5\n'
+        'b,a@x.com,p,101,5\n'
+        'c,c@x.com,p,100,5\n'
+        'd,old@x.com,p,,\n'
+        'e,e@x.com,p,999,\n'
+        'f,f@x.com,,,\n'
+        'g,g@x.com,p,,\n'
+    ))
+    assert importer.summary() == {'rows': 7, 'inserted': 2, 'errors': 5}
+    assert sorted(errors) == [(3, 'duplicate email in input'), (4, 'duplicate account_number in input'),
+                              (5, 'email already registered'), (6, 'account_number already exists'),
+                              (7, 'missing password')]
+    assert emails(engine, table) == ['a@x.com', 'g@x.com', 'old@x.com']
+    assert importer.account_numbers == ['100']
+
+
+def test_constraint_failures_fall_back_to_one_row_at_a_time(tmp_path):
+    # older bank.db files require an account number on every user
+    engine, table = setup(tmp_path, account_required=True)
+    lines = [json.dumps({'username': n, 'email': f'{n}@x.com', 'password': 'p',
+                         'account_number': acc}) for n, acc in
+             [('a', '1'), ('b', None), ('c', '3'), ('d', None), ('e', '5')]]
+    importer, errors = run(engine, table, '\n'.join(lines) + '\n', fmt='ndjson', batch_size=10)
+    assert importer.summary() == {'rows': 5, 'inserted': 3, 'errors': 2}
+    assert [line for line, _ in errors] == [2, 4]
+    assert all('NOT NULL' in error for _, error in errors)
+    assert emails(engine, table) == ['a@x.com', 'c@x.com', 'e@x.com']
+
+
+def test_batches_already_committed_stay(tmp_path):
+    engine, table = setup(tmp_path)
+    rows = ''.join(f'u{i},u{i}@x.com,p\n' for i in range(5))
+    importer, errors = run(engine, table, 'username,email,password\n' + rows, batch_size=2)
+    assert importer.inserted == 5 and not errors
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(table)).scalar() == 5
+
+
+def test_guess_format():
+    assert user_import.guess_format('users.ndjson') == 'ndjson'
+    assert user_import.guess_format('', 'application/x-ndjson') == 'ndjson'
+    assert user_import.guess_format('users.csv', 'text/csv') == 'csv'
+
+
+def test_admin_endpoint(portal):
+    client = portal.app.test_client()
+    body = 'username,email,password,account_number\nimp,imported@example.com,p,555000111\n'
+    assert client.post('/admin/users/import', data=body, content_type='text/csv').status_code == 401
+    with client.session_transaction() as s:
+        s['admin_id'] = 1
+    response = client.post('/admin/users/import', data=body, content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 1
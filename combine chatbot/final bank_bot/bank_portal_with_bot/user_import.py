@@ -0,0 +1,246 @@
+# user_import.py
+# Bulk provisioning of portal users and their accounts from CSV or NDJSON.
+#
+#   python user_import.py users.csv [--errors errors.ndjson] [--batch-size 5000]
+#   python user_import.py users.ndjson --format ndjson
+#
+# Columns/keys: username, email, password, and optionally account_number,
+# account_type and balance. The input is read as a stream in batches;
+# each batch is checked against the database with a few set-based IN
+# queries and inserted with one executemany in one transaction.
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from sqlalchemy import MetaData, Table, create_engine, select
+from sqlalchemy.exc import IntegrityError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BATCH_SIZE = 5000
+# keys per IN (...) query, below every SQLite build's variable limit
+IN_CHUNK = 500
+FIELDS = ('username', 'email', 'password', 'account_number', 'account_type', 'balance')
+# the User model's column sizes
+MAX_LENGTHS = {'username': 100, 'email': 100, 'password': 100, 'account_number': 20, 'account_type': 50}
+
+
+# ---------- Input ----------
+def iter_records(stream, fmt):
+    """Yield (line number, dict) from a text stream of CSV (with a header) or NDJSON."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                record = exc
+            yield line_num, record
+    else:
+        raise ValueError(f'unknown format {fmt!r}; use csv or ndjson')
+
+
+def guess_format(name='', content_type=''):
+    name, content_type = (name or '').lower(), (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')) or 'ndjson' in content_type or 'json' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+
+def clean(record):
+    """(row for the user table, None) or (None, error message)."""
+    if isinstance(record, Exception):
+        return None, f'invalid JSON: {record}'
+    if not isinstance(record, dict):
+        return None, 'expected an object'
+    row = {}
+    for field in FIELDS:
+        value = record.get(field)
+        row[field] = str(value).strip() if value is not None and str(value).strip() != '' else None
+    for field in ('username', 'email', 'password'):
+        if not row[field]:
+            return None, f'missing {field}'
+    if '@' not in row['email']:
+        return None, 'invalid email'
+    for field, limit in MAX_LENGTHS.items():
+        if row[field] and len(row[field]) > limit:
+            return None, f'{field} longer than {limit} characters'
+    try:
+        row['balance'] = float(row['balance']) if row['balance'] is not None else 0.0
+    except ValueError:
+        return None, 'invalid balance'
+    if row['balance'] < 0:
+        return None, 'negative balance'
+    if row['account_number'] and not row['account_type']:
+        row['account_type'] = 'savings'
+    return row, None
+
+
+# ---------- Import ----------
+def _existing(conn, column, values):
+    values = sorted(values)
+    found = set()
+    for i in range(0, len(values), IN_CHUNK):
+        found.update(conn.execute(select(column).where(column.in_(values[i:i + IN_CHUNK]))).scalars())
+    return found
+
+
+class UserImporter:
+    """Streams records into the user table, batch by batch.
+
+    Emails and account numbers must be new to the table and unique within
+    the input; the first occurrence in the file wins. Emails are kept as
+    given and compared exactly, as /register and the login do. Every rejected row
+    is passed to `on_error(line, error, record)` and counted; nothing is
+    kept per row, so memory grows only with the keys seen.
+    """
+
+    def __init__(self, engine, table, batch_size=DEFAULT_BATCH_SIZE, on_error=None):
+        self.engine = engine
+        self.table = table
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.rows = 0
+        self.inserted = 0
+        self.errors = 0
+        self.account_numbers = []
+        self._emails = set()
+        self._accounts = set()
+
+    def _error(self, line, error, record):
+        self.errors += 1
+        if self.on_error is not None:
+            self.on_error(line, error, record)
+
+    def run(self, records):
+        batch = []
+        for line, record in records:
+            self.rows += 1
+            row, error = clean(record)
+            if error:
+                self._error(line, error, record)
+                continue
+            if row['email'] in self._emails:
+                self._error(line, 'duplicate email in input', record)
+                continue
+            if row['account_number'] and row['account_number'] in self._accounts:
+                self._error(line, 'duplicate account_number in input', record)
+                continue
+            self._emails.add(row['email'])
+            if row['account_number']:
+                self._accounts.add(row['account_number'])
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        return self.summary()
+
+    def _flush(self, batch, one_by_one=False):
+        columns = self.table.c
+        try:
+            with self.engine.begin() as conn:
+                emails = _existing(conn, columns.email, {row['email'] for _, row in batch})
+                accounts = _existing(conn, columns.account_number,
+                                     {row['account_number'] for _, row in batch if row['account_number']})
+                rows, rejected = [], []
+                for line, row in batch:
+                    if row['email'] in emails:
+                        rejected.append((line, 'email already registered', row))
+                    elif row['account_number'] in accounts:
+                        rejected.append((line, 'account_number already exists', row))
+                    else:
+                        rows.append((line, row))
+                if one_by_one:
+                    rows = self._insert_each(conn, rows, rejected)
+                elif rows:
+                    conn.execute(self.table.insert(), [row for _, row in rows])
+        except IntegrityError:
+            # a row the checks above let through broke a constraint (a
+            # concurrent registration, or a column the table requires);
+            # redo the batch a row at a time to find it
+            if one_by_one:
+                raise
+            return self._flush(batch, one_by_one=True)
+        for error in rejected:
+            self._error(*error)
+        self.inserted += len(rows)
+        self.account_numbers.extend(row['account_number'] for _, row in rows if row['account_number'])
+
+    def _insert_each(self, conn, rows, rejected):
+        inserted = []
+        for line, row in rows:
+            try:
+                with conn.begin_nested():
+                    conn.execute(self.table.insert(), row)
+            except IntegrityError as exc:
+                rejected.append((line, str(exc.orig), row))
+            else:
+                inserted.append((line, row))
+        return inserted
+
+    def summary(self):
+        return {'rows': self.rows, 'inserted': self.inserted, 'errors': self.errors}
+
+
+def import_users(engine, table, stream, fmt='csv', batch_size=DEFAULT_BATCH_SIZE, on_error=None):
+    importer = UserImporter(engine, table, batch_size=batch_size, on_error=on_error)
+    importer.run(iter_records(stream, fmt))
+    return importer
+
+
+# ---------- CLI ----------
+def default_database_uri():
+    # Flask-SQLAlchemy puts a relative sqlite:/// path in the app's instance folder
+    uri = os.environ.get('BANKBOT_DATABASE_URI', 'sqlite:///bank.db')
+    prefix = 'sqlite:///'
+    if uri.startswith(prefix) and uri != prefix + ':memory:' and not os.path.isabs(uri[len(prefix):]):
+        uri = prefix + os.path.join(HERE, 'instance', uri[len(prefix):])
+    return uri
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-import portal users and accounts.')
+    parser.add_argument('input', help="CSV or NDJSON file, or '-' for stdin")
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help='default: from the file extension')
+    parser.add_argument('--database-uri', default=None, help='default: BANKBOT_DATABASE_URI or instance/bank.db')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--errors', help='write rejected rows here as NDJSON (default: stderr)')
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_uri or default_database_uri())
+    try:
+        table = Table('user', MetaData(), autoload_with=engine)
+    except Exception as exc:
+        print(f'no user table in {engine.url} ({exc}); start the portal once to create it', file=sys.stderr)
+        return 2
+
+    errors_out = open(args.errors, 'w', encoding='utf-8') if args.errors else sys.stderr
+
+    def on_error(line, error, record):
+        errors_out.write(json.dumps({'line': line, 'error': error, 'email': (record or {}).get('email')
+                                     if isinstance(record, dict) else None}) + '\n')
+
+    fmt = args.format or guess_format(args.input)
+    stream = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='') if args.input == '-'
+              else open(args.input, encoding='utf-8-sig', newline=''))
+    try:
+        importer = import_users(engine, table, stream, fmt, args.batch_size, on_error)
+    finally:
+        stream.close()
+        if args.errors:
+            errors_out.close()
+    print(json.dumps(importer.summary()))
+    return 0 if not importer.errors else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
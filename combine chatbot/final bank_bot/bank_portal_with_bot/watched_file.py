@@ -0,0 +1,56 @@
+# watched_file.py
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WatchedFile:
+    """Read-through cache of a file parsed by `load(path)`.
+
+    get() stats the file at most once every `interval` seconds and reloads
+    it only when its mtime, size or inode changed, so each worker process
+    picks up edits made by another one without a restart. A file that
+    fails to parse keeps the previous value until the file changes again.
+    `version` counts the reloads.
+    """
+
+    def __init__(self, path, load, default=None, interval=1.0):
+        self.path = path
+        self.load = load
+        self.default = default
+        self.interval = interval
+        self.version = 0
+        self._value = default
+        self._stamp = None
+        self._failed = None  # stamp of a version that did not parse
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.interval:
+            return self._value
+        with self._lock:
+            if self._checked is None or now - self._checked >= self.interval:
+                self._checked = now
+                stamp = self._stat()
+                if stamp != self._stamp and stamp != self._failed:
+                    try:
+                        self._value = self.load(self.path) if stamp is not None else self.default
+                    except (OSError, ValueError) as exc:
+                        self._failed = stamp
+                        logger.warning('Could not reload %s (%s); keeping the previous copy', self.path, exc)
+                    else:
+                        self._stamp = stamp
+                        self.version += 1
+        return self._value